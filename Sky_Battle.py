@@ -1,25 +1,52 @@
+import time
+IMPORT_STARTED = time.perf_counter()  # モジュールの読み込みを始めた時刻（--profile-startupで使う）
+import abc
+import argparse
+import collections
+import csv
+import hashlib
+import heapq
+import json
 import math
 import os
+import queue
 import random
+import struct
 import sys
-import time
+import threading
 import pygame as pg
 import pygame
+try:
+    import numpy as np
+except ImportError:  # NumPyはArrayProjectilesを使うときだけ必要
+    np = None
 
 WIDTH = 1100  # ゲームウィンドウの幅
 HEIGHT = 650  # ゲームウィンドウの高さ
-os.chdir(os.path.dirname(os.path.abspath(__file__)))
+SCREEN_RECT = pg.Rect(0, 0, WIDTH, HEIGHT)  # 画面の範囲（ワールドの大きさの標準）
+TICK_RATE = 50  # ゲームを進める1秒あたりのティック数（速度などはすべてこの値を前提にしている）
+MAX_CATCHUP = 5  # 1フレームで処理するティック数の上限（処理落ち後に遅れを取り戻し続けないようにする）
+ROOT = os.path.dirname(os.path.abspath(__file__))  # 画像・フォントを置いたディレクトリ（このファイルの場所）
+
+
+def resource(path: str) -> str:
+    """
+    画像・フォントのパス（ROOTからの相対パス）を，作業ディレクトリによらない絶対パスにする
+    """
+    return os.path.join(ROOT, path)
 
-def check_bound(obj_rct: pg.Rect) -> tuple[bool, bool]:
+
+def check_bound(obj_rct: pg.Rect, area: pg.Rect = SCREEN_RECT) -> tuple[bool, bool]:
     """
     オブジェクトが画面内or画面外を判定し，真理値タプルを返す関数
-    引数：こうかとんや爆弾，ビームなどのRect
+    引数1 obj_rct：こうかとんや爆弾，ビームなどのRect
+    引数2 area：動ける範囲（ワールドの大きさ．標準は画面）
     戻り値：横方向，縦方向のはみ出し判定結果（画面内：True／画面外：False）
     """
     yoko, tate = True, True
-    if obj_rct.left < 0 or WIDTH < obj_rct.right:
+    if obj_rct.left < area.left or area.right < obj_rct.right:
         yoko = False
-    if obj_rct.top < 0 or HEIGHT < obj_rct.bottom:
+    if obj_rct.top < area.top or area.bottom < obj_rct.bottom:
         tate = False
     return yoko, tate
 
@@ -34,12 +61,625 @@ def calc_orientation(org: pg.Rect, dst: pg.Rect) -> tuple[float, float]:
     norm = math.sqrt(x_diff**2+y_diff**2)
     return x_diff/norm, y_diff/norm
 
+class NullProfiler:
+    """
+    計測を行わないプロファイラ（無効時はこれを使い，計測のコストをほぼゼロにする）
+    """
+    enabled = False
+
+    def start(self):
+        pass
+
+    def mark(self, phase: str):
+        pass
+
+    def end_frame(self, counts: dict[str, int]):
+        pass
+
+
+class Profiler(NullProfiler):
+    """
+    ループの処理ごとの時間を計測するクラス
+    mark(phase)を呼ぶと，前回のmark（またはstart）からの経過時間をphaseの時間として記録する
+    """
+    enabled = True
+
+    def __init__(self, window: int = 250, out: str | None = None):
+        """
+        引数1 window：パーセンタイルを計算する直近のフレーム数
+        引数2 out：計測結果を書き出すファイル（.csvならCSV，それ以外はJSON Lines）
+        """
+        self.window = window
+        self.samples = {}  # 処理名 -> 直近の計測時間(ms)のdeque
+        self.frame = {}  # 計測中のフレームの 処理名 -> 時間(ms)
+        self.counts = {}  # 直近のフレームのグループごとのスプライト数
+        self.frames = 0
+        self.t = time.perf_counter()
+        self.file = None
+        self.writer = None
+        if out is not None:
+            self.file = open(out, "w", newline="")
+            if out.endswith(".csv"):
+                self.writer = csv.writer(self.file)
+                self.writer.writerow(["frame", "phase", "ms"])
+
+    def start(self):
+        """
+        フレームの計測を始める
+        """
+        self.t = time.perf_counter()
+
+    def mark(self, phase: str):
+        now = time.perf_counter()
+        self.frame[phase] = self.frame.get(phase, 0.0) + (now - self.t) * 1000
+        self.t = now
+
+    def end_frame(self, counts: dict[str, int]):
+        """
+        フレームの計測を終え，結果を記録・書き出す
+        引数 counts：グループごとのスプライト数
+        """
+        for phase, ms in self.frame.items():
+            if phase not in self.samples:
+                self.samples[phase] = collections.deque(maxlen=self.window)
+            self.samples[phase].append(ms)
+        self.counts = counts
+        if self.writer is not None:
+            self.writer.writerows([self.frames, phase, f"{ms:.4f}"] for phase, ms in self.frame.items())
+        elif self.file is not None:
+            self.file.write(json.dumps({"frame": self.frames, "ms": {k: round(v, 4) for k, v in self.frame.items()}, "counts": counts}) + "\n")
+        self.frame = {}
+        self.frames += 1
+        self.t = time.perf_counter()
+
+    def percentiles(self) -> dict[str, tuple[float, float, float]]:
+        """
+        処理ごとの直近windowフレームのp50，p95，p99(ms)を返す
+        """
+        result = {}
+        for phase, samples in self.samples.items():
+            ordered = sorted(samples)
+            n = len(ordered) - 1
+            result[phase] = tuple(ordered[round(n * q)] for q in (0.5, 0.95, 0.99))
+        return result
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+NULL_PROFILER = NullProfiler()
+
+
+class StartupProfiler:
+    """
+    起動から最初のフレームを表示するまでの時間を段階ごとに計測するクラス（--profile-startup）
+    mark(phase)を呼ぶと，前回のmark（最初はモジュールの読み込み開始）からの経過時間をphaseの時間として記録する
+    """
+    def __init__(self, started: float = IMPORT_STARTED):
+        """
+        引数 started：計測の起点の時刻（time.perf_counter）
+        """
+        self.started = self.t = started
+        self.phases = {}  # 段階名 -> 時間(ms)
+
+    def mark(self, phase: str):
+        now = time.perf_counter()
+        self.phases[phase] = self.phases.get(phase, 0.0) + (now - self.t) * 1000
+        self.t = now
+
+    def report(self, loader: "AssetLoader | None" = None):
+        """
+        段階ごとの時間と，最初のフレームまでの合計時間を表示する
+        引数 loader：別スレッドで画像を読み込んだAssetLoader
+        """
+        print(f"startup: first frame after {(self.t - self.started) * 1000:.1f} ms")
+        for phase, ms in self.phases.items():
+            print(f"  {ms:8.1f} ms  {phase}")
+        if loader is not None:
+            state = "before" if loader.finished is not None and loader.finished <= self.t else "after"
+            print(f"  {loader.time * 1000:8.1f} ms  images (background thread, finished {state} the first frame)")
+            print(f"  {loader.convert_time * 1000:8.1f} ms  images converted on the main thread after the first frame")
+
+
+class ProfilerOverlay:
+    """
+    プロファイラの計測結果（処理ごとのp50/p95/p99とスプライト数）を画面左上に表示するクラス
+    文字の描画は重いので，refreshフレームごとにだけ作り直す
+    """
+    def __init__(self, refresh: int = 25):
+        self.font = assets.font(None, 18)
+        self.refresh = refresh
+        self.image = None
+        self.frames = 0
+
+    def update(self, screen: pg.Surface, profiler: Profiler) -> pg.Rect:
+        """
+        計測結果を描画する
+        戻り値：描画した範囲のRect
+        """
+        if self.image is None or self.frames % self.refresh == 0:
+            rows = [("phase (ms)", "p50", "p95", "p99")]
+            for phase, values in profiler.percentiles().items():
+                rows.append((phase, *(f"{v:.2f}" for v in values)))
+            counts = "  ".join(f"{name}: {n}" for name, n in profiler.counts.items())
+            height = self.font.get_linesize()
+            self.image = pg.Surface((300, height * (len(rows) + 1) + 8))
+            self.image.fill((0, 0, 0))
+            self.image.set_alpha(190)
+            for i, row in enumerate(rows):
+                y = 4 + i * height
+                self.image.blit(self.font.render(row[0], True, (0, 255, 0)), (4, y))
+                for j, value in enumerate(row[1:]):  # 数値は列の右端に揃える
+                    txt = self.font.render(value, True, (0, 255, 0))
+                    self.image.blit(txt, txt.get_rect(topright=(190 + 50 * j, y)))
+            self.image.blit(self.font.render(counts, True, (0, 255, 0)), (4, 4 + len(rows) * height))
+        self.frames += 1
+        return screen.blit(self.image, (5, 60))
+
+
+class SpriteAtlas:
+    """
+    キャラクター画像を回転させた画像をまとめて1枚のSurfaceに詰め込んだスプライトアトラス
+    各画像について，基準画像（縮小・左右反転済み）と，それをN段階に回転させた画像を持ち，
+    (画像のパス, 左右反転, 段階) -> アトラス内の矩形 の表から切り出した画像（subsurface）を返す
+    作ったアトラスは元画像の内容のハッシュ値をキーにディスクに保存し，次回以降の起動ではrotozoomを省く
+    """
+    version = 1  # 作り方を変えたら上げる（ディスクのキャッシュを無効にする）
+    max_width = 1024  # アトラスの幅の上限
+    specs = [  # (画像のパス, 左右反転, 回転の段階数, 基準画像の倍率, 回転時の倍率)
+        *[(f"fig/{num}.png", flip, 8, 0.9, 0.9) for num in range(10) for flip in (False, True)],  # こうかとん（8方向）
+        *[(f"fig/alien{i}.png", False, 16, 0.8, 1.0) for i in range(1, 4)],  # 敵機
+        ("fig/beam.png", False, 32, 0.5, 1.0),  # ビーム（右向き）
+    ]
+
+    def __init__(self, surface: pg.Surface, table: dict[str, list[int]]):
+        """
+        引数1 surface：全画像を詰め込んだSurface
+        引数2 table："パス:反転:段階" -> [x, y, w, h] の表
+        """
+        self.surface = surface
+        self.table = table
+        self.frames = {key: surface.subsurface(rect) for key, rect in table.items()}
+        self.steps = {path: steps for path, flip, steps, zoom0, zoom in __class__.specs}
+
+    @staticmethod
+    def key(path: str, flip: bool, step: int) -> str:
+        return f"{path}:{int(flip)}:{step}"
+
+    @staticmethod
+    def angle(step: int, steps: int) -> float:
+        """
+        段階stepの回転角度（-180より大きく180以下の度）を返す
+        """
+        deg = 360 * step / steps
+        return deg - 360 if deg > 180 else deg
+
+    def frame(self, path: str, angle: float = 0, flip: bool = False) -> pg.Surface:
+        """
+        pathの画像をangle度（反時計回り）に一番近い段階だけ回転させた画像を返す
+        引数1 path：元画像のパス
+        引数2 angle：回転角度（度）
+        引数3 flip：左右反転した画像を使うかどうか
+        """
+        steps = self.steps[path]
+        return self.frames[__class__.key(path, flip, round(angle * steps / 360) % steps)]
+
+    @classmethod
+    def digest(cls) -> str:
+        """
+        元画像の内容・作り方・pygameのバージョンから，キャッシュのキーとなるハッシュ値を返す
+        """
+        h = hashlib.sha256(repr((cls.version, cls.specs, pg.version.ver)).encode())
+        for path in sorted({spec[0] for spec in cls.specs}):
+            with open(resource(path), "rb") as f:
+                h.update(f.read())
+        return h.hexdigest()[:16]
+
+    @classmethod
+    def build(cls, load_image) -> "SpriteAtlas":
+        """
+        全画像を回転させて1枚のSurfaceに詰め込む
+        引数 load_image：パスから画像を読み込む関数
+        """
+        frames = {}
+        for path, flip, steps, zoom0, zoom in cls.specs:
+            base = pg.transform.rotozoom(load_image(path), 0, zoom0)
+            if flip:
+                base = pg.transform.flip(base, True, False)
+            for step in range(steps):
+                frames[cls.key(path, flip, step)] = base if step == 0 else pg.transform.rotozoom(base, cls.angle(step, steps), zoom)
+        # 高い順に並べて棚詰めする
+        table, x, y, row = {}, 0, 0, 0
+        for key in sorted(frames, key=lambda k: -frames[k].get_height()):
+            w, h = frames[key].get_size()
+            if x + w > cls.max_width:
+                x, y, row = 0, y + row, 0
+            table[key] = [x, y, w, h]
+            x, row = x + w, max(row, h)
+        surface = pg.Surface((cls.max_width, y + row), pg.SRCALPHA)
+        surface.fill((0, 0, 0, 0))
+        for key, (x, y, w, h) in table.items():
+            surface.blit(frames[key], (x, y), special_flags=pg.BLEND_RGBA_MAX)  # 透明な下地に画素をそのまま写す
+        return cls(surface, table)
+
+    @classmethod
+    def read_cache(cls, cache_dir: str) -> tuple[pg.Surface, dict[str, list[int]]] | None:
+        """
+        ディスクのキャッシュからアトラスの画像と表を読み込む（画面のピクセル形式には変換しないので，別スレッドから呼んでよい）
+        引数 cache_dir：キャッシュを置くディレクトリ
+        戻り値：(デコードしただけの画像, 表)，キャッシュがなければNone
+        """
+        base = os.path.join(cache_dir, f"atlas-{cls.digest()}")
+        try:
+            with open(base + ".json") as f:
+                table = json.load(f)
+            return pg.image.load(base + ".png"), table
+        except (OSError, ValueError, pg.error):
+            return None
+
+    @classmethod
+    def load(cls, cache_dir: str, load_image, cache: tuple[pg.Surface, dict[str, list[int]]] | None = None) -> tuple["SpriteAtlas", bool]:
+        """
+        ディスクのキャッシュからアトラスを読み込む．なければ作ってキャッシュに保存する
+        引数1 cache_dir：キャッシュを置くディレクトリ
+        引数2 load_image：パスから画像を読み込む関数
+        引数3 cache：read_cacheで読み込み済みのキャッシュ（Noneならここで読み込む）
+        戻り値：(アトラス, キャッシュから読み込んだかどうか)
+        """
+        if cache is None:
+            cache = cls.read_cache(cache_dir)
+        if cache is not None:
+            surface, table = cache
+            return cls(convert_surface(surface), table), True
+        base = os.path.join(cache_dir, f"atlas-{cls.digest()}")
+        atlas = cls.build(load_image)
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            pg.image.save(atlas.surface, base + ".png")
+            with open(base + ".json", "w") as f:
+                json.dump(atlas.table, f)
+        except (OSError, pg.error):
+            pass  # 保存できなくても毎回作れば動く
+        atlas = cls(convert_surface(atlas.surface), atlas.table)
+        return atlas, False
+
+
+class Assets:
+    """
+    画像・フォントを一度だけ読み込んで使い回すアセット管理クラス
+    ゲーム中にディスクI/Oが起きないよう，preloadで全アセットを先読みする
+    """
+    fonts = {  # 先読みするフォントとサイズ
+        None: [18, 36, 50, 80],
+        "font/BebasNeue-Regular.ttf": [15, 40],
+        "font/YuseiMagic-Regular.ttf": [15, 27, 30, 35, 40, 50, 60, 74],
+    }
+
+    def __init__(self):
+        self.cache = {}
+        self.lock = threading.Lock()  # 統計の回数を守る（AssetLoaderのスレッドからも数える）
+        self.hits = 0  # キャッシュから返した回数
+        self.misses = 0  # 新たに生成した回数
+        self.disk_loads = 0  # ディスクから読み込んだ回数
+        self.marked = (0, 0, 0)  # mark()した時点の(hits, misses, disk_loads)
+        self.times = {}  # キー -> 生成にかかった時間（秒，中で使った他のアセットの生成時間を含む）
+        self.preload_time = 0.0  # preloadにかかった時間（秒）
+        self.cache_dir = resource(".cache")  # 回転画像のアトラスを保存するディレクトリ
+        self.font_cache = collections.OrderedDict()  # (パス, サイズ) -> Font（最近使った順）
+        self.max_fonts = 32  # フォントキャッシュの上限（超えたら最も長く使っていないものを捨てる）
+        self.font_evictions = 0  # フォントキャッシュから捨てた回数
+        self.decoded = {}  # パス -> AssetLoaderがデコードしてまだ変換していない画像
+        self.decoded_atlas = None  # AssetLoaderがディスクのキャッシュから読み込んだアトラスの(画像, 表)
+
+    def count(self, hits: int = 0, misses: int = 0, disk_loads: int = 0):
+        """
+        統計の回数を増やす（どのスレッドから呼んでもよい）
+        """
+        with self.lock:
+            self.hits += hits
+            self.misses += misses
+            self.disk_loads += disk_loads
+
+    def get(self, key, factory):
+        """
+        keyに対応するアセットを返す．未生成ならfactory()で生成してキャッシュする
+        引数1 key：アセットを識別するキー
+        引数2 factory：アセットを生成する関数
+        戻り値：キャッシュされたアセット
+        """
+        if key in self.cache:
+            self.count(hits=1)
+            return self.cache[key]
+        self.count(misses=1)
+        t0 = time.perf_counter()
+        value = self.cache[key] = factory()
+        self.times[key] = time.perf_counter() - t0
+        return value
+
+    def image(self, path: str, alpha: bool = True) -> pg.Surface:
+        """
+        画像ファイルを読み込み，画面のピクセル形式に変換して返す
+        引数1 path：画像ファイルのパス
+        引数2 alpha：透過情報を残すかどうか
+        """
+        def load():
+            img = self.decoded.pop(path, None)
+            return convert_surface(img if img is not None else self.decode(path), alpha)
+        return self.get(("image", path, alpha), load)
+
+    def decode(self, path: str) -> pg.Surface:
+        """
+        画像ファイルを読み込んでデコードだけする（画面のピクセル形式には変換しないので，別スレッドから呼んでよい）
+        """
+        self.count(disk_loads=1)
+        return pg.image.load(resource(path))
+
+    def font(self, path: str | None, size: int) -> pg.font.Font:
+        """
+        フォントを読み込んで返す（pathがNoneならデフォルトフォント）
+        全画面で共有するLRUキャッシュから返し，上限を超えたら最も長く使っていないフォントを捨てる
+        """
+        key = (path, size)
+        if key in self.font_cache:
+            self.count(hits=1)
+            self.font_cache.move_to_end(key)
+            return self.font_cache[key]
+        self.count(misses=1, disk_loads=1)
+        t0 = time.perf_counter()
+        font = self.font_cache[key] = pg.font.Font(path and resource(path), size)
+        self.times[("font", path, size)] = time.perf_counter() - t0
+        if len(self.font_cache) > self.max_fonts:
+            self.font_cache.popitem(last=False)
+            self.font_evictions += 1
+        return font
+
+    def atlas(self) -> SpriteAtlas:
+        """
+        キャラクターの回転画像のアトラスを返す（ディスクにキャッシュがあれば読み込む）
+        """
+        def load():
+            atlas, cached = SpriteAtlas.load(self.cache_dir, self.image, self.decoded_atlas)
+            self.decoded_atlas = None
+            self.count(disk_loads=cached)
+            return atlas
+        return self.get(("atlas",), load)
+
+    def bird_imgs(self, num: int) -> dict[tuple[int, int], pg.Surface]:
+        """
+        こうかとんの8方向の画像の辞書を返す
+        引数 num：こうかとん画像ファイル名の番号
+        """
+        def build():
+            frame, path = self.atlas().frame, f"fig/{num}.png"
+            return {
+                (+1, 0): frame(path, 0, True),  # 右（デフォルトのこうかとん）
+                (+1, -1): frame(path, 45, True),  # 右上
+                (0, -1): frame(path, 90, True),  # 上
+                (-1, -1): frame(path, -45),  # 左上
+                (-1, 0): frame(path, 0),  # 左
+                (-1, +1): frame(path, 45),  # 左下
+                (0, +1): frame(path, -90, True),  # 下
+                (+1, +1): frame(path, -45, True),  # 右下
+            }
+        return self.get(("bird", num), build)
+
+    def face_img(self, num: int) -> pg.Surface:
+        """
+        こうかとんの表情差分画像（喜びエフェクトなど）を返す
+        """
+        return self.get(("face", num), lambda: self.atlas().frame(f"fig/{num}.png"))
+
+    def enemy_imgs(self) -> list[pg.Surface]:
+        """
+        敵機画像（0.8倍に縮小済み）のリストを返す
+        """
+        return self.get(("enemy",), lambda: [self.atlas().frame(f"fig/alien{i}.png") for i in range(1, 4)])
+
+    def explosion_imgs(self) -> list[pg.Surface]:
+        """
+        爆発画像とその反転画像のリストを返す
+        """
+        def build():
+            img = self.image("fig/explosion.gif")
+            return [img, pg.transform.flip(img, 1, 1)]
+        return self.get(("explosion",), build)
+
+    def particle_imgs(self, colors: list[tuple[int, int, int]], levels: int) -> list[pg.Surface]:
+        """
+        火花のパーティクルの画像のリストを返す（加算合成で描くので下地は黒）
+        色ごとに明るさlevels段階の画像を並べる．段階lの画像は半径l+1で，中心ほど明るい
+        引数1 colors：火花の色のリスト
+        引数2 levels：明るさの段階数
+        """
+        def build():
+            imgs = []
+            for color in colors:
+                for level in range(levels):
+                    rad, bright = level + 1, (level + 1) / levels
+                    img = pg.Surface((2 * rad, 2 * rad))
+                    for r in range(rad, 0, -1):  # 外側ほど暗い同心円
+                        f = bright * (rad - r + 1) / rad
+                        pg.draw.circle(img, [int(c * f) for c in color], (rad, rad), r)
+                    imgs.append(convert_surface(img, alpha=False))
+            return imgs
+        return self.get(("particles", tuple(colors), levels), build)
+
+    def circle(self, rad: int, color: tuple[int, int, int]) -> pg.Surface:
+        """
+        黒をカラーキーにした塗りつぶし円のSurfaceを返す（爆弾・ビーム用）
+        引数1 rad：円の半径
+        引数2 color：円の色
+        """
+        def build():
+            img = pg.Surface((2*rad, 2*rad))
+            pg.draw.circle(img, color, (rad, rad), rad)
+            img.set_colorkey((0, 0, 0))
+            return convert_surface(img, alpha=False)
+        return self.get(("circle", rad, color), build)
+
+    def cursor(self, simple: bool = False) -> pg.Surface:
+        """
+        マウスカーソル位置に描くドーナツ型の円の画像を返す
+        引数 simple：Trueならアルファ付きではなく黒をカラーキーにした画像（転送が速い．品質を下げたとき用）
+        """
+        def build():
+            circle = pg.Surface((28, 28), pg.SRCALPHA)  # 固定サイズのサーフェスを作成
+            pg.draw.circle(circle, (255, 255, 255), (14, 14), 14)  # 外側の白い円
+            pg.draw.circle(circle, (0, 0, 0, 0), (14, 14), 10)  # 内側の黒い円
+            return convert_surface(circle)
+
+        def build_simple():
+            circle = pg.Surface((28, 28))
+            pg.draw.circle(circle, (255, 255, 255), (14, 14), 14)
+            pg.draw.circle(circle, (0, 0, 0), (14, 14), 10)
+            circle.set_colorkey((0, 0, 0), pg.RLEACCEL)
+            return convert_surface(circle, alpha=False)
+        return self.get(("cursor", simple), build_simple if simple else build)
+
+    def cry_img(self) -> pg.Surface:
+        """
+        ゲームオーバー画面の泣いているこうかとん画像（150x150）を返す
+        """
+        return self.get(("cry",), lambda: convert_surface(pg.transform.scale(self.image("fig/8.png"), (150, 150))))
+
+    def preload(self):
+        """
+        ゲームで使う全アセットを先読みし，読み込み後の統計の基準点を記録する
+        画面のピクセル形式に変換するため，pg.display.set_modeの後に呼ぶこと
+        """
+        self.preload_fonts()
+        self.preload_images()
+        self.mark()
+
+    def preload_fonts(self):
+        """
+        全フォントを先読みする
+        """
+        t0 = time.perf_counter()
+        for path, sizes in __class__.fonts.items():
+            for size in sizes:
+                self.font(path, size)
+        self.preload_time += time.perf_counter() - t0
+
+    def preload_images(self):
+        """
+        全画像を先読みする（AssetLoaderがデコードしておいた画像があれば使う）
+        画面のピクセル形式への変換や回転画像の作成を行うので，メインスレッドから呼ぶこと
+        """
+        t0 = time.perf_counter()
+        self.atlas()
+        for num in range(10):
+            self.bird_imgs(num)
+            self.face_img(num)
+        self.enemy_imgs()
+        self.image("fig/alien1.png")  # スタート画面の画像
+        self.explosion_imgs()
+        self.particle_imgs(ParticleEffects.colors, ParticleEffects.levels)
+        self.cry_img()
+        for rad in range(10, 51):
+            for color in Bomb.colors:
+                self.circle(rad, color)
+        self.cursor()
+        self.cursor(simple=True)
+        self.preload_time += time.perf_counter() - t0
+
+    def mark(self):
+        """
+        現在の統計を基準点として記録する
+        """
+        with self.lock:
+            self.marked = (self.hits, self.misses, self.disk_loads)
+
+    def report(self):
+        """
+        キャッシュのヒット・ミス数とディスク読み込み数を表示する
+        """
+        hits, misses, loads = self.marked
+        print(f"assets: {len(self.cache)} cached, hits={self.hits} misses={self.misses} disk_loads={self.disk_loads}")
+        print(f"  fonts: {len(self.font_cache)}/{self.max_fonts} cached, evictions={self.font_evictions}")
+        print(f"  since preload: hits={self.hits - hits} misses={self.misses - misses} disk_loads={self.disk_loads - loads}")
+        print(f"  preload: {self.preload_time * 1000:.1f} ms, slowest:")
+        for key, sec in sorted(self.times.items(), key=lambda item: -item[1])[:8]:
+            print(f"    {sec * 1000:7.2f} ms  {key}")
+
+
+class AssetLoader:
+    """
+    画像の先読みのうち，ファイルの読み込みとデコードだけを別スレッドで行うクラス
+    スタート画面を表示している間に読み込み，ゲームを始める前にwait()で完了を待つ
+    SDLの描画はスレッドセーフではないので，画面のピクセル形式への変換・回転画像の作成・アトラスの保存は
+    wait()の中でメインスレッドから行う（Assets.preload_images）
+    """
+    paths = ["fig/explosion.gif", "fig/8.png"]  # アトラスとスタート画面の画像以外に先読みする画像
+
+    def __init__(self, assets: Assets):
+        self.assets = assets
+        self.time = 0.0  # 別スレッドでの読み込みにかかった時間（秒）
+        self.convert_time = 0.0  # wait()の中でメインスレッドで変換にかかった時間（秒）
+        self.finished = None  # 読み込みが終わった時刻（time.perf_counter）
+        self.error = None  # 読み込み中に起きた例外
+        self.decoded = {}  # パス -> デコードした画像
+        self.atlas = None  # ディスクのキャッシュから読み込んだアトラスの(画像, 表)
+        self.thread = threading.Thread(target=self.run, name="AssetLoader", daemon=True)
+        self.thread.start()
+
+    def run(self):
+        t0 = time.perf_counter()
+        try:
+            self.atlas = SpriteAtlas.read_cache(self.assets.cache_dir)
+            paths = list(__class__.paths)
+            if self.atlas is None:  # キャッシュがなければアトラスを作るのに元画像を使う
+                paths += sorted({spec[0] for spec in SpriteAtlas.specs})
+            for path in paths:
+                self.decoded[path] = self.assets.decode(path)
+        except Exception as e:  # メインスレッドのwait()で送出し直す
+            self.error = e
+        self.finished = time.perf_counter()
+        self.time = self.finished - t0
+
+    def wait(self) -> float:
+        """
+        読み込みの完了を待ち，読み込んだ画像をメインスレッドで変換してAssetsに入れる
+        （読み込み中に起きた例外はここで送出する）
+        戻り値：待った時間（秒，変換の時間を含む）
+        """
+        t0 = time.perf_counter()
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+        t1 = time.perf_counter()
+        self.assets.decoded.update(self.decoded)
+        self.assets.decoded_atlas = self.atlas
+        self.decoded, self.atlas = {}, None
+        self.assets.preload_images()
+        self.convert_time = time.perf_counter() - t1
+        return time.perf_counter() - t0
+
+
+def convert_surface(img: pg.Surface, alpha: bool = True) -> pg.Surface:
+    """
+    Surfaceを画面のピクセル形式に変換する（画面が未作成ならそのまま返す）
+    引数1 img：変換するSurface
+    引数2 alpha：透過情報を残すかどうか
+    """
+    if pg.display.get_surface() is None:
+        return img
+    return img.convert_alpha() if alpha else img.convert()
+
+
+assets = Assets()
+
 class HpGauge:
     """
     HPゲージに関するクラス
     """
-    def __init__(self):
-        self.max_hp = 20  # HPの最大を20に設定
+    def __init__(self, max_hp: int = 20):
+        """
+        引数 max_hp：HPの最大（Tuning.bird_hp）
+        """
+        self.max_hp = max_hp  # HPの最大（標準は20）
         self.now_hp = self.max_hp  # 現在のHPを最大のHPに初期化
         self.empty_color = (128, 128, 128)  # 空のゲージを灰色に設定
         self.now_color = (0, 255, 0)  # 現在のゲージを緑色に設定
@@ -54,10 +694,11 @@ class HpGauge:
             self.now_color = (255, 255, 0)  # 現在のゲージの色を黄色に設定
         return self.now_hp == 0  # HPが0になったら、負け判定のTrueを返す
 
-    def update(self, screen: pg.Surface):
+    def update(self, screen: pg.Surface) -> pg.Rect:
         now_width = (self.now_hp / self.max_hp) * self.max_width  # 現在のゲージの幅を、現在のHPに応じて計算
-        pg.draw.rect(screen, self.empty_color, [WIDTH - 220, 20, self.max_width, self.max_hight])  # 空のゲージを描画
+        rect = pg.draw.rect(screen, self.empty_color, [WIDTH - 220, 20, self.max_width, self.max_hight])  # 空のゲージを描画
         pg.draw.rect(screen, self.now_color, [WIDTH - 220, 20, now_width, self.max_hight])  # 現在のゲージを描画
+        return rect  # 描画した範囲
 
 class Bird(pg.sprite.Sprite):
     """
@@ -77,18 +718,7 @@ class Bird(pg.sprite.Sprite):
         引数2 xy：こうかとん画像の位置座標タプル
         """
         super().__init__()
-        img0 = pg.transform.rotozoom(pg.image.load(f"fig/{num}.png"), 0, 0.9)
-        img = pg.transform.flip(img0, True, False)  # デフォルトのこうかとん
-        self.imgs = {
-            (+1, 0): img,  # 右
-            (+1, -1): pg.transform.rotozoom(img, 45, 0.9),  # 右上
-            (0, -1): pg.transform.rotozoom(img, 90, 0.9),  # 上
-            (-1, -1): pg.transform.rotozoom(img0, -45, 0.9),  # 左上
-            (-1, 0): img0,  # 左
-            (-1, +1): pg.transform.rotozoom(img0, 45, 0.9),  # 左下
-            (0, +1): pg.transform.rotozoom(img, -90, 0.9),  # 下
-            (+1, +1): pg.transform.rotozoom(img, -45, 0.9),  # 右下
-        }
+        self.imgs = assets.bird_imgs(num)
         self.dire = (+1, 0)
         self.image = self.imgs[self.dire]
         self.rect = self.image.get_rect()
@@ -98,20 +728,18 @@ class Bird(pg.sprite.Sprite):
         self.hyper_life = 10
         self.move = "neutral"
 
-    def change_img(self, num: int, screen: pg.Surface):
+    def change_img(self, num: int):
         """
-        こうかとん画像を切り替え，画面に転送する
-        引数1 num：こうかとん画像ファイル名の番号
-        引数2 screen：画面Surface
+        こうかとん画像を切り替える
+        引数 num：こうかとん画像ファイル名の番号
         """
-        self.image = pg.transform.rotozoom(pg.image.load(f"fig/{num}.png"), 0, 0.9)
-        screen.blit(self.image, self.rect)
+        self.image = assets.face_img(num)
 
-    def update(self, key_lst: list[bool], screen: pg.Surface):
+    def update(self, key_lst: list[bool], area: pg.Rect = SCREEN_RECT):
         """
         押下キーに応じてこうかとんを移動させる
-        引数1 key_lst：押下キーの真理値リスト
-        引数2 screen：画面Surface
+        引数1 key_lst：押下キーの真理値リスト（Bird.deltaのキーで引ける）
+        引数2 area：動ける範囲（ワールドの大きさ）
         """
         sum_mv = [0, 0]
         for k, mv in __class__.delta.items():
@@ -121,7 +749,7 @@ class Bird(pg.sprite.Sprite):
                 sum_mv[1] += mv[1]
             
         self.rect.move_ip(self.speed*sum_mv[0], self.speed*sum_mv[1])
-        if check_bound(self.rect) != (True, True):
+        if check_bound(self.rect, area) != (True, True):
             self.rect.move_ip(-self.speed*sum_mv[0], -self.speed*sum_mv[1])
         if not (sum_mv[0] == 0 and sum_mv[1] == 0):
             self.move = "move"
@@ -136,102 +764,222 @@ class Bird(pg.sprite.Sprite):
             self.speed = 10
             self.state = "normal"
             self.hyper_life = 10
-        
-        screen.blit(self.image, self.rect)
 
-class Bomb(pg.sprite.Sprite):
+class SpritePool:
+    """
+    使い終わったスプライトを回収して再利用するオブジェクトプール
+    短命なBomb，Beam，Explosionを毎回生成しないようにする
+    """
+    def __init__(self, cls, size: int = 256):
+        """
+        引数1 cls：プールするスプライトのクラス（resetメソッドを持つこと）
+        引数2 size：回収して保持するインスタンス数の上限
+        """
+        self.cls = cls
+        self.size = size
+        self.free = []  # 再利用待ちのインスタンス
+        self.created = 0  # 新規に生成したインスタンス数（総アロケーション数）
+        self.reused = 0  # 再利用したインスタンス数
+        self.live = 0  # 使用中のインスタンス数
+        self.peak = 0  # 使用中インスタンス数の最大値
+        self.marked = 0  # mark()した時点のcreated
+
+    def acquire(self, *args):
+        """
+        インスタンスを取り出し，argsで初期化して返す（空きがなければ新規生成）
+        """
+        if self.free:
+            obj = self.free.pop()
+            obj.reset(*args)
+            self.reused += 1
+        else:
+            obj = self.cls(*args)
+            obj.pool = self
+            self.created += 1
+        self.live += 1
+        self.peak = max(self.peak, self.live)
+        return obj
+
+    def release(self, obj):
+        """
+        kill()されたインスタンスを回収する
+        """
+        self.live -= 1
+        if len(self.free) < self.size:
+            self.free.append(obj)
+
+    def mark(self):
+        """
+        現在の総アロケーション数を基準点として記録する
+        """
+        self.marked = self.created
+
+    def stats(self) -> dict[str, int]:
+        """
+        アロケーションの統計を辞書で返す
+        """
+        return {
+            "created": self.created,
+            "created_since_mark": self.created - self.marked,
+            "reused": self.reused,
+            "live": self.live,
+            "peak": self.peak,
+            "free": len(self.free),
+        }
+
+
+class PooledSprite(pg.sprite.Sprite, metaclass=abc.ABCMeta):
+    """
+    SpritePoolで再利用されるスプライトの基底クラス
+    kill()されるとプールに戻る
+    数が多くなるので属性は__slots__に持ち，画像などの変わらないデータはインスタンス間で共有する
+    """
+    __slots__ = ("image", "rect", "pool")
+
+    def __init__(self, *args):
+        super().__init__()
+        self.pool = None  # 所属するSpritePool（プールを通さず生成した場合はNone）
+        self.reset(*args)
+
+    @abc.abstractmethod
+    def reset(self, *args):
+        """
+        生成時とプールから取り出したときに，引数で状態を初期化する（サブクラスで定義する）
+        """
+
+    def kill(self):
+        was_alive = self.alive()
+        super().kill()
+        if was_alive and self.pool is not None:
+            self.pool.release(self)
+
+
+class Bomb(PooledSprite):
     """
     爆弾に関するクラス
+    画像は色と半径ごとにAssets.circleの共有のSurfaceを使う
     """
+    __slots__ = ("vx", "vy", "type", "speed")
     colors = [(255, 0, 0), (0, 255, 0), (0, 0, 255), (255, 255, 0), (255, 0, 255), (0, 255, 255)]
-    
-    def __init__(self, emy: "Enemy", bird: Bird, bomb_type=0):
+    default_speed = 6  # 1ティックあたりの速さの標準（Tuning.bomb_speed）
+
+    @staticmethod
+    def launch(emy: "Enemy", bird: Bird, rng: random.Random = random) -> tuple[pg.Surface, pg.Rect, float, float]:
         """
-        爆弾円Surfaceを生成する
+        爆弾の画像・初期位置・方向ベクトルを決める（ArrayProjectilesと共通）
         引数1 emy：爆弾を投下する敵機
         引数2 bird：攻撃対象のこうかとん
-        引数3 bomb_type：爆弾の種類（0: 打てる, 1: 打てない）
+        引数3 rng：乱数生成器（WorldのRNG）
+        戻り値：(画像, Rect, 方向ベクトルのx成分, y成分)
         """
-        super().__init__()
-        rad = random.randint(10, 50)  # 爆弾円の半径：10以上50以下の乱数
-        self.image = pg.Surface((2*rad, 2*rad))
-        color = random.choice(__class__.colors)  # 爆弾円の色：クラス変数からランダム選択
-        pg.draw.circle(self.image, color, (rad, rad), rad)
-        self.image.set_colorkey((0, 0, 0))
-        self.rect = self.image.get_rect()
-        
+        rad = rng.randint(10, 50)  # 爆弾円の半径：10以上50以下の乱数
+        color = rng.choice(__class__.colors)  # 爆弾円の色：クラス変数からランダム選択
+        image = assets.circle(rad, color)
+        rect = image.get_rect()
+
         # 爆弾を投下するemyから見た攻撃対象のbirdの方向を計算
-        self.vx, self.vy = calc_orientation(emy.rect, bird.rect)  
-        self.rect.centerx = emy.rect.centerx
-        self.rect.centery = emy.rect.centery+emy.rect.height//2
-        self.speed = 6
+        vx, vy = calc_orientation(emy.rect, bird.rect)
+        rect.centerx = emy.rect.centerx
+        rect.centery = emy.rect.centery+emy.rect.height//2
+        return image, rect, vx, vy
+
+    def reset(self, emy: "Enemy", bird: Bird, bomb_type=0, rng: random.Random = random, speed: float = default_speed):
+        """
+        爆弾円Surfaceを設定する
+        引数1 emy：爆弾を投下する敵機
+        引数2 bird：攻撃対象のこうかとん
+        引数3 bomb_type：爆弾の種類（0: 打てる, 1: 打てない）
+        引数4 rng：乱数生成器（WorldのRNG）
+        引数5 speed：1ティックあたりの速さ（Tuning.bomb_speed）
+        """
+        self.image, self.rect, self.vx, self.vy = __class__.launch(emy, bird, rng)
         self.type = bomb_type  # 0: shootable, 1: non-shootable
+        self.speed = speed
 
-    def update(self):
+    def update(self, area: pg.Rect = SCREEN_RECT):
         """
         爆弾を速度ベクトルself.vx, self.vyに基づき移動させる
+        引数 area：ワールドの範囲（出たら消える）
         """
         self.rect.move_ip(self.speed*self.vx, self.speed*self.vy)
-        if check_bound(self.rect) != (True, True):
+        if check_bound(self.rect, area) != (True, True):
             self.kill()
     
     def bomb_check(self):
         self.kill()
 
-class Beam(pg.sprite.Sprite):
+class Beam(PooledSprite):
     """
     ビームに関するクラス
+    画像は向きごとにアトラスの共有のSurfaceを使う
     """
-    def __init__(self, bird: Bird, start_pos, target_pos):
+    __slots__ = ("vel_x", "vel_y", "offset")
+    speed = 10
+
+    @staticmethod
+    def launch(bird: Bird, start_pos, target_pos) -> tuple[pg.Surface, pg.Rect, float, float]:
         """
-        ビーム画像Surfaceを生成する
-        引数 bird：ビームを放つこうかとん
+        ビームの画像・初期位置・1ティックあたりの速度を決める（ArrayProjectilesと共通）
+        当たり判定は半径10の円と同じ大きさのRectで，画像は進む向きに回転させたビーム画像を使う
+        引数1 bird：ビームを放つこうかとん
+        引数2 start_pos：狙いの始点
+        引数3 target_pos：狙う位置（マウスカーソルの位置）
+        戻り値：(画像, Rect, 速度のx成分, y成分)
         """
-        super().__init__()
-        self.vx, self.vy = bird.dire
-        angle = math.degrees(math.atan2(-self.vy, self.vx))
-        self.image = pg.Surface((20, 20))
-        color = (0, 0, 255)  
-        pg.draw.circle(self.image, color, (10, 10), 10)
-        self.image.set_colorkey((0, 0, 0))
-        self.rect = self.image.get_rect()
-        self.rect.center = start_pos
-        self.target_pos = target_pos
-        self.rect.centery = bird.rect.centery+bird.rect.height*self.vy
-        self.rect.centerx = bird.rect.centerx+bird.rect.width*self.vx
-        self.speed = 10
+        vx, vy = bird.dire
+        rect = pg.Rect(0, 0, 20, 20)
+        rect.center = start_pos
+        rect.centery = bird.rect.centery+bird.rect.height*vy
+        rect.centerx = bird.rect.centerx+bird.rect.width*vx
         dx = target_pos[0] - start_pos[0]
         dy = target_pos[1] - start_pos[1]
         angle = math.atan2(dy, dx)
-        self.vel_x = math.cos(angle) * self.speed
-        self.vel_y = math.sin(angle) * self.speed
+        image = assets.atlas().frame("fig/beam.png", -math.degrees(angle))  # 画面のy軸は下向きなので符号を反転
+        return image, rect, math.cos(angle) * __class__.speed, math.sin(angle) * __class__.speed
 
-    def update(self):
+    def reset(self, bird: Bird, start_pos, target_pos):
         """
-        ビームを速度ベクトルself.vx, self.vyに基づき移動させる
-        引数 screen：画面Surface
+        ビーム画像Surfaceを設定する
+        引数1 bird：ビームを放つこうかとん
+        引数2 start_pos：狙いの始点
+        引数3 target_pos：狙う位置（マウスカーソルの位置）
+        """
+        self.image, self.rect, self.vel_x, self.vel_y = __class__.launch(bird, start_pos, target_pos)
+        self.offset = draw_offset(self.image, self.rect)
+
+    def update(self, area: pg.Rect = SCREEN_RECT):
+        """
+        ビームを速度ベクトルself.vel_x, self.vel_yに基づき移動させる
+        引数 area：ワールドの範囲（出たら消える）
         """
         # 弾を移動
         self.rect.x += self.vel_x
         self.rect.y += self.vel_y
-        if check_bound(self.rect) != (True, True):
+        if check_bound(self.rect, area) != (True, True):
             self.kill()
     
-class Explosion(pg.sprite.Sprite):
+def draw_offset(image: pg.Surface, rect: pg.Rect) -> tuple[int, int]:
+    """
+    画像をrectの中心にそろえて描くときの，rectの左上からのずれを返す
+    """
+    return (rect.width - image.get_width()) // 2, (rect.height - image.get_height()) // 2
+
+
+class Explosion(PooledSprite):
     """
     爆発に関するクラス
     """
-    def __init__(self, obj: "Bomb|Enemy", life: int):
+    __slots__ = ("imgs", "life")
+
+    def reset(self, rect: pg.Rect, life: int):
         """
-        爆弾が爆発するエフェクトを生成する
-        引数1 obj：爆発するBombまたは敵機インスタンス
+        爆弾が爆発するエフェクトを設定する
+        引数1 rect：爆発する爆弾または敵機のRect
         引数2 life：爆発時間
         """
-        super().__init__()
-        img = pg.image.load(f"fig/explosion.gif")
-        self.imgs = [img, pg.transform.flip(img, 1, 1)]
+        self.imgs = assets.explosion_imgs()
         self.image = self.imgs[0]
-        self.rect = self.image.get_rect(center=obj.rect.center)
+        self.rect = self.image.get_rect(center=rect.center)
         self.life = life
 
     def update(self):
@@ -245,91 +993,790 @@ class Explosion(pg.sprite.Sprite):
             self.kill()
 
 
-class Enemy(pg.sprite.Sprite):
+bomb_pool = SpritePool(Bomb)
+beam_pool = SpritePool(Beam)
+exp_pool = SpritePool(Explosion)
+pools = {"Bomb": bomb_pool, "Beam": beam_pool, "Explosion": exp_pool}
+
+
+class NullEffects:
     """
-    敵機に関するクラス
+    爆発エフェクトを出さないエフェクト（画面を使わない実行ではこれを使う）
+    爆発エフェクトは見た目だけのもので，ゲームの状態（World.state_hash）には含めない
     """
-    imgs = [pg.image.load(f"fig/alien{i}.png") for i in range(1, 4)]
-    
-    def __init__(self):
-        super().__init__()
-        self.image = pg.transform.rotozoom(random.choice(__class__.imgs), 0, 0.8)
-        self.rect = self.image.get_rect()
-        # 出現位置を画面内に限定
-        self.rect.center = (
-            random.randint(self.rect.width // 2, WIDTH - self.rect.width // 2),
-            random.randint(self.rect.height // 2, HEIGHT // 4),
-        )
-        self.vx, self.vy = random.choice([-3, -2, -1, 1, 2, 3]), +6
-        self.bound = random.randint(50, HEIGHT - 50)  # 停止位置
-        self.state = "down"  # 降下状態or停止状態
-        self.interval = random.randint(50, 300)  # 爆弾投下インターバル
-        self.max_hp = 10   # 敵のHPの最大を10に設定
-        self.now_hp = self.max_hp  # 敵の現在のHPを最大のHPに初期化
-        self.empty_color = (128, 128, 128)  # 空のゲージを灰色に設定
-        self.now_color = (0, 255, 0)   # 現在のゲージを緑色に設定
-
-    def decrease(self, damage):   # 敵のゲージを減らす関数
-        self.now_hp = max(0, self.now_hp - damage)  # 受けたダメージ分、現在のHPを減らす。ただし、0未満にはならない。
-        if self.now_hp <= self.max_hp * 0.2:  # もし現在のHPが最大のHPの20%以下になったら
-            self.now_color = (255, 0, 0)  # 現在のゲージの色を赤色に設定
-        elif self.now_hp <= self.max_hp * 0.4:  # もし現在のHPが最大のHPの40%以下になったら
-            self.now_color = (255, 255, 0)  # 現在のゲージの色を黄色に設定
-        return self.now_hp == 0  # HPが0になったら、撃破判定のTrueを返す
+    def burst(self, rect: pg.Rect, life: int):
+        """
+        rectの位置に爆発エフェクトを出す
+        引数1 rect：爆発する爆弾または敵機のRect
+        引数2 life：爆発の大きさ（敵機は100，爆弾は50）
+        """
 
     def update(self):
         """
-        敵機を速度ベクトルself.vyに基づき移動（降下）させる
-        ランダムに決めた停止位置_boundまで降下したら，_stateを停止状態に変更する
+        エフェクトを1ティック進める
         """
-        if self.state == "down":
-            self.rect.move_ip(self.vx, self.vy)
-            # 画面外にはみ出さないように制御
-            yoko, tate = check_bound(self.rect)
-            if not yoko:
-                self.vx *= -1  # 横方向の移動を反転
-            if self.rect.centery > self.bound:
-                self.vy = 0
-                self.state = "stop"
-        now_width = (self.now_hp / self.max_hp) * self.rect.width  # 現在のゲージの幅を、現在のHPに応じて計算
-        pg.draw.rect(pg.display.get_surface(), self.empty_color, [self.rect.x, self.rect.y - 10, self.rect.width, 5])  # 空のゲージを描画
-        pg.draw.rect(pg.display.get_surface(), self.now_color, [self.rect.x, self.rect.y - 10, now_width, 5])  # 現在のゲージを描画
-
-class Score:
-    """
-    打ち落とした爆弾，敵機の数をスコアとして表示するクラス
-    爆弾：1点
-    敵機：10点
-    """
-    def __init__(self):
-        self.font = pg.font.Font("font/BebasNeue-Regular.ttf", 40)
-        self.text_color = (0, 0, 0)  # 文字の色
-        self.bg_color = (255, 255, 255)  # 四角形の背景色（白）
-        self.value = 0
-        self.image = self.font.render(f"Score: {self.value}", 0, self.text_color)
-        self.rect = self.image.get_rect()
-        self.rect.center = WIDTH // 2, 30  # 表示位置を画面中央（幅）に調整
 
-        # count_ProSpirit用の設定
-        self.small_font = pg.font.Font("font/BebasNeue-Regular.ttf", 15)
-        self.small_text_color = (128, 128, 128)  # 灰色
+    def draw(self, renderer: "FullRenderer", offset: tuple[float, float] = (0, 0)):
+        """
+        エフェクトを描画する
+        引数2 offset：カメラの位置（ワールドの座標から引いて画面の座標にする）
+        """
 
-    def update(self, screen: pg.Surface, Enemy_num, count_ProSpirit, tmr):
+    def limit(self, fraction: float):
         """
-        スコアの更新と描画を行うメソッド
-        引数：
-          - screen: 描画対象のSurface
-          - Enemy_num: 敵機の数
-          - count_ProSpirit: 実行までのカウント
+        同時に出すエフェクトの上限を標準のfraction倍にする（QualityGovernorが品質を下げるときに使う）
         """
-        # スコア表示
-        text = f"{self.value:05} Pt  Time:{tmr//60:03}"  # {Enemy_num:03} {count_ProSpirit}
-        self.image = self.font.render(text, True, self.text_color)
-        self.rect = self.image.get_rect()  # 新しいサイズに合わせてRectを更新
-        self.rect.center = WIDTH // 2, 35  # 表示位置を再設定
 
-        # 四角形の大きさを文字サイズに基づいて設定
-        padding_x = 20  # テキストの周囲の余白
+    def __len__(self) -> int:
+        return 0
+
+
+NULL_EFFECTS = NullEffects()
+
+
+class SpriteEffects(NullEffects):
+    """
+    爆発画像のスプライトで爆発を表すエフェクト（NumPyがないとき用）
+    同時に表示する爆発はcapacity個までで，超えたら古いものから消す
+    """
+    def __init__(self, capacity: int = 64):
+        self.group = pg.sprite.Group()  # 追加した順に並ぶ
+        self.max_capacity = self.capacity = capacity
+        self.dropped = 0  # 上限を超えて消した爆発の数
+
+    def burst(self, rect: pg.Rect, life: int):
+        while len(self.group) >= self.capacity:
+            self.group.sprites()[0].kill()
+            self.dropped += 1
+        self.group.add(exp_pool.acquire(rect, life))
+
+    def limit(self, fraction: float):
+        self.capacity = max(1, int(self.max_capacity * fraction))
+
+    def update(self):
+        self.group.update()
+
+    def draw(self, renderer: "FullRenderer", offset: tuple[float, float] = (0, 0)):
+        ox, oy = offset
+        renderer.draw([(spr.image, (spr.rect.x - ox, spr.rect.y - oy)) for spr in self.group])
+
+    def __len__(self) -> int:
+        return len(self.group)
+
+
+class ParticleEffects(NullEffects):
+    """
+    爆発を火花のパーティクルで表すエフェクト
+    位置・速度・残り時間・色をNumPyの固定長の配列（リングバッファ）に持ち，毎ティックまとめて更新する
+    配列がいっぱいになったら古いパーティクルから上書きするので，一度に何機倒しても処理量はcapacityで頭打ちになる
+    描画は色と明るさの段階ごとに作っておいた小さな画像を加算合成で重ねる
+    """
+    colors = [(255, 150, 40), (255, 220, 110), (255, 80, 30)]  # 火花の色
+    levels = 6  # 明るさの段階数（残り時間が短いほど暗く小さくする）
+    drag = 0.93  # 1ティックごとの速度の減衰率
+
+    def __init__(self, capacity: int = 1024, seed: int = 0):
+        """
+        引数1 capacity：同時に持てるパーティクル数の上限
+        引数2 seed：飛び散り方の乱数のシード（見た目だけに使い，ゲームの乱数とは別）
+        """
+        self.capacity = capacity
+        self.size = capacity  # リングバッファとして使う長さ（limitで品質を下げると短くなる）
+        self.a = {name: np.zeros(capacity, np.float32) for name in ("x", "y", "vx", "vy", "life", "span")}
+        self.a["color"] = np.zeros(capacity, np.intp)
+        self.head = 0  # 次に書き込む位置（いちばん古いパーティクルの位置）
+        self.dropped = 0  # 消える前に上書きした（または入りきらずに作らなかった）パーティクル数
+        self.rng = np.random.default_rng(seed)
+        self.pending = []  # まだ配列に書き込んでいない爆発の(x, y, 大きさ)
+
+    def burst(self, rect: pg.Rect, life: int):
+        self.pending.append((*rect.center, life))  # 次のupdateでまとめて配列に書き込む
+
+    def flush(self):
+        """
+        ためておいた爆発のパーティクルをまとめてリングバッファに書き込む
+        """
+        if not self.pending:
+            return
+        a, rng = self.a, self.rng
+        bursts = np.array(self.pending, np.float32)  # (x, y, life)の行
+        self.pending.clear()
+        src = np.repeat(np.arange(len(bursts)), np.maximum(4, bursts[:, 2] // 4).astype(np.intp))  # 敵機は25個，爆弾は12個
+        if src.size > self.size:  # 入りきらない古い爆発の分は作る前に捨てる
+            self.dropped += src.size - self.size
+            src = src[-self.size:]
+        n = src.size
+        idx = (self.head + np.arange(n)) % self.size
+        self.head = (self.head + n) % self.size
+        self.dropped += int(np.count_nonzero(a["life"][idx] > 0))
+        x, y, life = bursts[src].T
+        angle = rng.uniform(0, 2 * math.pi, n)
+        speed = rng.uniform(0.3, 1.0, n) * life / 25
+        a["x"][idx], a["y"][idx] = x, y
+        a["vx"][idx] = np.cos(angle) * speed
+        a["vy"][idx] = np.sin(angle) * speed
+        a["life"][idx] = a["span"][idx] = rng.uniform(0.3, 0.6, n) * life
+        a["color"][idx] = rng.integers(0, len(__class__.colors), n)
+
+    def update(self):
+        self.flush()
+        a = self.a
+        a["x"] += a["vx"]
+        a["y"] += a["vy"]
+        a["vx"] *= __class__.drag
+        a["vy"] *= __class__.drag
+        a["life"] -= 1
+
+    def draw(self, renderer: "FullRenderer", offset: tuple[float, float] = (0, 0)):
+        self.flush()
+        a = self.a
+        x, y = a["x"] - offset[0], a["y"] - offset[1]
+        idx = np.flatnonzero((a["life"] > 0) & (x > -8) & (x < WIDTH + 8) & (y > -8) & (y < HEIGHT + 8))  # 画面外の火花は描かない
+        if not idx.size:
+            return
+        images = assets.particle_imgs(__class__.colors, __class__.levels)
+        levels = __class__.levels
+        level = np.minimum((a["life"][idx] / a["span"][idx] * levels).astype(np.intp), levels - 1)
+        kind = a["color"][idx] * levels + level
+        xs = (x[idx] - level - 1).astype(np.intp).tolist()  # 段階levelの画像の半径はlevel+1
+        ys = (y[idx] - level - 1).astype(np.intp).tolist()
+        renderer.draw([(images[k], (x, y), None, pg.BLEND_ADD) for k, x, y in zip(kind.tolist(), xs, ys)])
+
+    def limit(self, fraction: float):
+        # 後ろの方に残ったパーティクルは寿命が来れば消える
+        self.size = max(1, int(self.capacity * fraction))
+        self.head %= self.size
+
+    def __len__(self) -> int:
+        self.flush()
+        return int(np.count_nonzero(self.a["life"] > 0))
+
+
+effect_engines = {"sprites": SpriteEffects, "particles": ParticleEffects}
+
+
+class SpatialHash:
+    """
+    画面を一様なグリッドに分割し，スプライトを格納したセルだけを調べることで
+    衝突判定の総当たりを避けるクラス
+    """
+    def __init__(self, cell: int = 64, width: int = WIDTH, height: int = HEIGHT, threshold: int = 150):
+        """
+        引数1 cell：セルの一辺の長さ
+        引数2 width, height：グリッドで覆う領域の大きさ
+        引数3 threshold：この数未満のグループは総当たりで判定する
+                        （benchmark.py collide --repeat 200で測ったクロスオーバー点：
+                        n=125で同程度，n=150以上で空間ハッシュの方が速い）
+        """
+        self.cell = cell
+        self.threshold = threshold
+        self.active = False  # 前回のbuildでグリッドを使う判定になったか
+        self.cols = (width - 1) // cell + 1
+        self.rows = (height - 1) // cell + 1
+        self.bounds = pg.Rect(0, 0, width, height)
+        self.cells = [[] for _ in range(self.cols * self.rows)]
+        self.used = []  # 前回のbuildで要素を入れたセルの番号
+        self.order = {}  # スプライト -> 格納順（pygameのグループ順を再現するため）
+
+    def _span(self, rect: pg.Rect) -> tuple[int, int, int, int]:
+        """
+        rectが重なるセルの列・行の範囲(x0, x1, y0, y1)を返す
+        領域外にはみ出した部分は端のセルに丸める
+        """
+        r = rect.clip(self.bounds) or rect.clamp(self.bounds)
+        cell = self.cell
+        return r.left // cell, (r.right - 1) // cell, r.top // cell, (r.bottom - 1) // cell
+
+    def build(self, group: pg.sprite.AbstractGroup):
+        """
+        groupのスプライトでグリッドを作り直す
+        """
+        cells, cols = self.cells, self.cols
+        for i in self.used:
+            cells[i].clear()
+        used = self.used = []
+        order = self.order = {}
+        self.active = len(group) >= self.threshold
+        if not self.active:
+            return
+        for n, spr in enumerate(group.sprites()):
+            order[spr] = n
+            x0, x1, y0, y1 = self._span(spr.rect)
+            for y in range(y0, y1 + 1):
+                for x in range(x0, x1 + 1):
+                    cell = cells[y * cols + x]
+                    if not cell:
+                        used.append(y * cols + x)
+                    cell.append(spr)
+
+    def query(self, rect: pg.Rect) -> list[pg.sprite.Sprite]:
+        """
+        rectと同じセルに入っている候補スプライトを返す（重複なし，順不同）
+        """
+        x0, x1, y0, y1 = self._span(rect)
+        cells, cols = self.cells, self.cols
+        if x0 == x1 and y0 == y1:
+            return cells[y0 * cols + x0]
+        found = set()
+        for y in range(y0, y1 + 1):
+            for x in range(x0, x1 + 1):
+                found.update(cells[y * cols + x])
+        return list(found)
+
+    def spritecollide(self, sprite: pg.sprite.Sprite, group: pg.sprite.AbstractGroup, dokill: bool) -> list[pg.sprite.Sprite]:
+        """
+        pg.sprite.spritecollideと同じ結果を返す（事前にgroupでbuildしておくこと）
+        """
+        if not self.active:
+            return pg.sprite.spritecollide(sprite, group, dokill)
+        rect = sprite.rect
+        cands = self.query(rect)
+        hits = [cands[i] for i in rect.collidelistall(cands) if cands[i] in group]
+        if len(hits) > 1:
+            hits.sort(key=self.order.__getitem__)  # グループ内の順番に揃える
+        if dokill:
+            for spr in hits:
+                spr.kill()
+        return hits
+
+    def groupcollide(self, groupa: pg.sprite.AbstractGroup, groupb: pg.sprite.AbstractGroup, dokilla: bool, dokillb: bool) -> dict:
+        """
+        pg.sprite.groupcollideと同じ結果を返す（事前にgroupbでbuildしておくこと）
+        """
+        if not self.active:
+            return pg.sprite.groupcollide(groupa, groupb, dokilla, dokillb)
+        crashed = {}
+        for spr in groupa.sprites():
+            hits = self.spritecollide(spr, groupb, dokillb)
+            if hits:
+                crashed[spr] = hits
+                if dokilla:
+                    spr.kill()
+        return crashed
+
+
+class SpriteProjectiles:
+    """
+    爆弾とビームをスプライトのグループで持つ（標準の方式）
+    ArrayProjectilesと同じメソッドを持ち，Worldはどちらを使っても同じ結果になる
+    """
+    def __init__(self, bomb_speed: float = Bomb.default_speed, area: pg.Rect = SCREEN_RECT):
+        """
+        引数1 bomb_speed：爆弾の1ティックあたりの速さ
+        引数2 area：ワールドの範囲（出た弾は消える）
+        """
+        self.bomb_speed = bomb_speed
+        self.area = area
+        self.bombs = pg.sprite.Group()
+        self.beams = pg.sprite.Group()
+        self.beam_hash = SpatialHash(width=area.width, height=area.height)  # ビームの衝突判定用グリッド
+        self.bomb_hash = SpatialHash(width=area.width, height=area.height)  # 爆弾の衝突判定用グリッド
+
+    def record_prev(self, prev: dict):
+        """
+        描画の補間用に，ティック開始時の左上の位置をprevに記録する
+        """
+        for group in (self.bombs, self.beams):
+            for spr in group:
+                prev[spr] = spr.rect.topleft
+
+    def fire(self, bird: Bird, start_pos, target_pos):
+        """
+        こうかとんからtarget_posに向けてビームを撃つ
+        """
+        self.beams.add(beam_pool.acquire(bird, start_pos, target_pos))
+
+    def drop(self, emy: "Enemy", bird: Bird, bomb_type: int, rng: random.Random):
+        """
+        敵機emyからこうかとんに向けて爆弾を投下する
+        """
+        self.bombs.add(bomb_pool.acquire(emy, bird, bomb_type, rng, self.bomb_speed))
+
+    def build(self):
+        """
+        このティックの衝突判定の準備をする
+        """
+        self.beam_hash.build(self.beams)
+        self.bomb_hash.build(self.bombs)
+
+    def hit_enemies(self, emys: pg.sprite.Group) -> list:
+        """
+        ビームと衝突した敵機のリストを返す（衝突したビームは消える）
+        """
+        return list(self.beam_hash.groupcollide(emys, self.beams, False, True).keys())
+
+    def hit_bombs(self) -> list[pg.Rect]:
+        """
+        ビームと衝突した爆弾のうち撃ち落とせるものを消し，そのRectのリストを返す（衝突したビームは消える）
+        """
+        rects = []
+        for bomb in self.beam_hash.groupcollide(self.bombs, self.beams, False, True).keys():  # ビームと衝突した爆弾リスト
+            if bomb.type == 0:
+                bomb.bomb_check()
+                rects.append(bomb.rect)
+        return rects
+
+    def clear_bombs(self) -> list[pg.Rect]:
+        """
+        爆弾をすべて消し，そのRectのリストを返す
+        """
+        rects = []
+        for bomb in self.bombs.sprites():
+            bomb.bomb_check()  # プールに戻す
+            rects.append(bomb.rect)
+        return rects
+
+    def hit_bird(self, bird: Bird) -> int:
+        """
+        こうかとんと衝突した爆弾を消し，その数を返す
+        """
+        return len(self.bomb_hash.spritecollide(bird, self.bombs, True))
+
+    def advance_beams(self):
+        self.beams.update(self.area)
+
+    def advance_bombs(self) -> int:
+        """
+        爆弾を1ティック分動かし，ワールドの外に出て消えた（こうかとんがよけた）爆弾の数を返す
+        """
+        n = len(self.bombs)
+        self.bombs.update(self.area)
+        return n - len(self.bombs)
+
+    def state(self) -> tuple[list, list]:
+        """
+        World.state_hash用に，爆弾とビームの状態のリストを返す
+        """
+        return ([(tuple(b.rect), b.vx, b.vy, b.type) for b in self.bombs],
+                [(tuple(b.rect), b.vel_x, b.vel_y) for b in self.beams])
+
+    def nearest_bomb(self, pos: tuple[int, int]) -> tuple[int, int] | None:
+        """
+        posに一番近い爆弾の中心の位置を返す（爆弾がなければNone）
+        """
+        if not self.bombs:
+            return None
+        return min(self.bombs, key=lambda b: (b.rect.centerx - pos[0]) ** 2 + (b.rect.centery - pos[1]) ** 2).rect.center
+
+    def bomb_items(self, world: "World", alpha: float) -> list:
+        """
+        描画する爆弾の(画像, 補間した位置)のリストを返す
+        """
+        return [(spr.image, WorldView.lerp(world, spr, alpha)) for spr in self.bombs]
+
+    def beam_items(self, world: "World", alpha: float) -> list:
+        """
+        描画するビームの(画像, 補間した位置)のリストを返す
+        """
+        items = []
+        for spr in self.beams:
+            x, y = WorldView.lerp(world, spr, alpha)
+            items.append((spr.image, (x + spr.offset[0], y + spr.offset[1])))
+        return items
+
+
+def round_half_away(v: "np.ndarray") -> "np.ndarray":
+    """
+    pg.Rectの座標に小数を代入したときと同じく，0から遠い方へ四捨五入して整数にする
+    """
+    r = np.trunc(v)
+    return (r + np.sign(v) * (np.abs(v - r) >= 0.5)).astype(np.int64)
+
+
+def first_overlaps(a: dict, na: int, b: dict, nb: int) -> "np.ndarray":
+    """
+    bの各要素について，重なっているaの要素のうち先頭のもの（aの並び順）の番号を返す（なければ-1）
+    pg.sprite.groupcollide(a, b, False, True)はaを順に調べて重なったbを消していくので，
+    aのi番目がbを消すのは，そのbと重なる先頭のaがi番目のときと同じになる
+    x座標でソートしたaを二分探索して候補の組だけを調べる
+    引数1 a, b：x, y, w, hの配列を持つ辞書
+    引数2 na, nb：a, bの要素数
+    """
+    first = np.full(nb, na, dtype=np.int64)
+    if na == 0 or nb == 0:
+        return np.full(nb, -1, dtype=np.int64)
+    ax, ay, aw, ah = (a[k][:na] for k in "xywh")
+    bx, by, bw, bh = (b[k][:nb] for k in "xywh")
+    order = np.argsort(ax, kind="stable")
+    sx = ax[order]
+    lo = np.searchsorted(sx, bx - aw.max(), side="right")  # a.x + a.w > b.x となりうる先頭
+    hi = np.searchsorted(sx, bx + bw, side="left")  # a.x < b.x + b.w となる末尾
+    counts = np.maximum(hi - lo, 0)
+    total = int(counts.sum())
+    if total:
+        bi = np.repeat(np.arange(nb), counts)
+        offset = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        ai = order[np.repeat(lo, counts) + offset]
+        hit = (ax[ai] + aw[ai] > bx[bi]) & (ay[ai] < by[bi] + bh[bi]) & (ay[ai] + ah[ai] > by[bi])
+        np.minimum.at(first, bi[hit], ai[hit])
+    first[first == na] = -1
+    return first
+
+
+class ProjectileArrays:
+    """
+    同じ種類の弾の位置・速度・大きさ・種類・画像番号をNumPyの配列で持つ
+    配列は容量を倍々に広げ，先頭のn個だけを使う（並び順はスプライトのグループと同じく追加順）
+    """
+    fields = {
+        "x": np.int64, "y": np.int64, "w": np.int64, "h": np.int64,  # Rect
+        "px": np.int64, "py": np.int64,  # ティック開始時の位置（描画の補間用）
+        "ox": np.int64, "oy": np.int64,  # 画像を描く位置のRectの左上からのずれ（draw_offset）
+        "vx": np.float64, "vy": np.float64,  # 爆弾は方向ベクトル，ビームは1ティックあたりの速度
+        "type": np.int64,  # 爆弾の種類（0: 打てる, 1: 打てない）
+        "img": np.int64,  # imagesの番号
+    } if np is not None else {}
+
+    def __init__(self, truncate: bool, speed: float = 1, capacity: int = 64, area: pg.Rect = SCREEN_RECT):
+        """
+        引数1 truncate：Trueなら移動量を切り捨てる（Rect.move_ipと同じ），Falseなら移動後の座標を四捨五入する（Rect.x += vと同じ）
+        引数2 speed：速度ベクトルに掛ける速さ
+        引数3 capacity：最初に確保する要素数
+        引数4 area：ワールドの範囲（出た要素は消える）
+        """
+        self.truncate = truncate
+        self.speed = speed
+        self.area = area
+        self.n = 0
+        self.a = {name: np.zeros(capacity, dtype) for name, dtype in __class__.fields.items()}
+        self.images = []  # 画像番号 -> Surface
+        self.image_ids = {}  # id(Surface) -> 画像番号
+
+    def __len__(self) -> int:
+        return self.n
+
+    def __bool__(self) -> bool:
+        return self.n > 0
+
+    def col(self, name: str) -> "np.ndarray":
+        """
+        使用中の要素の配列（ビュー）を返す
+        """
+        return self.a[name][:self.n]
+
+    def add(self, image: pg.Surface, rect: pg.Rect, vx: float, vy: float, kind: int = 0):
+        """
+        弾を末尾に追加する
+        """
+        if self.n == len(self.a["x"]):
+            for name, arr in self.a.items():
+                self.a[name] = np.concatenate([arr, np.zeros_like(arr)])
+        img = self.image_ids.get(id(image))
+        if img is None:
+            img = self.image_ids[id(image)] = len(self.images)
+            self.images.append(image)
+        i, a = self.n, self.a
+        a["x"][i], a["y"][i], a["w"][i], a["h"][i] = rect
+        a["px"][i], a["py"][i] = rect.topleft
+        a["ox"][i], a["oy"][i] = draw_offset(image, rect)
+        a["vx"][i], a["vy"][i], a["type"][i], a["img"][i] = vx, vy, kind, img
+        self.n += 1
+
+    def keep(self, mask: "np.ndarray"):
+        """
+        maskがTrueの要素だけを並び順を保って残す
+        """
+        n = int(mask.sum())
+        if n == self.n:
+            return
+        for arr in self.a.values():
+            arr[:n] = arr[:self.n][mask]
+        self.n = n
+
+    def clear(self):
+        self.n = 0
+
+    def record_prev(self):
+        """
+        描画の補間用に，ティック開始時の位置を記録する
+        """
+        self.col("px")[:] = self.col("x")
+        self.col("py")[:] = self.col("y")
+
+    def rect(self, i: int) -> pg.Rect:
+        return pg.Rect(*(int(self.a[k][i]) for k in "xywh"))
+
+    def advance(self) -> int:
+        """
+        全要素を1ティック分動かし，画面からはみ出たものを消す（check_boundと同じ判定）
+        戻り値：消した要素の数
+        """
+        if not self.n:
+            return 0
+        x, y, w, h = (self.col(k) for k in "xywh")
+        if self.truncate:
+            x += np.trunc(self.speed * self.col("vx")).astype(np.int64)
+            y += np.trunc(self.speed * self.col("vy")).astype(np.int64)
+        else:
+            x[:] = round_half_away(x + self.speed * self.col("vx"))
+            y[:] = round_half_away(y + self.speed * self.col("vy"))
+        area = self.area
+        inside = (x >= area.left) & (x + w <= area.right) & (y >= area.top) & (y + h <= area.bottom)
+        n = self.n
+        if not inside.all():
+            self.keep(inside)
+        return n - self.n
+
+    def overlaps(self, rect: pg.Rect) -> "np.ndarray":
+        """
+        rectと重なっている要素のマスクを返す（Rect.colliderectと同じ判定）
+        """
+        x, y, w, h = (self.col(k) for k in "xywh")
+        return (x < rect.right) & (x + w > rect.left) & (y < rect.bottom) & (y + h > rect.top)
+
+    def items(self, alpha: float) -> list:
+        """
+        (画像, 補間した左上の位置)のリストを返す
+        """
+        x, y, ox, oy = self.col("x"), self.col("y"), self.col("ox"), self.col("oy")
+        if alpha >= 1:
+            pos = zip((x + ox).tolist(), (y + oy).tolist())
+        else:
+            px, py = self.col("px"), self.col("py")
+            pos = zip((px + (x - px) * alpha + ox).tolist(), (py + (y - py) * alpha + oy).tolist())
+        images = self.images
+        return [(images[i], p) for i, p in zip(self.col("img").tolist(), pos)]
+
+
+class ArrayProjectiles:
+    """
+    爆弾とビームをNumPyの配列（ProjectileArrays）で持ち，移動・画面外の削除・衝突判定をまとめて行う
+    SpriteProjectilesと同じメソッドを持ち，同じ入力なら同じ結果（World.state_hashも一致）になる
+    """
+    def __init__(self, bomb_speed: float = Bomb.default_speed, area: pg.Rect = SCREEN_RECT):
+        if np is None:
+            raise RuntimeError("ArrayProjectilesにはNumPyが必要です（pip install numpy）")
+        self.bombs = ProjectileArrays(truncate=True, speed=bomb_speed, area=area)
+        self.beams = ProjectileArrays(truncate=False, area=area)
+
+    def record_prev(self, prev: dict):
+        self.bombs.record_prev()
+        self.beams.record_prev()
+
+    def fire(self, bird: Bird, start_pos, target_pos):
+        self.beams.add(*Beam.launch(bird, start_pos, target_pos))
+
+    def drop(self, emy: "Enemy", bird: Bird, bomb_type: int, rng: random.Random):
+        self.bombs.add(*Bomb.launch(emy, bird, rng), bomb_type)
+
+    def build(self):
+        pass
+
+    def hit_enemies(self, emys: pg.sprite.Group) -> list:
+        emys = emys.sprites()
+        if not emys or not self.beams:
+            return []
+        rects = np.array([tuple(emy.rect) for emy in emys], dtype=np.int64)
+        first = first_overlaps(dict(zip("xywh", rects.T)), len(emys), self.beams.a, self.beams.n)
+        self.beams.keep(first < 0)
+        return [emys[i] for i in np.unique(first[first >= 0]).tolist()]
+
+    def hit_bombs(self) -> list[pg.Rect]:
+        bombs = self.bombs
+        if not bombs or not self.beams:
+            return []
+        first = first_overlaps(bombs.a, bombs.n, self.beams.a, self.beams.n)
+        self.beams.keep(first < 0)
+        hits = np.unique(first[first >= 0])
+        hits = hits[bombs.col("type")[hits] == 0]  # 撃ち落とせる爆弾だけ消す
+        rects = [bombs.rect(i) for i in hits.tolist()]
+        if rects:
+            mask = np.ones(bombs.n, dtype=bool)
+            mask[hits] = False
+            bombs.keep(mask)
+        return rects
+
+    def clear_bombs(self) -> list[pg.Rect]:
+        rects = [self.bombs.rect(i) for i in range(self.bombs.n)]
+        self.bombs.clear()
+        return rects
+
+    def hit_bird(self, bird: Bird) -> int:
+        if not self.bombs:
+            return 0
+        hit = self.bombs.overlaps(bird.rect)
+        self.bombs.keep(~hit)
+        return int(hit.sum())
+
+    def advance_beams(self):
+        self.beams.advance()
+
+    def advance_bombs(self) -> int:
+        return self.bombs.advance()
+
+    def state(self) -> tuple[list, list]:
+        bombs, beams = self.bombs, self.beams
+        return (list(zip(zip(*(bombs.col(k).tolist() for k in "xywh")),
+                         bombs.col("vx").tolist(), bombs.col("vy").tolist(), bombs.col("type").tolist())),
+                list(zip(zip(*(beams.col(k).tolist() for k in "xywh")),
+                         beams.col("vx").tolist(), beams.col("vy").tolist())))
+
+    def nearest_bomb(self, pos: tuple[int, int]) -> tuple[int, int] | None:
+        bombs = self.bombs
+        if not bombs:
+            return None
+        cx = bombs.col("x") + bombs.col("w") // 2
+        cy = bombs.col("y") + bombs.col("h") // 2
+        i = int(np.argmin((cx - pos[0]) ** 2 + (cy - pos[1]) ** 2))
+        return int(cx[i]), int(cy[i])
+
+    def bomb_items(self, world: "World", alpha: float) -> list:
+        return self.bombs.items(alpha)
+
+    def beam_items(self, world: "World", alpha: float) -> list:
+        return self.beams.items(alpha)
+
+
+projectile_engines = {"sprite": SpriteProjectiles, "numpy": ArrayProjectiles}
+
+
+class EnemyType:
+    """
+    敵機の種類（画像とHPの最大）ごとに変わらないデータ
+    同じ種類の敵機は1つのEnemyTypeを共有する（EnemyType.getで作る）
+    """
+    __slots__ = ("index", "image", "max_hp", "colors")
+    types = {}  # (画像の番号, HPの最大) -> EnemyType
+    empty_color = (128, 128, 128)  # 空のゲージの色（灰色）
+
+    def __init__(self, index: int, max_hp: int):
+        """
+        引数1 index：敵機画像の番号（Assets.enemy_imgsの何番目か）
+        引数2 max_hp：HPの最大
+        """
+        self.index = index
+        self.image = assets.enemy_imgs()[index]
+        self.max_hp = max_hp
+        self.colors = {}  # HP -> 現在のゲージの色
+
+    @classmethod
+    def get(cls, index: int, max_hp: int) -> "EnemyType":
+        """
+        画像の番号がindex，HPの最大がmax_hpの種類を返す（初めての種類なら作る）
+        """
+        kind = cls.types.get((index, max_hp))
+        if kind is None:
+            kind = cls.types[(index, max_hp)] = cls(index, max_hp)
+        return kind
+
+    def color(self, hp: int) -> tuple[int, int, int]:
+        """
+        HPがhpのときの現在のゲージの色（HPが減るほど緑→黄→赤になる．HPの値ごとに1回だけ決める）
+        """
+        color = self.colors.get(hp)
+        if color is None:
+            if hp <= self.max_hp * 0.2:  # もし現在のHPが最大のHPの20%以下なら
+                color = (255, 0, 0)  # 赤色
+            elif hp <= self.max_hp * 0.4:  # もし現在のHPが最大のHPの40%以下なら
+                color = (255, 255, 0)  # 黄色
+            else:
+                color = (0, 255, 0)  # 緑色
+            self.colors[hp] = color
+        return color
+
+
+class Enemy(pg.sprite.Sprite):
+    """
+    敵機に関するクラス
+    数が多くなるので属性は__slots__に持ち，画像の番号・HPの最大・ゲージの色は種類（EnemyType）にまとめて共有する
+    imageはpg.sprite.Groupの描画で読むので，種類の画像への参照をインスタンスにも持つ
+    pg.sprite.Spriteが所属グループ用の__dict__を持つので，__slots__で減るのはこのクラスの属性の分だけ
+    """
+    __slots__ = ("image", "rect", "vx", "vy", "bound", "state", "interval", "on_stop", "kind", "now_hp", "serial")
+
+    def __init__(self, rng: random.Random = random, hp: int = 10, area: pg.Rect = SCREEN_RECT):
+        """
+        引数1 rng：乱数生成器（WorldのRNG）
+        引数2 hp：HPの最大（Tuning.enemy_hp）
+        引数3 area：ワールドの範囲（この中の上4分の1に出現する）
+        """
+        super().__init__()
+        self.kind = EnemyType.get(rng.randrange(len(assets.enemy_imgs())), hp)  # 種類（画像はランダム）
+        self.image = self.kind.image
+        self.rect = self.image.get_rect()
+        # 出現位置をワールド内に限定
+        self.rect.center = (
+            rng.randint(area.left + self.rect.width // 2, area.right - self.rect.width // 2),
+            rng.randint(area.top + self.rect.height // 2, area.top + area.height // 4),
+        )
+        self.vx, self.vy = rng.choice([-3, -2, -1, 1, 2, 3]), +6
+        self.bound = rng.randint(area.top + 50, area.bottom - 50)  # 停止位置
+        self.serial = 0  # Worldに追加した順の通し番号
+        self.state = "down"  # 降下状態or停止状態
+        self.interval = rng.randint(50, 300)  # 爆弾投下インターバル
+        self.on_stop = None  # 停止状態になったときに呼ぶ関数（Worldが爆弾投下の予定を入れる）
+        self.now_hp = hp  # 敵の現在のHPを最大のHPに初期化
+
+    def decrease(self, damage):   # 敵のゲージを減らす関数
+        self.now_hp = max(0, self.now_hp - damage)  # 受けたダメージ分、現在のHPを減らす。ただし、0未満にはならない。
+        return self.now_hp == 0  # HPが0になったら、撃破判定のTrueを返す
+
+    def update(self, area: pg.Rect = SCREEN_RECT, steps: int = 1):
+        """
+        敵機を速度ベクトルself.vyに基づき移動（降下）させる
+        ランダムに決めた停止位置_boundまで降下したら，_stateを停止状態に変更する
+        引数1 area：ワールドの範囲
+        引数2 steps：まとめて進めるティック数（カメラから遠い敵機はまとめて動かす）
+        """
+        if self.state == "down":
+            self.rect.move_ip(self.vx * steps, self.vy * steps)
+            # 画面外にはみ出さないように制御
+            yoko, tate = check_bound(self.rect, area)
+            if not yoko:
+                self.vx *= -1  # 横方向の移動を反転
+                if steps > 1:  # まとめて動かすと大きくはみ出すので，ワールドの中に戻す（外に残ると向きの反転を繰り返して出られなくなる）
+                    self.rect.clamp_ip(area)
+            if self.rect.centery > self.bound:
+                self.vy = 0
+                self.state = "stop"
+                if self.on_stop is not None:
+                    self.on_stop(self)
+
+
+class Score:
+    """
+    打ち落とした爆弾，敵機の数をスコアとして表示するクラス
+    爆弾：1点
+    敵機：10点
+    表示する値が変わったときだけ文字を描き直し，それ以外は前回の画像を転送するだけにする
+    """
+    def __init__(self):
+        self.font = assets.font("font/BebasNeue-Regular.ttf", 40)
+        self.text_color = (0, 0, 0)  # 文字の色
+        self.bg_color = (255, 255, 255)  # 四角形の背景色（白）
+        self.image = self.font.render("Score: 0", 0, self.text_color)
+        self.rect = self.image.get_rect()
+        self.rect.center = WIDTH // 2, 30  # 表示位置を画面中央（幅）に調整
+        self.text = None  # 現在のself.imageの文字列
+        self.bg_surface = None  # 丸角の背景Surface
+        self.bg_rect = None
+
+        # count_ProSpirit用の設定
+        self.small_font = assets.font("font/BebasNeue-Regular.ttf", 15)
+        self.small_text_color = (128, 128, 128)  # 灰色
+        self.small_text = None  # 現在のself.small_imageの文字列
+        self.small_image = None
+        self.small_rect = None
+
+        self.interval = 1  # 文字を描き直すか調べる間隔（フレーム）．品質を下げると2になる
+        self.frames = 0
+
+        # 文字の描画回数の計測用
+        self.renders = 0  # font.renderを呼んだ総回数
+        self.rate = 0  # 直近1秒間のfont.renderの回数
+        self.window_start = time.perf_counter()
+        self.window_renders = 0
+
+    def render_score(self, text: str):
+        """
+        スコアの文字と背景を描き直す
+        """
+        self.image = self.font.render(text, True, self.text_color)
+        self.rect = self.image.get_rect()  # 新しいサイズに合わせてRectを更新
+        self.rect.center = WIDTH // 2, 35  # 表示位置を再設定
+
+        # 四角形の大きさを文字サイズに基づいて設定
+        padding_x = 20  # テキストの周囲の余白
         padding_y = 5
         bg_rect = pg.Rect(
             self.rect.x - padding_x,
@@ -337,93 +1784,791 @@ class Score:
             self.image.get_width() + 2 * padding_x,
             self.image.get_height() + 2 * padding_y,
         )
-        # 背景用の透明なSurfaceを作成
-        bg_surface = pg.Surface((bg_rect.width, bg_rect.height), pg.SRCALPHA)
-        pg.draw.rect(bg_surface, (255, 255, 255, 200), bg_surface.get_rect(), border_radius=15)  # 丸角の四角形を背景Surfaceに描画
-        screen.blit(bg_surface, (bg_rect.x, bg_rect.y))  # 背景Surfaceをメイン画面に描画
+        if self.bg_rect is None or self.bg_rect.size != bg_rect.size:  # 大きさが変わったときだけ背景を作り直す
+            # 背景用の透明なSurfaceを作成
+            self.bg_surface = pg.Surface((bg_rect.width, bg_rect.height), pg.SRCALPHA)
+            pg.draw.rect(self.bg_surface, (255, 255, 255, 200), self.bg_surface.get_rect(), border_radius=15)  # 丸角の四角形を背景Surfaceに描画
+        self.bg_rect = bg_rect
+        self.text = text
+        self.count_render()
+
+    def render_small(self, small_text: str):
+        """
+        右下の敵機の数とタイミングゲームまでのカウントの文字を描き直す
+        """
+        self.small_image = self.small_font.render(small_text, True, self.small_text_color)
+        self.small_rect = self.small_image.get_rect()
+        self.small_rect.bottomright = (WIDTH - 10, HEIGHT - 10)  # 画面右下に配置
+        self.small_text = small_text
+        self.count_render()
+
+    def count_render(self):
+        self.renders += 1
+        self.window_renders += 1
+
+    def update(self, screen: pg.Surface, world: "World") -> list[pg.Rect]:
+        """
+        スコアの描画を行うメソッド
+        引数：
+          - screen: 描画対象のSurface
+          - world: スコア，敵機の数，タイミングゲームまでのカウント，タイマーを持つWorld
+        戻り値：描画した範囲のRectのリスト
+        """
+        refresh = self.frames % self.interval == 0 or self.text is None
+        self.frames += 1
+        # スコア表示
+        text = f"{world.score:05} Pt  Time:{world.tmr//60:03}"
+        if refresh and text != self.text:
+            self.render_score(text)
+        bg_drawn = screen.blit(self.bg_surface, self.bg_rect)  # 背景Surfaceをメイン画面に描画
         screen.blit(self.image, self.rect)  # 文字を描画
 
-        # count_ProSpiritの表示
-        small_text = f"Enemy: {Enemy_num:03}  |  Timing Game: {count_ProSpirit}"
-        small_image = self.small_font.render(small_text, True, self.small_text_color)
-        small_rect = small_image.get_rect()
-        small_rect.bottomright = (WIDTH - 10, HEIGHT - 10)  # 画面右下に配置
-        screen.blit(small_image, small_rect)
+        # count_ProSpiritの表示
+        small_text = f"Enemy: {world.Enemy_num:03}  |  Timing Game: {world.count_ProSpirit}"
+        if (refresh or self.small_text is None) and small_text != self.small_text:
+            self.render_small(small_text)
+
+        now = time.perf_counter()
+        if now - self.window_start >= 1:  # 1秒ごとに描画回数を集計
+            self.rate = self.window_renders
+            self.window_renders = 0
+            self.window_start = now
+        return [bg_drawn, screen.blit(self.small_image, self.small_rect)]
+
+
+class FullRenderer:
+    """
+    毎フレーム背景ごと画面全体を描き直して転送する描画クラス（通常モード）
+    """
+    def __init__(self, screen: pg.Surface, bg_img: pg.Surface):
+        self.screen = screen
+        self.bg_img = bg_img
+
+    def begin(self):
+        """
+        フレームの描画を始める（背景を描く）
+        """
+        self.screen.blit(self.bg_img, [0, 0])
+
+    def draw(self, items: list[tuple[pg.Surface, tuple[float, float]]]):
+        """
+        画像を描画する
+        引数 items：(画像, 左上の位置)のリスト
+        """
+        self.screen.blits(items, doreturn=False)
+
+    def add(self, *rects: pg.Rect):
+        """
+        スプライト以外で描画した範囲を登録する
+        """
+
+    def invalidate(self):
+        """
+        画面全体が書き換えられたことを伝える（次フレームは全面再描画）
+        """
+
+    def end(self):
+        """
+        描画した内容をディスプレイに転送する
+        """
+        pg.display.update()
+
+    def report(self):
+        pass
+
+
+class DirtyRenderer(FullRenderer):
+    """
+    変化した矩形の下の背景だけを描き直し，その矩形だけをディスプレイに転送する描画クラス
+    前フレームと今フレームの矩形を合わせた面積がthresholdを超えたら画面全体を転送する
+    """
+    def __init__(self, screen: pg.Surface, bg_img: pg.Surface, threshold: float = 0.5):
+        """
+        引数1 screen：画面Surface
+        引数2 bg_img：背景Surface
+        引数3 threshold：画面全体の転送に切り替える変化面積の割合（画面全体を1とする）
+        """
+        super().__init__(screen, bg_img)
+        self.threshold = threshold * WIDTH * HEIGHT
+        self.prev = []  # 前フレームで描画した矩形
+        self.rects = []  # 今フレームで描画した矩形
+        self.full = True  # 今フレームを全面再描画するか（invalidateされたとき）
+        self.mask = pg.Mask(screen.get_size())  # 変化した範囲の面積を数えるためのマスク
+        self.fills = {}  # 大きさ -> その大きさの塗りつぶしたマスク
+        self.full_frames = 0  # 全面再描画したフレーム数
+        self.dirty_frames = 0  # 部分再描画したフレーム数
+        self.dirty_area = 0  # 部分再描画で転送した面積の合計
+
+    def area(self, rects: list[pg.Rect]) -> int:
+        """
+        矩形のリストが画面上で覆う面積を返す
+        HUDのように前フレームと同じ位置に描いた矩形や重なった矩形を重複して数えないように，
+        マスクに矩形を塗って数える
+        """
+        mask, fills = self.mask, self.fills
+        mask.clear()
+        for r in rects:
+            if r.width > 0 and r.height > 0:
+                fill = fills.get(r.size)
+                if fill is None:
+                    fill = fills[r.size] = pg.Mask(r.size, fill=True)
+                mask.draw(fill, r.topleft)
+        return mask.count()
+
+    def begin(self):
+        if self.full:
+            self.screen.blit(self.bg_img, [0, 0])
+        else:
+            for rect in self.prev:
+                self.screen.blit(self.bg_img, rect, rect)  # 前フレームの描画を背景で消す
+        self.rects = []
+
+    def draw(self, items: list[tuple[pg.Surface, tuple[float, float]]]):
+        self.rects.extend(self.screen.blits(items))
+
+    def add(self, *rects: pg.Rect):
+        self.rects.extend(rects)
+
+    def invalidate(self):
+        self.full = True
+
+    def end(self):
+        # 全面と部分のどちらで転送するかは，前フレームと今フレームの矩形を合わせた面積でここだけで決める
+        rects = self.prev + self.rects
+        area = 0 if self.full else self.area(rects)
+        if self.full or area > self.threshold:
+            pg.display.update()
+            self.full_frames += 1
+        else:
+            pg.display.update(rects)
+            self.dirty_frames += 1
+            self.dirty_area += area
+        self.prev = self.rects
+        self.full = False
+
+    def report(self):
+        mean = self.dirty_area / max(1, self.dirty_frames) / (WIDTH * HEIGHT)
+        print(f"render: full={self.full_frames} dirty={self.dirty_frames} mean dirty area={mean:.1%}")
+
+
+class HpBars:
+    """
+    全敵機のHPゲージを，敵機を描いた後にまとめて1回のblitsで描くHUDレイヤー
+    ゲージは色（緑・黄・赤・空の灰色）と幅ごとにキャッシュした帯を，HPの割合の幅だけ切り出して使う
+    """
+    height = 5  # ゲージの高さ
+
+    def __init__(self, skip_full: bool = False):
+        """
+        引数 skip_full：HPが満タンの敵機のゲージを描かないかどうか
+        """
+        self.skip_full = skip_full
+        self.hidden = False  # ゲージをまったく描かないか（品質を下げたとき）
+        self.strips = {}  # (色, 幅) -> 帯のSurface
+
+    def strip(self, color: tuple[int, int, int], width: int) -> pg.Surface:
+        """
+        色colorで幅widthのゲージの帯を返す
+        """
+        surf = self.strips.get((color, width))
+        if surf is None:
+            surf = self.strips[(color, width)] = convert_surface(pg.Surface((width, __class__.height)), alpha=False)
+            surf.fill(color)
+        return surf
+
+    def draw(self, screen: pg.Surface, emys: list[tuple["Enemy", tuple[float, float]]]) -> list[pg.Rect]:
+        """
+        敵機の上にHPゲージを描画する
+        引数1 screen：画面Surface
+        引数2 emys：(敵機, 敵機を描画する左上の位置)のリスト
+        戻り値：描画した範囲のRectのリスト
+        """
+        if self.hidden:
+            return []
+        seq = []
+        for emy, (x, y) in emys:
+            kind, hp = emy.kind, emy.now_hp
+            if self.skip_full and hp == kind.max_hp:
+                continue
+            bar_rect = pg.Rect(x, y - 10, emy.rect.width, __class__.height)
+            now_width = pg.Rect(0, 0, (hp / kind.max_hp) * emy.rect.width, __class__.height)  # 現在のHPに応じたゲージの幅
+            seq.append((self.strip(EnemyType.empty_color, bar_rect.width), bar_rect))  # 空のゲージ
+            if now_width.width > 0:
+                seq.append((self.strip(kind.color(hp), bar_rect.width), bar_rect, now_width))  # 現在のゲージ
+        return screen.blits(seq) if seq else []
+
+
+class WorldView:
+    """
+    Worldの状態を読み取って画面に描画するクラス
+    """
+    def __init__(self, screen: pg.Surface, renderer: FullRenderer):
+        self.screen = screen
+        self.renderer = renderer
+        self.score = Score()
+        self.hp_bars = HpBars()  # 敵機のHPゲージ
+        self.profiler = NULL_PROFILER
+        self.overlay = None  # プロファイラの表示（表示しないときはNone）
+        self.starfield = None  # 背景に描く星（カメラの位置や細かさが変わったら描き直す．Noneなら描き直さない）
+        self.scroll = None  # 背景を描いたときの(カメラの位置, 星のレイヤー数)
+        self.simple_cursor = False  # カーソルを簡単な画像で描くか（品質を下げたとき）
+        self.drawn = 0  # 直前のフレームで描いた敵機・弾の数
+        self.culled = 0  # 直前のフレームで画面外として描かなかった敵機・弾の数
+        self.frames = 0  # カメラが動くワールドを描いたフレーム数
+        self.total_drawn = 0
+        self.total_culled = 0
+
+    @staticmethod
+    def lerp(world: "World", spr: pg.sprite.Sprite, alpha: float) -> tuple[float, float]:
+        """
+        前のティックと現在のティックの位置を補間した，スプライトを描画する左上の位置を返す
+        引数1 world：スプライトが属するWorld
+        引数2 spr：スプライト
+        引数3 alpha：補間の割合（0：前のティック，1：現在のティック）
+        """
+        x, y = spr.rect.topleft
+        prev = world.prev.get(spr)
+        if prev is None or alpha >= 1:  # このティックに現れたスプライトは補間しない
+            return x, y
+        return prev[0] + (x - prev[0]) * alpha, prev[1] + (y - prev[1]) * alpha
+
+    def cull(self, items: list, offset: tuple[float, float], margin: int) -> list:
+        """
+        (画像, ワールドでの左上の位置)のリストを画面での位置に直し，
+        画面の周りmarginより外にかかるものだけを残して返す
+        """
+        ox, oy = offset
+        left, top, right, bottom = -margin, -margin, WIDTH + margin, HEIGHT + margin
+        kept = []
+        for image, (x, y) in items:
+            x, y = x - ox, y - oy
+            if x < right and y < bottom and x + image.get_width() > left and y + image.get_height() > top:
+                kept.append((image, (x, y)))
+        self.drawn += len(kept)
+        self.culled += len(items) - len(kept)
+        return kept
+
+    def draw_scene(self, world: "World", alpha: float = 1.0):
+        """
+        キャラクターとHUDを描画する（背景の描画と画面の転送は行わない）
+        カメラが動くワールドでは，ワールドの位置から画面の位置に直し，画面から遠いものは描かない
+        引数1 world：描画するWorld
+        引数2 alpha：前のティックから現在のティックへの補間の割合
+        """
+        screen, r, prof, lerp, camera = self.screen, self.renderer, self.profiler, self.lerp, world.camera
+        ox, oy = offset = camera.offset(alpha)  # カメラが動かないワールドでは(0, 0)
+        x, y = lerp(world, world.bird, alpha)
+        r.add(screen.blit(world.bird.image, (x - ox, y - oy)))
+        prof.mark("draw bird")
+        beams = world.projectiles.beam_items(world, alpha)
+        if camera.scrolls:
+            self.drawn = self.culled = 0
+            beams = self.cull(beams, offset, camera.margin)
+        r.draw(beams)
+        prof.mark("draw beams")
+        if camera.scrolls:
+            emys = [(emy, lerp(world, emy, alpha)) for emy in world.emys if camera.is_near(emy.rect)]
+            emys = [(emy, (x - ox, y - oy)) for emy, (x, y) in emys]
+            self.drawn += len(emys)
+            self.culled += len(world.emys) - len(emys)
+        else:
+            emys = [(emy, lerp(world, emy, alpha)) for emy in world.emys]
+        r.draw([(emy.image, pos) for emy, pos in emys])
+        prof.mark("draw emys")
+        bombs = world.projectiles.bomb_items(world, alpha)
+        if camera.scrolls:
+            bombs = self.cull(bombs, offset, camera.margin)
+            self.frames += 1
+            self.total_drawn += self.drawn
+            self.total_culled += self.culled
+        r.draw(bombs)
+        prof.mark("draw bombs")
+        world.effects.draw(r, offset)
+        prof.mark("draw effects")
+        r.add(*self.hp_bars.draw(screen, emys))  # 敵機のHPゲージ（スプライトの上に重ねる）
+        prof.mark("draw hp bars")
+        r.add(*self.score.update(screen, world))
+        prof.mark("Score.update")
+        r.add(world.hp_gauge.update(screen))  # HPゲージを表示
+        prof.mark("HpGauge.update")
+
+    def draw(self, world: "World", mouse_pos: tuple[int, int], alpha: float = 1.0):
+        """
+        1フレーム分を描画して画面に転送する
+        引数1 world：描画するWorld
+        引数2 mouse_pos：マウスカーソルの位置
+        引数3 alpha：前のティックから現在のティックへの補間の割合
+        """
+        if self.starfield is not None:
+            scroll = (world.camera.offset(alpha), self.starfield.detail)
+            if scroll != self.scroll:  # カメラが動いたか星の細かさが変わったら，背景の星を描き直す
+                self.scroll = scroll
+                self.starfield.draw(self.renderer.bg_img, scroll[0])
+                self.renderer.invalidate()
+        self.renderer.begin()
+        self.profiler.mark("draw background")
+        self.draw_scene(world, alpha)
+        # マウスカーソル位置にドーナツ型の円を描画
+        self.renderer.add(self.screen.blit(assets.cursor(self.simple_cursor), (mouse_pos[0] - 14, mouse_pos[1] - 14)))
+        self.profiler.mark("cursor")
+        if self.overlay is not None:
+            self.renderer.add(self.overlay.update(self.screen, self.profiler))
+            self.profiler.mark("profiler overlay")
+        self.renderer.end()
+        self.profiler.mark("display.update")
+
+    def cull_counts(self, world: "World") -> dict[str, int]:
+        """
+        プロファイラに渡す，直前のフレームで描かなかった数と直前のティックで動かさなかった遠くの敵機の数を返す
+        （カメラが動かないワールドでは空）
+        """
+        if not world.camera.scrolls:
+            return {}
+        return {"culled": self.culled, "far emys skipped": world.camera.far_skipped}
+
+    def report(self):
+        """
+        カメラが動くワールドを描いたときの，1フレームあたりの描画数・カリングした数を表示する
+        """
+        if self.frames:
+            print(f"culling: frames={self.frames} drawn/frame={self.total_drawn / self.frames:.1f} "
+                  f"culled/frame={self.total_culled / self.frames:.1f}")
+
+
+class Starfield:
+    """
+    奥行きの違う複数の星のレイヤーからなる背景
+    各レイヤーは画面サイズの継ぎ目のないタイルとして一度だけ生成してキャッシュし，
+    描画はタイルをずらして敷き詰める（wrap-around）転送だけで行う
+    """
+    layers = [  # (星の数の割合, 半径の範囲, 明るさ, カメラに対する移動の割合)
+        (0.5, (1, 1), 130, 0.2),  # 遠くの星
+        (0.3, (1, 2), 200, 0.5),
+        (0.2, (2, 3), 255, 1.0),  # 近くの星
+    ]
+
+    def __init__(self, star_count: int = 100, width: int = WIDTH, height: int = HEIGHT):
+        """
+        引数1 star_count：全レイヤー合計の星の数
+        引数2 width, height：タイルの大きさ
+        """
+        self.width, self.height = width, height
+        self.tiles = []  # レイヤーごとのタイル（黒をカラーキーにしたSurface）
+        self.detail = len(__class__.layers)  # 描くレイヤーの数（減らすと遠くのレイヤーから省く）
+        self.generate(star_count)
+
+    def generate(self, star_count: int, seed: int | None = None):
+        """
+        星の配置を作り直し，レイヤーのタイルを生成する
+        引数1 star_count：全レイヤー合計の星の数
+        引数2 seed：配置の乱数のシード（Noneならrandomから決める）
+        """
+        seed = random.getrandbits(32) if seed is None else seed
+        self.tiles = []
+        for i, (share, radius, value, speed) in enumerate(__class__.layers):
+            count = round(star_count * share)
+            rng = random.Random(seed * len(__class__.layers) + i)
+            if np is not None:
+                tile = self.render_numpy(count, radius, value, rng)
+            else:
+                tile = self.render_circles(count, radius, value, rng)
+            tile = convert_surface(tile, alpha=False)
+            tile.set_colorkey((0, 0, 0), pg.RLEACCEL)  # 星以外は透明（RLEで疎な画像の転送を速くする）
+            self.tiles.append(tile)
+
+    def render_numpy(self, count: int, radius: tuple[int, int], value: int, rng: random.Random) -> pg.Surface:
+        """
+        星の画素をsurfarrayでタイルに直接まとめて書き込む（端をまたぐ星は反対側に回り込ませる）
+        """
+        w, h = self.width, self.height
+        tile = convert_surface(pg.Surface((w, h)), alpha=False)
+        gen = np.random.default_rng(rng.getrandbits(64))
+        xs = gen.integers(0, w, count)
+        ys = gen.integers(0, h, count)
+        rs = gen.integers(radius[0], radius[1] + 1, count)
+        pixels = pg.surfarray.pixels2d(tile)  # タイルの画素の配列（ロック中は転送できない）
+        for r in range(radius[0], radius[1] + 1):
+            sel = rs == r
+            dx, dy = np.nonzero(np.add.outer(np.arange(-r, r + 1) ** 2, np.arange(-r, r + 1) ** 2) <= r * r)
+            pixels[(xs[sel, None] + dx - r) % w, (ys[sel, None] + dy - r) % h] = tile.map_rgb((value, value, value))
+        del pixels  # ロックを解除
+        return tile
+
+    def render_circles(self, count: int, radius: tuple[int, int], value: int, rng: random.Random) -> pg.Surface:
+        """
+        NumPyがない場合に，pg.draw.circleで星を1つずつ描いてタイルを作る
+        """
+        w, h = self.width, self.height
+        tile = pg.Surface((w, h))
+        for _ in range(count):
+            x, y, r = rng.randrange(w), rng.randrange(h), rng.randint(*radius)
+            for ox in {0, w if x < r else 0, -w if x > w - r else 0}:
+                for oy in {0, h if y < r else 0, -h if y > h - r else 0}:
+                    pg.draw.circle(tile, (value, value, value), (x + ox, y + oy), r)
+        return tile
+
+    def draw(self, dst: pg.Surface, camera: tuple[float, float] = (0, 0)):
+        """
+        黒で塗ったdstに，カメラ位置に応じてずらしたレイヤーを奥から順に描く（detailより多い分は遠くのレイヤーから省く）
+        引数1 dst：描画先のSurface
+        引数2 camera：カメラの位置（レイヤーごとにspeed倍だけずれる）
+        """
+        dst.fill((0, 0, 0))
+        w, h = self.width, self.height
+        skip = len(self.tiles) - self.detail
+        for tile, (share, radius, value, speed) in list(zip(self.tiles, __class__.layers))[skip:]:
+            ox = int(-camera[0] * speed) % w
+            oy = int(-camera[1] * speed) % h
+            for x in ((ox - w, ox) if ox else (0,)):
+                for y in ((oy - h, oy) if oy else (0,)):
+                    dst.blit(tile, (x, y))
+
+
+class NullGovernor:
+    """
+    品質を変えない（--governorなしのとき）
+    """
+    level = 0
+
+    def frame(self, ms: float):
+        """
+        1フレームの処理時間msを記録する
+        """
+
+    def skip(self):
+        """
+        タイミングゲームやゲームオーバー画面で止まっていたフレームを計測から外す
+        """
+
+    def report(self):
+        pass
+
+
+class QualityGovernor(NullGovernor):
+    """
+    直近のフレームの処理時間の移動平均を見て，予算を超えたら見た目の品質を1段階ずつ下げ，
+    予算に十分な余裕があれば1段階ずつ戻す
+    段階を変えた直後は平均を取り直し，下げる閾値（予算）と戻す閾値（予算のup倍）を離して行ったり来たりを防ぐ
+    """
+    levels = [  # 段階nでは1〜nの項目をすべて適用する
+        "full",
+        "hp bars off",  # 敵機のHPゲージを描かない
+        "effects capped",  # 同時に出す爆発エフェクトを4分の1にする
+        "hud half rate",  # スコアの文字を描き直すか調べるのを2フレームに1回にする
+        "simple cursor",  # カーソルをカラーキーの画像で描く
+        "starfield low",  # 背景の星を近くのレイヤーだけにする
+    ]
+
+    def __init__(self, view: WorldView, effects: NullEffects, starfield: Starfield, budget: float,
+                 window: int = 60, up: float = 0.6, log=print):
+        """
+        引数1 view：品質を変えるWorldView
+        引数2 effects：上限を変える爆発エフェクト
+        引数3 starfield：細かさを変える背景の星
+        引数4 budget：1フレームの処理時間の予算（ms）
+        引数5 window：移動平均を取るフレーム数（段階を変えてからこのフレーム数は変えない）
+        引数6 up：平均が予算のこの倍を下回ったら品質を1段階戻す
+        引数7 log：段階を変えたときのメッセージを出力する関数
+        """
+        self.view, self.effects, self.starfield = view, effects, starfield
+        self.budget = budget
+        self.up = up
+        self.log = log
+        self.times = collections.deque(maxlen=window)
+        self.total = 0.0  # timesの合計
+        self.level = 0
+        self.frames = 0  # 計測したフレーム数
+        self.level_frames = [0] * len(__class__.levels)  # 段階ごとのフレーム数
+        self.changes = 0  # 段階を変えた回数
+
+    def frame(self, ms: float):
+        times = self.times
+        if len(times) == times.maxlen:
+            self.total -= times[0]
+        times.append(ms)
+        self.total += ms
+        self.frames += 1
+        self.level_frames[self.level] += 1
+        if len(times) < times.maxlen:
+            return
+        mean = self.total / len(times)
+        if mean > self.budget and self.level < len(__class__.levels) - 1:
+            self.set_level(self.level + 1, mean)
+        elif mean < self.budget * self.up and self.level > 0:
+            self.set_level(self.level - 1, mean)
+
+    def skip(self):
+        self.times.clear()
+        self.total = 0.0
+
+    def set_level(self, level: int, mean: float | None = None):
+        """
+        品質の段階をlevelにして，各描画の設定に反映する
+        引数2 mean：段階を変えたときの平均の処理時間（ログ用）
+        """
+        old, self.level = self.level, level
+        view = self.view
+        view.hp_bars.hidden = level >= 1
+        self.effects.limit(0.25 if level >= 2 else 1.0)
+        view.score.interval = 2 if level >= 3 else 1
+        view.simple_cursor = level >= 4
+        self.starfield.detail = 1 if level >= 5 else len(Starfield.layers)
+        self.skip()
+        self.changes += 1
+        if mean is not None:
+            name = __class__.levels
+            self.log(f"quality: {old} ({name[old]}) -> {level} ({name[level]}) at frame {self.frames}, "
+                     f"mean {mean:.2f} ms, budget {self.budget:.2f} ms")
+
+    def report(self):
+        """
+        段階ごとのフレームの割合を表示する
+        """
+        share = "  ".join(f"{i}:{n / max(1, self.frames):.0%}" for i, n in enumerate(self.level_frames))
+        print(f"quality: frames={self.frames} changes={self.changes} final level={self.level} share {share}")
+
+
+class Scene(abc.ABC):
+    """
+    タイトル・ゲームオーバー・タイミングゲームなどの画面の基底クラス
+    動かない部分（静的レイヤー）は最初に表示するときに一度だけ作ってキャッシュし，
+    次に同じ画面を表示するときも使い回す．毎フレームは動く部分だけを描く
+    """
+    def __init__(self):
+        self.layer = None  # キャッシュした静的レイヤー
+        self.builds = 0  # 静的レイヤーを作った回数
+
+    def static_layer(self):
+        """
+        静的レイヤーを返す（未作成ならbuild()で作る）
+        """
+        if self.layer is None:
+            self.layer = self.build()
+            self.builds += 1
+        return self.layer
+
+    @abc.abstractmethod
+    def build(self):
+        """
+        静的レイヤーのSurfaceを作って返す（サブクラスで定義する）
+        """
+
+    def invalidate(self):
+        """
+        静的レイヤーを作り直すようにする（背景を変えたときなど）
+        """
+        self.layer = None
+
+
+class TitleScene(Scene):
+    """
+    スタート画面
+    背景・タイトル・ルール説明・キャラクターを1枚に合成しておき，毎フレームはボタンとカーソルだけを描く
+    """
+    instructions = [  # 操作説明テキスト
+        "ルール説明",
+        "・WASDで操作し，マウスを合わせてクリックで攻撃しよう。",
+        "・時々現れるタイミングゲームで大打撃を与えよう。",
+        "・HPがなくなるとゲームオーバーになるよ。"
+    ]
+    start_info = "『Start Game』にカーソルを合わせてクリック，またはスペースキーでゲームを開始しよう。" # スタート方法のテキスト
+    change_text = "'R'キーで背景を変更できます"
+
+    def __init__(self, screen: pg.Surface, bg_img: pg.Surface, starfield: Starfield):
+        """
+        引数1 screen：画面Surface
+        引数2 bg_img：背景Surface（Rキーで星を作り直す）
+        引数3 starfield：背景の星
+        """
+        super().__init__()
+        self.screen = screen
+        self.bg_img = bg_img
+        self.starfield = starfield
+        self.button_rect = pg.Rect(WIDTH // 2 - 150, HEIGHT // 2, 300, 50)
+        self.buttons = {}  # ボタンの色 -> ボタン画像
+        self.parts = None  # 背景に重ねる文字と画像
+
+    def build(self) -> pg.Surface:
+        layer = self.bg_img.copy()
+        layer.blits(self.texts(), doreturn=False)
+        return layer
+
+    def texts(self) -> list[tuple[pg.Surface, tuple[int, int]]]:
+        """
+        背景に重ねる文字とキャラクターの画像を(画像, 位置)のリストで返す
+        最初の1回だけ作り，Rキーで背景を変えたときは背景との合成だけをやり直す
+        """
+        if self.parts is None:
+            parts = self.parts = []
+            # タイトル表示
+            title = assets.font("font/YuseiMagic-Regular.ttf", 74).render("スカイバトル.", True, (255, 255, 255))
+            parts.append((title, title.get_rect(center=(WIDTH // 2, HEIGHT // 2 - 100)).topleft))
+            # キャラ表示
+            start_img = assets.image("fig/alien1.png")
+            start_rct = start_img.get_rect()
+            start_rct.center = WIDTH/2, HEIGHT/2
+            parts.append((start_img, start_rct.move(300, 0).topleft))
+            parts.append((start_img, start_rct.move(-300, 0).topleft))
+            # ルール説明表示
+            info_font = assets.font("font/YuseiMagic-Regular.ttf", 30)  # 説明文用のフォント
+            for i, line in enumerate(__class__.instructions):
+                parts.append((info_font.render(line, True, (255, 255, 255)), (150, HEIGHT//3*2 + i * 40)))  # 位置を調整
+            # スタート方法の表示
+            start_text = assets.font("font/YuseiMagic-Regular.ttf", 27).render(__class__.start_info, True, (255, 0, 0))
+            start_rect = start_text.get_rect(center=(WIDTH // 2, HEIGHT - 20))
+            start_bg = convert_surface(pg.Surface(start_rect.inflate(-6, -8).size), alpha=False)  # 背景の黒い矩形
+            parts.append((start_bg, start_rect.inflate(-6, -8).topleft))
+            parts.append((start_text, start_rect.topleft))
+            # "R"で背景を変えられることを右上に表示
+            change_text = assets.font("font/YuseiMagic-Regular.ttf", 15).render(__class__.change_text, True, (255, 255, 255))  # 白文字
+            parts.append((change_text, change_text.get_rect(topright=(WIDTH - 5, 0)).topleft))  # 右上に配置
+        return self.parts
+
+    def button(self, color: tuple[int, int, int]) -> pg.Surface:
+        """
+        色colorのボタン画像を返す（色ごとにキャッシュする）
+        """
+        if color not in self.buttons:
+            img = convert_surface(pg.Surface(self.button_rect.size), alpha=False)
+            img.fill(color)
+            text = assets.font("font/YuseiMagic-Regular.ttf", 50).render("Start Game", True, (0, 0, 255))
+            img.blit(text, text.get_rect(center=img.get_rect().center))
+            self.buttons[color] = img
+        return self.buttons[color]
+
+    def run(self, clock: pg.time.Clock) -> bool:
+        """
+        スタート画面を表示し，ゲームを始めるならTrue，終了するならFalseを返す
+        """
+        while True:
+            for event in pg.event.get():
+                if event.type == pg.QUIT or event.type == pg.KEYDOWN and event.key == pg.K_q:
+                    return False
+                elif (event.type == pg.MOUSEBUTTONDOWN and self.button_rect.collidepoint(event.pos)
+                      or event.type == pg.KEYDOWN and event.key == pg.K_SPACE):
+                    self.screen.blit(self.bg_img, [0, 0])
+                    pg.display.update()
+                    return True
+                elif event.type == pg.KEYDOWN and event.key == pg.K_r:
+                    self.starfield.generate(random.randint(10, 300))  # 星をランダムの量で作り直す
+                    self.starfield.draw(self.bg_img)
+                    self.invalidate()
+            self.draw()
+            clock.tick(60)
+
+    def draw(self):
+        """
+        スタート画面を1フレーム描いてディスプレイに転送する
+        """
+        self.screen.blit(self.static_layer(), [0, 0])
+        # ボタンの色変更
+        hover = self.button_rect.collidepoint(pg.mouse.get_pos())
+        self.screen.blit(self.button((200, 200, 200) if hover else (255, 255, 255)), self.button_rect)
+        # マウスカーソル位置に〇を描画
+        pg.draw.circle(self.screen, (255, 255, 255), pg.mouse.get_pos(), 14)  # 白い円を表示
+        pg.draw.circle(self.screen, (0, 0, 0, 0), pg.mouse.get_pos(), 10)  # 黒い円を表示
+        pg.display.update()
 
 
-def gameover(screen: pg.Surface, score: int) -> None:
-    clock = pg.time.Clock()  # ゲームのフレームレート管理用のClockオブジェクトを作成
-    alpha = 0  # 背景フェードイン用の透明度を初期化
+class GameOverScene(Scene):
+    """
+    ゲームオーバー画面
+    固定の文字と画像は一度だけ作って使い回し，スコアの文字は表示のたびに1回だけ作る
+    フェードインが終わった後は赤い背景と文字を合成した1枚を使い，毎フレームは画像の揺れだけを描く
+    自分ではループせず，メインループがstartの後に毎フレームupdateを呼んで進める
+    """
     fade_speed = 5  # 背景フェードインの速度
-    # 背景色の赤いレイヤー
-    red_img = pg.Surface((WIDTH, HEIGHT))  # 画面サイズに合わせたSurfaceを作成
-    red_img.fill((255, 127, 80))  # 赤みのあるオレンジ色で塗りつぶし
-    red_img.set_alpha(alpha)  # 初期透明度を設定
-    # フォント設定
-    font = pg.font.Font(None, 80)  # 大きいフォントサイズでフォントを設定
-    small_font = pg.font.Font("font/YuseiMagic-Regular.ttf", 40)  # 小さいフォントサイズでフォントを設定
-    score_font = pg.font.Font("font/YuseiMagic-Regular.ttf", 60)  # スコア表示用のフォント設定
-    # テキストレンダリング
-    txt = font.render("Game Over", True, (255, 255, 255))  # "Game Over"を白色で描画
-    txt_rct = txt.get_rect(center=(WIDTH / 2, HEIGHT / 3))  # 画面上部中央に配置
-    restart_txt = small_font.render("Enterキーを押して再起動するか、Qキーを押して終了します", True, (255, 255, 255))  
-    # 再起動/終了の説明文を白色で描画
-    restart_txt_rct = restart_txt.get_rect(center=(WIDTH / 2, HEIGHT - 100))  # 画面下部中央に配置（少し上に調整）
-    # スコア表示
-    score_text = score_font.render(f"Score: {score}", True, (255, 255, 255))  # スコアを白色で描画
-    score_rct = score_text.get_rect(center=(WIDTH / 2, HEIGHT / 2 + 100))  # スコアを中央より少し下に配置
-    # イラスト画像読み込み
-    cry_img = pg.image.load("fig/8.png")  # 画像を読み込む
-    cry_img = pg.transform.scale(cry_img, (150, 150))  # 画像サイズを150x150ピクセルに調整
-    cry_rct = cry_img.get_rect()  # 画像の位置情報を取得
-    cry_rct.center = WIDTH / 2, HEIGHT / 2  # 画面中央に配置
-    while True:  # 無限ループでゲームオーバー画面を表示
-        for event in pg.event.get():  # イベントを取得
+    fps = 60  # ゲームオーバー画面のフレームレート
+    leave_time = 1000  # Enter/Qキーを押してから画面を抜けるまでの時間（ミリ秒）
+
+    def __init__(self, screen: pg.Surface):
+        super().__init__()
+        self.screen = screen
+
+    def build(self) -> dict:
+        # 背景色の赤いレイヤー
+        red_img = convert_surface(pg.Surface((WIDTH, HEIGHT)), alpha=False)  # 画面サイズ・画面の形式に合わせたSurfaceを作成
+        red_img.fill((255, 127, 80))  # 赤みのあるオレンジ色で塗りつぶし
+        txt = assets.font(None, 80).render("Game Over", True, (255, 255, 255))  # "Game Over"を白色で描画
+        restart_txt = assets.font("font/YuseiMagic-Regular.ttf", 40).render("Enterキーを押して再起動するか、Qキーを押して終了します", True, (255, 255, 255))
+        return {
+            "red": red_img,
+            "texts": [
+                (txt, txt.get_rect(center=(WIDTH / 2, HEIGHT / 3))),  # 画面上部中央に配置
+                (restart_txt, restart_txt.get_rect(center=(WIDTH / 2, HEIGHT - 100))),  # 画面下部中央に配置（少し上に調整）
+            ],
+        }
+
+    def start(self, score: int):
+        """
+        ゲームオーバー画面の表示を始める（この後はメインループから毎フレームupdateを呼ぶ）
+        引数 score：表示するスコア
+        """
+        layer = self.static_layer()
+        self.alpha = 0  # 背景フェードイン用の透明度を初期化
+        layer["red"].set_alpha(self.alpha)  # 初期透明度を設定
+        score_text = assets.font("font/YuseiMagic-Regular.ttf", 60).render(f"Score: {score}", True, (255, 255, 255))  # スコアを白色で描画
+        self.texts = [layer["texts"][0], (score_text, score_text.get_rect(center=(WIDTH / 2, HEIGHT / 2 + 100))), layer["texts"][1]]
+        self.opaque = None  # フェードイン完了後の赤い背景と文字を合成した画像
+        self.cry_img = assets.cry_img()  # 150x150ピクセルに調整済みの画像を取得
+        self.cry_rct = self.cry_img.get_rect()  # 画像の位置情報を取得
+        self.cry_rct.center = WIDTH / 2, HEIGHT / 2  # 画面中央に配置
+        self.cry_x = self.cry_rct.centerx  # 揺れるアニメーション用の小数の位置
+        self.choice = None  # 押されたキーの結果（再起動ならTrue，終了ならFalse）
+        self.leaving = 0  # キーが押されてから画面を抜けるまでの残り時間（ミリ秒）
+
+    def update(self, events: list[pg.event.Event], ms: int) -> bool | None:
+        """
+        ゲームオーバー画面を1フレーム進めて描く
+        Enter/Qキーが押されてもleave_timeの間は表示を続けてから抜ける（その間もイベント処理と画面更新は続ける）
+        引数1 events：このフレームのイベント
+        引数2 ms：前のフレームからの経過時間（ミリ秒）
+        戻り値：表示を続けるならNone，再起動するならTrue，終了するならFalse
+        """
+        for event in events:  # イベントを処理
             if event.type == pg.QUIT:  # ウィンドウの×ボタンが押された場合
-                pg.quit()  # pygameを終了
-                sys.exit()  # プログラムを終了
-            elif event.type == pg.KEYDOWN:  # キーが押された場合
+                return False  # すぐに終了を示す
+            elif event.type == pg.KEYDOWN and self.choice is None:  # キーが押された場合
                 if event.key == pg.K_RETURN:  # Enterキーが押された場合
-                    time.sleep(1)  # 1秒間待機
-                    return True  # 再起動を示す
+                    self.choice, self.leaving = True, __class__.leave_time  # 1秒後に再起動を示す
                 elif event.key == pg.K_q:  # Qキーが押された場合
-                    time.sleep(1)  # 1秒間待機
-                    return None  # 終了を示す
-        # 背景のフェードイン効果
-        if alpha < 255:  # 透明度が最大値に達していない場合
-            alpha += fade_speed  # 透明度を増加
-            red_img.set_alpha(alpha)  # 増加した透明度を適用
-        # 描画
-        screen.blit(red_img, (0, 0))  # 赤い背景を描画
-        screen.blit(txt, txt_rct)  # "Game Over"テキストを描画
-        screen.blit(score_text, score_rct)  # スコアテキストを描画
-        screen.blit(restart_txt, restart_txt_rct)  # 再起動/終了の説明文を描画
-        screen.blit(cry_img, cry_rct)  # 泣いている画像を描画
-        # 簡単なアニメーション: 画像を左右に揺らす
-        cry_rct.centerx += 2 * (pg.time.get_ticks() // 100 % 2 * 2 - 1)  
-        # 100msごとに左右に動く方向を切り替え
+                    self.choice, self.leaving = False, __class__.leave_time  # 1秒後に終了を示す
+        if self.choice is not None:
+            self.leaving -= ms
+            if self.leaving <= 0:
+                return self.choice
+        screen, frames = self.screen, ms * 60 / 1000  # 経過時間をフレーム数に換算（60FPSの1フレームを1とする）
+        if self.opaque is not None:
+            screen.blit(self.opaque, (0, 0))
+        else:
+            # 背景のフェードイン効果
+            red_img = self.static_layer()["red"]
+            self.alpha = min(255, self.alpha + __class__.fade_speed * frames)  # 経過時間に応じて透明度を増加
+            red_img.set_alpha(int(self.alpha))  # 増加した透明度を適用
+            screen.blit(red_img, (0, 0))  # 赤い背景を描画
+            screen.blits(self.texts, doreturn=False)  # 文字を描画
+            if self.alpha >= 255:
+                self.opaque = screen.copy()
+        screen.blit(self.cry_img, self.cry_rct)  # 泣いている画像を描画
+        # 簡単なアニメーション: 画像を左右に揺らす（100msごとに左右に動く方向を切り替え）
+        self.cry_x += 2 * (pg.time.get_ticks() // 100 % 2 * 2 - 1) * frames
+        self.cry_rct.centerx = round(self.cry_x)
         pg.display.update()  # 画面を更新
-        clock.tick(60)  # 60FPSでループを制御
+        return None
 
-def stars(screen: pg.Surface, star_count: int = 100):
-    """
-    ランダムに星を描画する
-    引数1 screen：背景を描画するSurface
-    引数2 star_count：星の数（デフォルト100個）
-    """
-    for _ in range(star_count):  # 星の数だけループを実行
-        x = random.randint(0, WIDTH)  # 星のX座標をランダムに決定
-        y = random.randint(0, HEIGHT)  # 星のY座標をランダムに決定
-        size = random.randint(1, 3)  # 星のサイズを1〜3ピクセルの間でランダムに決定
-        pg.draw.circle(screen, (255, 255, 255), (x, y), size)  # 白色の星を描画
-        # (pg.draw.circle) # 白色の星を(x, y)の位置に指定したサイズで描画
 
-class ProSpirit:
+class ProSpirit(Scene):
     """
     タイミングゲーム用のクラス
+    黒い幕・説明文・ドーナツ型は最初の1回だけ作り，次のタイミングゲームでも使い回す
     """
+    game_info = "タイミングよくスペースキーを押せ.（黄色で全打撃/灰色で半打撃）" # ゲームの説明文
+    result_colors = {"Miss": (255, 0, 0), "Great": (0, 255, 0), "Nice": (255, 255, 255)} # 判定結果の文字色
+    result_time = 1000 # 判定結果を表示する時間（ミリ秒）
+
     def __init__(self):
-        self.font = pg.font.Font(None, 50) # フォントサイズ50のデフォルトフォントを設定
+        super().__init__()
+        self.font = assets.font(None, 50) # フォントサイズ50のデフォルトフォントを設定
         self.color = (0, 0, 255, 120) # 青色（透過）を設定
         self.NiceZone = (125, 125, 125, 200) # 灰色（透過）を設定
         self.GreatCircle = (255, 255, 0) # 黄色（枠）の色を設定
@@ -435,80 +2580,107 @@ class ProSpirit:
         self.GreatJudge = (self.outRADIUS + self.inRADIUS) // 2 # Greatの判定基準を計算
         self.SPEED = 4 # 青い円が小さくなる速度を設定
         self.decide = None # 判定結果を初期化
+        self.backdrop_img = None # タイミングゲーム中の背景（ゲーム画面と黒い幕などを合成したもの）
+        self.blue_imgs = {} # 半径 -> 青い円の画像
 
-    def start(self):
-        # ゲーム開始時の初期設定
+    def start(self, rng: random.Random = random):
+        # ゲーム開始時の初期設定（rng：乱数生成器）
         # self.x = random.randint(self.outRADIUS//2 + 10, WIDTH - self.outRADIUS//2 - 10)   # 
         # self.y = random.randint(self.outRADIUS//2 + 10, HEIGHT - self.outRADIUS//2 - 10)  # 
-        self.GreatJudge = random.randint(self.inRADIUS + 5, self.outRADIUS - 5) # 黄色い円のGreat基準をランダムに設定
+        self.GreatJudge = rng.randint(self.inRADIUS + 5, self.outRADIUS - 5) # 黄色い円のGreat基準をランダムに設定
         self.RADIUS = self.outRADIUS * 2 # 青い円の初期半径を再設定
 
-    def update(self, result_ProSpirit, screen, bird, key_lst, bg_img, Enemy_num, count_ProSpirit, tmr, emys, bombs, exps, score, hp_gauge, clock):
+    def update(self, screen, world, view, bg_img, clock):
+        """
+        タイミングゲームを実行し，判定結果を返す
+        開始時に止めたゲーム画面と黒い幕・説明文・ドーナツ型を1枚の背景に合成し，
+        毎フレームは円の周りだけを背景から描き直して転送する
+        判定結果は1秒間表示する（その間もイベント処理と画面更新は続ける）
+        引数1 screen：画面Surface
+        引数2 world：背景に描く（タイミングゲームの間は止めておく）World
+        引数3 view：Worldを描画するWorldView
+        引数4 bg_img：背景Surface
+        引数5 clock：フレームレート管理用のClock
+        戻り値：判定結果（"Great"/"Nice"/"Miss"），ウィンドウが閉じられたらNone
+        """
         tim = 0 # タイマーを初期化
-        game_font = pg.font.Font("font/YuseiMagic-Regular.ttf", 35) # ゲーム説明用のフォントを設定
-        game_info = "タイミングよくスペースキーを押せ.（黄色で全打撃/灰色で半打撃）" # ゲームの説明文
-        font = pygame.font.Font(None, 36) # 判定結果表示用のフォントを設定
-        black_img = pg.Surface((WIDTH, HEIGHT)) # 黒い背景画像を作成
-        black_img.set_alpha(150) # 背景画像の透明度を設定
-        game_text = game_font.render(game_info, True, (255, 255, 255)) # ゲーム説明文を描画
-        game_rect = game_text.get_rect(center=(WIDTH // 2, HEIGHT // 2 - 100)) # 説明文の位置を設定
-        donut = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA) # ドーナツ型の描画用Surfaceを作成
-        pygame.draw.circle(donut, self.NiceZone, (self.x, self.y), self.outRADIUS) # ドーナツ型の外側を描画
-        pygame.draw.circle(donut, (0, 0, 0, 0), (self.x, self.y), self.inRADIUS) # ドーナツ型の内側を描画
+        font = assets.font(None, 36) # 判定結果表示用のフォントを設定
+        backdrop = self.backdrop(screen, world, view, bg_img) # 止めたゲーム画面と黒い幕などを合成した背景
+        area = pg.Rect(0, 0, self.outRADIUS * 4 + 2, self.outRADIUS * 4 + 2) # 毎フレーム描き直す範囲（青い円の最大の大きさ）
+        area.center = self.x, self.y
         result_ProSpirit = None # 判定結果を初期化
-        GAME_ProSpirit = True # ゲームの進行フラグを初期化
+        result = None # 判定結果の文字
+        shown = 0 # 判定結果を表示している時間（ミリ秒）
 
-        while GAME_ProSpirit:
+        while shown < __class__.result_time:
             for event in pg.event.get(): # イベント処理ループ
                 if event.type == pg.QUIT: # ウィンドウを閉じるイベント
-                    pg.quit() # Pygameを終了
-                    sys.exit() # プログラムを終了
-                if event.type == pg.KEYDOWN and event.key == pg.K_SPACE: # スペースキーが押された場合
+                    return None # 終了を示す（後始末は呼び出し側で行う）
+                if event.type == pg.KEYDOWN and event.key == pg.K_SPACE and not result_ProSpirit: # スペースキーが押された場合
                     result_ProSpirit = self.judge() # 判定処理を実行
 
-            if self.RADIUS <= 0: # 青い円が消える場合
+            if self.RADIUS <= 0 and not result_ProSpirit: # 青い円が消える場合
                 result_ProSpirit = "Miss" # 判定をMissに設定
 
-            screen.blit(bg_img, [0, 0]) # 背景画像を描画
-            bird.update(key_lst, screen) # 鳥の状態を更新
-            emys.update() # 敵キャラクターを更新
-            emys.draw(screen) # 敵キャラクターを描画
-            bombs.update() # 爆弾を更新
-            bombs.draw(screen) # 爆弾を描画
-            exps.update() # 爆発エフェクトを更新
-            exps.draw(screen) # 爆発エフェクトを描画
-            score.update(screen, Enemy_num, count_ProSpirit, tmr) # スコアを更新
-            hp_gauge.update(screen) # HPゲージを更新
-            screen.blit(black_img, [0, 0]) # 黒い背景を描画
-            screen.blit(game_text, game_rect) # ゲーム説明文を描画
-            screen.blit(donut, (0, 0)) # ドーナツ型を描画
+            screen.blit(backdrop, area, area) # 円の周りだけ背景を描き直す
             pygame.draw.circle(screen, self.GreatCircle, (self.x, self.y), self.GreatJudge, 3) # 黄色い円の枠を描画
-
-            blue_surface = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA) # 青い円の描画用Surfaceを作成
-            pygame.draw.circle(blue_surface, self.color, (self.x, self.y), self.RADIUS) # 青い円を描画
-            screen.blit(blue_surface, (0, 0)) # 青い円を描画
+            if self.RADIUS > 0:
+                screen.blit(self.blue(self.RADIUS), (self.x - self.RADIUS, self.y - self.RADIUS)) # 青い円を描画
 
             if tim > 80 and not result_ProSpirit: # 判定が未決定で一定時間経過した場合
                 self.RADIUS -= self.SPEED # 青い円を縮小
             tim += 1 # タイマーを増加
 
-            pg.display.update() # 画面を更新
-            clock.tick(50) # フレームレートを制御
-
             if result_ProSpirit: # 判定が決定した場合
-                if result_ProSpirit == "Miss": # Missの場合
-                    result = font.render(result_ProSpirit, True, (255, 0, 0)) # 赤色でMissを描画
-                elif result_ProSpirit == "Great": # Greatの場合
-                    result = font.render(result_ProSpirit, True, (0, 255, 0)) # 緑色でGreatを描画
-                else: # Niceの場合
-                    result = font.render(result_ProSpirit, True, (255, 255, 255)) # 白色でNiceを描画
+                if result is None:
+                    result = font.render(result_ProSpirit, True, __class__.result_colors[result_ProSpirit]) # 判定結果の色で描画
                 screen.blit(result, (self.x - result.get_width() // 2, self.y - result.get_height() // 2)) # 判定結果を描画
-                pg.display.update() # 画面を更新
-                time.sleep(1) # 判定結果を表示するために1秒待機
-                GAME_ProSpirit = False # ゲーム終了フラグを設定
+
+            pg.display.update(area) # 画面を更新
+            elapsed = clock.tick(50) # フレームレートを制御
+            if result_ProSpirit:
+                shown += elapsed
 
         return result_ProSpirit # 判定結果を返す
 
+    def backdrop(self, screen, world, view, bg_img) -> pg.Surface:
+        """
+        ゲーム画面とタイミングゲームの静的レイヤーを画面に描き，そのコピーを背景として返す
+        背景のSurfaceは最初の1回だけ作り，次のタイミングゲームでも使い回す
+        """
+        screen.blit(bg_img, [0, 0]) # 背景画像を描画
+        view.draw_scene(world) # キャラクターとスコア，HPゲージを描画
+        screen.blits(self.static_layer(), doreturn=False) # 黒い背景・ゲーム説明文・ドーナツ型を描画
+        pg.display.update()
+        if self.backdrop_img is None:
+            self.backdrop_img = screen.copy()
+        else:
+            self.backdrop_img.blit(screen, (0, 0))
+        return self.backdrop_img
+
+    def blue(self, radius: int) -> pg.Surface:
+        """
+        半径radiusの青い円（透過）の画像を返す（半径ごとにキャッシュする）
+        """
+        if radius not in self.blue_imgs:
+            img = pygame.Surface((radius * 2, radius * 2), pygame.SRCALPHA)
+            pygame.draw.circle(img, self.color, (radius, radius), radius)
+            self.blue_imgs[radius] = convert_surface(img)
+        return self.blue_imgs[radius]
+
+    def build(self) -> list[tuple[pg.Surface, tuple[int, int]]]:
+        black_img = convert_surface(pg.Surface((WIDTH, HEIGHT)), alpha=False) # 黒い背景画像を作成
+        black_img.set_alpha(150) # 背景画像の透明度を設定
+        game_font = assets.font("font/YuseiMagic-Regular.ttf", 35) # ゲーム説明用のフォントを設定
+        game_text = game_font.render(__class__.game_info, True, (255, 255, 255)) # ゲーム説明文を描画
+        game_rect = game_text.get_rect(center=(WIDTH // 2, HEIGHT // 2 - 100)) # 説明文の位置を設定
+        donut = pygame.Surface((self.outRADIUS * 2, self.outRADIUS * 2), pygame.SRCALPHA) # ドーナツ型の描画用Surfaceを作成
+        center = (self.outRADIUS, self.outRADIUS)
+        pygame.draw.circle(donut, self.NiceZone, center, self.outRADIUS) # ドーナツ型の外側を描画
+        pygame.draw.circle(donut, (0, 0, 0, 0), center, self.inRADIUS) # ドーナツ型の内側を描画
+        donut = convert_surface(donut)
+        return [(black_img, (0, 0)), (game_text, game_rect.topleft), (donut, (self.x - self.outRADIUS, self.y - self.outRADIUS))]
+
     def judge(self):
         if abs(self.RADIUS - self.GreatJudge) <= 2.5: # 青い円の半径がGreat基準に近い場合
             self.decide = "Great" # 判定をGreatに設定
@@ -518,248 +2690,1187 @@ class ProSpirit:
             self.decide = "Miss" # 判定をMissに設定
         return self.decide # 判定結果を返す
 
-def reset_game(score, emys, bombs, hp_gauge, Enemy_num=0, tmr=0): 
-    score.value = 0 # スコアをリセット
-    Enemy_num = 0 # 敵の数をリセット
-    tmr = 0 # タイマーをリセット
-    hp_gauge.now_hp = hp_gauge.max_hp # HPを最大値に設定
-    emys.empty() # 敵を全削除
-    bombs.empty() # 爆弾を全削除
-    hp_gauge.now_color = (0, 255, 0) # HPゲージの色を緑に設定   
-    return Enemy_num, tmr # リセットされた値を返す
+class StageError(ValueError):
+    """
+    ステージファイルの内容が正しくないときの例外
+    """
+
+
+class Stage:
+    """
+    敵機の出現ウェーブを定義したステージ（JSONファイルから読み込む）
+
+    ファイル形式
+      {"name": ステージ名, "loop": 最後まで出現したら最初から繰り返すか（省略時false），
+       "length": 繰り返しの周期（ティック，省略時は最後の出現の次のティック），
+       "waves": [ウェーブ, ...]}
+      ウェーブ：{"at": 最初の出現ティック, "count": 出現数（省略時1）, "every": 出現間隔（ティック，countが2以上なら必須），
+               "bomb_interval": [爆弾投下間隔の最小, 最大]（省略時は敵機の標準）, "hp": HP（省略時はTuning.enemy_hp），
+               "image": 敵機画像の番号0〜2（省略時ランダム）}
+    繰り返さないステージは，最後のウェーブが出現した後はスコアに応じた通常の出現に戻る
+    """
+    wave_keys = {"at", "count", "every", "bomb_interval", "hp", "image"}
+
+    def __init__(self, data: dict, path: str | None = None):
+        """
+        引数1 data：ステージの定義（JSONを読み込んだ辞書）
+        引数2 path：読み込んだファイルのパス
+        """
+        errors = __class__.validate(data)
+        if errors:
+            raise StageError(f"{path or 'stage'}: " + "; ".join(errors))
+        self.path = path
+        self.name = data.get("name", path or "stage")
+        self.loop = data.get("loop", False)
+        self.waves = data["waves"]
+        self.spawns = sorted(  # (出現ティック, ウェーブ番号)
+            (wave["at"] + i * wave.get("every", 0), n)
+            for n, wave in enumerate(self.waves) for i in range(wave.get("count", 1))
+        )
+        self.length = data.get("length", self.spawns[-1][0] + 1)
+
+    @classmethod
+    def load(cls, path: str) -> "Stage":
+        """
+        ステージファイルを読み込む（内容が正しくなければStageErrorを送出する）
+        """
+        with open(path, encoding="utf-8") as f:
+            try:
+                data = json.load(f)
+            except json.JSONDecodeError as e:
+                raise StageError(f"{path}: {e}") from e
+        return cls(data, path)
+
+    @staticmethod
+    def validate(data) -> list[str]:
+        """
+        ステージの定義を検査し，問題点のリストを返す（問題がなければ空のリスト）
+        """
+        def is_int(v, lo=0):
+            return isinstance(v, int) and not isinstance(v, bool) and v >= lo
+
+        if not isinstance(data, dict):
+            return ["top level must be an object"]
+        errors = [f"unknown key '{k}'" for k in data if k not in ("name", "loop", "length", "waves")]
+        if not isinstance(data.get("loop", False), bool):
+            errors.append("'loop' must be true or false")
+        if "length" in data and not is_int(data["length"], 1):
+            errors.append("'length' must be an integer >= 1")
+        waves = data.get("waves")
+        if not isinstance(waves, list) or not waves:
+            return errors + ["'waves' must be a non-empty list"]
+        last = 0
+        for n, wave in enumerate(waves):
+            where = f"waves[{n}]"
+            if not isinstance(wave, dict):
+                errors.append(f"{where} must be an object")
+                continue
+            errors += [f"{where}: unknown key '{k}'" for k in wave if k not in Stage.wave_keys]
+            if not is_int(wave.get("at")):
+                errors.append(f"{where}: 'at' must be an integer >= 0")
+                continue
+            count = wave.get("count", 1)
+            if not is_int(count, 1):
+                errors.append(f"{where}: 'count' must be an integer >= 1")
+                continue
+            if "every" in wave and not is_int(wave["every"], 1):
+                errors.append(f"{where}: 'every' must be an integer >= 1")
+                continue
+            if count > 1 and "every" not in wave:
+                errors.append(f"{where}: 'every' is required when count > 1")
+                continue
+            last = max(last, wave["at"] + (count - 1) * wave.get("every", 0))
+            interval = wave.get("bomb_interval")
+            if interval is not None and not (isinstance(interval, list) and len(interval) == 2
+                                             and all(is_int(v, 1) for v in interval) and interval[0] <= interval[1]):
+                errors.append(f"{where}: 'bomb_interval' must be [min, max] with 1 <= min <= max")
+            if "hp" in wave and not is_int(wave["hp"], 1):
+                errors.append(f"{where}: 'hp' must be an integer >= 1")
+            if "image" in wave and not (is_int(wave["image"]) and wave["image"] < 3):
+                errors.append(f"{where}: 'image' must be 0, 1 or 2")
+        if "length" in data and is_int(data["length"], 1) and data["length"] <= last:
+            errors.append(f"'length' must be greater than the last spawn tick ({last})")
+        return errors
+
+    def compile(self, offset: int = 0) -> list[tuple]:
+        """
+        1周分の出現をWorldのイベントキューの形式 (ティック, 0, 通し番号, ウェーブ) のリストにする
+        引数 offset：最初のティック
+        """
+        return [(offset + tick, 0, offset * len(self.spawns) + i, self.waves[n]) for i, (tick, n) in enumerate(self.spawns)]
+
+    def make_enemy(self, wave: dict, rng: random.Random, hp: int = 10, area: pg.Rect = SCREEN_RECT) -> "Enemy":
+        """
+        ウェーブの設定に従って敵機を生成する
+        引数3 hp：ウェーブでHPを指定していないときのHP
+        引数4 area：ワールドの範囲
+        """
+        emy = Enemy(rng, hp, area)
+        if "image" in wave or "hp" in wave:
+            emy.kind = EnemyType.get(wave.get("image", emy.kind.index), wave.get("hp", hp))
+            emy.now_hp = emy.kind.max_hp
+            emy.image = emy.kind.image
+            emy.rect = emy.image.get_rect(center=emy.rect.center)
+        if "bomb_interval" in wave:
+            emy.interval = rng.randint(*wave["bomb_interval"])
+        return emy
+
+    def summary(self) -> str:
+        """
+        ステージの概要（ウェーブ数・敵機数・長さ）を返す
+        """
+        return (f"{self.name}: {len(self.waves)} waves, {len(self.spawns)} enemies, "
+                f"last spawn at tick {self.spawns[-1][0]} ({self.spawns[-1][0] / TICK_RATE:.1f}s)"
+                + (f", loops every {self.length} ticks" if self.loop else ""))
+
+
+class Tuning:
+    """
+    ゲームバランスの調整値（HP・ダメージ・出現間隔・爆弾の速さ）
+    Worldに渡して使う．balance.pyで組み合わせを変えて一括でシミュレーションする
+    """
+    def __init__(self, bird_hp: int = 20, bomb_damage: int = 2, enemy_hp: int = 10, beam_damage: int = 5,
+                 spawn_base: int = 60, spawn_decay: float = 0.9, spawn_step: int = 100, spawn_min: int = 10,
+                 bomb_speed: float = 6):
+        """
+        引数1 bird_hp：こうかとんのHPの最大
+        引数2 bomb_damage：爆弾が当たったときのダメージ
+        引数3 enemy_hp：敵機のHPの最大
+        引数4 beam_damage：ビームが敵機に当たったときのダメージ
+        引数5-8 spawn_*：敵機の出現間隔（ティック）は max(spawn_min, int(spawn_base * spawn_decay ** (スコア // spawn_step)))
+        引数9 bomb_speed：爆弾の1ティックあたりの速さ
+        """
+        self.bird_hp = bird_hp
+        self.bomb_damage = bomb_damage
+        self.enemy_hp = enemy_hp
+        self.beam_damage = beam_damage
+        self.spawn_base = spawn_base
+        self.spawn_decay = spawn_decay
+        self.spawn_step = spawn_step
+        self.spawn_min = spawn_min
+        self.bomb_speed = bomb_speed
+
+    def spawn_interval(self, score: int) -> int:
+        """
+        スコアscoreのときの敵機の出現間隔（ティック）を返す（スコアに応じて指数的に短縮）
+        """
+        return max(self.spawn_min, int(self.spawn_base * (self.spawn_decay ** (score // self.spawn_step))))
+
+    def as_dict(self) -> dict:
+        return dict(vars(self))
+
+
+class Inputs:
+    """
+    1ティック分のプレイヤーの入力
+    """
+    def __init__(self, keys=None, mouse=(0, 0), fire=0, hyper=False, insert=0):
+        """
+        引数1 keys：移動キー（Bird.deltaのキー）の押下状態の辞書
+        引数2 mouse：マウスカーソルの位置
+        引数3 fire：このティックの射撃回数（左クリック・スペースキー）
+        引数4 hyper：回避キー（F）が押されたか
+        引数5 insert：Insertキーが押された回数
+        """
+        self.keys = keys if keys is not None else {k: False for k in Bird.delta}
+        self.mouse = mouse
+        self.fire = fire
+        self.hyper = hyper
+        self.insert = insert
+
+
+class Camera:
+    """
+    ワールド（画面より広くてもよい）のうち，こうかとんを中心に画面に映す範囲を決めるカメラ
+    画面にmarginを加えた範囲（near）の外の敵機・弾は描画せず，敵機はfar_everyティックに1回だけまとめて動かす
+    """
+    far_every = 4  # カメラから遠い敵機を動かす間隔（ティック）
+
+    def __init__(self, area: pg.Rect, margin: int = 100):
+        """
+        引数1 area：ワールドの範囲（画面以上の大きさ）
+        引数2 margin：画面の外でも近くとして扱う幅
+        """
+        self.area = area
+        self.margin = margin
+        self.scrolls = area.width > WIDTH or area.height > HEIGHT  # 画面がワールドより小さく，カメラが動くか
+        self.view = pg.Rect(area.left, area.top, WIDTH, HEIGHT)  # 画面に映すワールドの範囲
+        self.near = self.view.inflate(2 * margin, 2 * margin)
+        self.prev = self.view.topleft  # 直前のティック開始時のviewの左上（描画の補間用）
+        self.far_moved = 0  # 直前のティックでまとめて動かした遠くの敵機の数
+        self.far_skipped = 0  # 直前のティックで動かさなかった遠くの敵機の数
+
+    def follow(self, rect: pg.Rect, snap: bool = False):
+        """
+        rectが画面の中心になるように（ワールドの端では端に合わせて）カメラを動かす
+        引数2 snap：補間せずにすぐ移ったことにするか（開始・再開時）
+        """
+        self.prev = self.view.topleft
+        self.view.center = rect.center
+        self.view.clamp_ip(self.area)
+        self.near.center = self.view.center
+        if snap:
+            self.prev = self.view.topleft
+
+    def offset(self, alpha: float = 1.0) -> tuple[float, float]:
+        """
+        前のティックと現在のティックの間を補間したカメラの位置（画面の左上のワールド座標）を返す
+        """
+        (px, py), (x, y) = self.prev, self.view.topleft
+        if alpha >= 1:
+            return x, y
+        return px + (x - px) * alpha, py + (y - py) * alpha
+
+    def is_near(self, rect: pg.Rect) -> bool:
+        """
+        rectが画面またはその周りmarginにかかっているか
+        """
+        return self.near.colliderect(rect)
+
+    def to_world(self, pos: tuple[int, int]) -> tuple[int, int]:
+        """
+        画面の座標（マウスカーソルの位置など）をワールドの座標にする
+        """
+        return pos[0] + self.view.x, pos[1] + self.view.y
+
+    def to_screen(self, pos: tuple[int, int]) -> tuple[int, int]:
+        """
+        ワールドの座標を画面の座標にする
+        """
+        return pos[0] - self.view.x, pos[1] - self.view.y
+
+
+class NullTelemetry:
+    """
+    プレイの記録（テレメトリ）を取らない（--telemetryなしのとき・画面を使わない実行）
+    """
+    enabled = False
+
+    def record(self, tick: int, kind: str, *values):
+        """
+        イベントを記録する（ゲームのスレッドから呼び，待たずに戻る）
+        引数1 tick：イベントが起きたティック
+        引数2 kind：イベントの種類（Telemetry.fieldsのキー）
+        引数3以降 values：イベントの値（Telemetry.fieldsの順）
+        """
+
+    def close(self):
+        pass
+
+
+NULL_TELEMETRY = NullTelemetry()
+
+
+class Telemetry(NullTelemetry):
+    """
+    プレイの記録（撃破・爆弾・タイミングゲーム・HP・回避行動）をJSON Linesのファイルに書き出すクラス
+    ゲームのスレッドは小さなタプルを上限つきのキューに入れるだけにし，ファイルへの書き込みは別スレッドでまとめて行う
+    キューがいっぱいのときは待たずにイベントを捨て，捨てた数を数える（フレームを止めない）
+    ファイルがmax_bytesを超えたら次のファイル（FILE.1.jsonl，FILE.2.jsonl，...）に切り替え，
+    fsync_interval秒ごとにディスクへ書き出す（fsync）
+    """
+    enabled = True
+    fields = {  # イベントの種類 -> 値の名前
+        "session": ("seed", "world"),  # 記録の開始（シード，ワールドの大きさ）
+        "kill": ("enemy", "cause"),  # 敵機の撃破（敵機の種類＝画像の番号，撃破の方法：beam/Great/Nice）
+        "bomb_shot": ("cause",),  # 爆弾の撃墜（beam/Great/Nice）
+        "bomb_dodged": ("count",),  # こうかとんに当たらずにワールドの外に出た爆弾の数
+        "hit": ("hp", "state"),  # 爆弾が当たった（残りHP，こうかとんの状態．hyperならダメージなし）
+        "hyper": (),  # 回避行動の開始
+        "prospirit": ("result",),  # タイミングゲームの判定結果（Great/Nice/Miss）
+        "hp": ("hp",),  # 1秒ごとのHP
+        "game_over": ("score",),
+        "restart": (),
+    }
+
+    def __init__(self, path: str, capacity: int = 4096, batch: int = 256, max_bytes: int = 1 << 20,
+                 fsync_interval: float = 2.0):
+        """
+        引数1 path：書き出すファイル（切り替えた後のファイルは拡張子の前に番号を付ける）
+        引数2 capacity：キューに入れておけるイベント数の上限
+        引数3 batch：1回にまとめて書き込むイベント数の上限
+        引数4 max_bytes：1つのファイルの大きさの上限
+        引数5 fsync_interval：fsyncする間隔（秒）
+        """
+        self.path = path
+        self.queue = queue.Queue(capacity)
+        self.batch = batch
+        self.max_bytes = max_bytes
+        self.fsync_interval = fsync_interval
+        self.started = time.perf_counter()
+        self.dropped = 0  # キューがいっぱいで捨てたイベント数（ゲームのスレッドだけが書き換える）
+        # 以下は書き込みスレッドだけが書き換える
+        self.written = 0  # 書き出したイベント数
+        self.counts = collections.Counter()  # 書き出したイベントの種類ごとの数
+        self.files = []  # 書き出したファイル
+        self.syncs = 0  # fsyncした回数
+        self.file = None
+        self.error = None  # 書き込み中に起きた例外（起きたらそれ以降のイベントは捨てる）
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="Telemetry", daemon=True)
+        self.thread.start()
+
+    def record(self, tick: int, kind: str, *values):
+        try:
+            self.queue.put_nowait((time.perf_counter(), tick, kind, values))
+        except queue.Full:
+            self.dropped += 1
+
+    def open_next(self):
+        """
+        次のファイルを開く（最初はpathそのもの）
+        """
+        if self.file is not None:
+            self.sync()
+            self.file.close()
+        base, ext = os.path.splitext(self.path)
+        path = self.path if not self.files else f"{base}.{len(self.files)}{ext}"
+        self.file = open(path, "w")
+        self.files.append(path)
+
+    def write(self, items: list[tuple]):
+        """
+        イベントをまとめてJSON Linesにして書き込む（書き込みスレッドで呼ぶ）
+        """
+        fields, started = __class__.fields, self.started
+        lines = []
+        for t, tick, kind, values in items:
+            event = {"t": round((t - started) * 1000, 1), "tick": tick, "event": kind}
+            event.update(zip(fields[kind], values))
+            lines.append(json.dumps(event, separators=(",", ":")) + "\n")
+            self.counts[kind] += 1
+        if self.file is None or self.file.tell() >= self.max_bytes:
+            self.open_next()
+        self.file.write("".join(lines))
+        self.written += len(items)
+
+    def sync(self):
+        """
+        書き込んだ内容をディスクに書き出す
+        """
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.syncs += 1
+
+    def run(self):
+        """
+        書き込みスレッドの処理：キューからイベントをまとめて取り出して書き込み，一定時間ごとにfsyncする
+        """
+        last_sync = time.monotonic()
+        while True:
+            stopping = self.stopping.is_set()
+            items = []
+            try:
+                items.append(self.queue.get(timeout=0.1))
+                while len(items) < self.batch:
+                    items.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+            done = stopping and not items  # 終了の指示の後，キューが空になったら終わる
+            if self.error is None:
+                try:
+                    if items:
+                        self.write(items)
+                    if self.file is not None and (done or time.monotonic() - last_sync >= self.fsync_interval):
+                        self.sync()
+                        last_sync = time.monotonic()
+                except OSError as e:  # ディスクがいっぱいなどで書けなくなったら，ゲームは止めずに記録だけやめる
+                    self.error = e
+            if done:
+                break
+        if self.file is not None:
+            self.file.close()
+
+    def close(self):
+        """
+        残りのイベントを書き出して書き込みスレッドを終え，集計を表示する
+        """
+        self.stopping.set()
+        self.thread.join()
+        files = ", ".join(self.files) if self.files else "(no events)"
+        print(f"telemetry: {self.written} events to {files} (dropped={self.dropped}, fsyncs={self.syncs})")
+        if self.error is not None:
+            print(f"telemetry: stopped writing: {self.error}")
+        kinds = "  ".join(f"{kind}={n}" for kind, n in self.counts.items())
+        if kinds:
+            print(f"  {kinds}")
+
+
+class World:
+    """
+    こうかとん，敵機，爆弾，ビーム，スコア，HP，タイマーなどゲームの状態をまとめて持ち，
+    画面を使わずに1ティックずつ進めるクラス
+    """
+    def __init__(self, seed: int | None = None, prospirit=None, projectiles: str = "sprite", stage: Stage | None = None,
+                 tuning: Tuning | None = None, size: tuple[int, int] = (WIDTH, HEIGHT)):
+        """
+        引数1 seed：乱数のシード（Noneならランダムに決める）
+        引数2 prospirit：タイミングゲームを実行して判定結果（"Great"/"Nice"/"Miss"）を返す関数
+                        World，タイミングゲーム用の乱数生成器を引数に呼ばれる．Noneなら常に"Miss"とする
+        引数3 projectiles：爆弾とビームの処理方式（"sprite"：スプライト，"numpy"：NumPyの配列）
+        引数4 stage：敵機の出現を決めるステージ（Noneならスコアに応じて出現させる）
+        引数5 tuning：ゲームバランスの調整値（Noneなら標準の値）
+        引数6 size：ワールドの大きさ（画面より大きければカメラがこうかとんを追いかける）
+        """
+        self.seed = seed if seed is not None else random.SystemRandom().getrandbits(63)
+        self.rng = random.Random(self.seed)  # ゲーム中の乱数はすべてこれから引く
+        self.prospirit = prospirit if prospirit is not None else (lambda world, rng: "Miss")
+        self.bird = Bird(3, (900, 400))
+        self.area = pg.Rect(0, 0, *size)  # ワールドの範囲
+        self.camera = Camera(self.area)
+        self.camera.follow(self.bird.rect, snap=True)
+        self.tuning = tuning if tuning is not None else Tuning()
+        self.projectiles = projectile_engines[projectiles](self.tuning.bomb_speed, self.area)  # 爆弾とビーム
+        self.bombs = self.projectiles.bombs
+        self.beams = self.projectiles.beams
+        self.effects = NULL_EFFECTS  # 爆発エフェクト（画面に描くときにmainで差し替える）
+        self.telemetry = NULL_TELEMETRY  # プレイの記録（--telemetryのときにmainで差し替える）
+        self.emys = pg.sprite.Group()
+        self.hp_gauge = HpGauge(self.tuning.bird_hp)
+        self.score = 0
+        self.Enemy_num = 0  # 敵機の数
+        self.count_ProSpirit = None  # タイミングゲーム実行までのカウント
+        self.tmr = 0
+        self.inputs = Inputs()  # 処理中のティックの入力
+        self.over = False  # ゲームオーバーになったか
+        self.last_ProSpirit = None  # 直前のティックで行ったタイミングゲームの判定結果
+        self.profiler = NULL_PROFILER  # 処理時間の計測用
+        self.prev = {}  # 直前のティック開始時のスプライトの左上の位置（描画の補間用）
+        self.stage = stage
+        # 時刻順のイベントキュー（heapq）．要素は (ティック, 種類, 通し番号, 対象) で，
+        # 種類0はステージの出現（対象はウェーブ），種類1は爆弾投下（対象は敵機）
+        # 同じティックでは出現が先，爆弾投下は敵機の出現順になる
+        self.events = []
+        self.serial = 0  # 敵機の通し番号
+        self.drop_tick = 0  # 爆弾投下をまだ処理していない最初のティック
+        self.next_cycle = 0  # 繰り返すステージの次の周回を始めるティック
+        self.start_stage()
+
+    def start_stage(self):
+        """
+        イベントキューを空にし，ステージがあれば最初の周回の出現を入れる
+        """
+        self.events = []
+        self.drop_tick = 0
+        if self.stage is not None:
+            self.events = self.stage.compile()
+            heapq.heapify(self.events)
+            self.next_cycle = self.stage.length
+
+    def add_enemy(self, emy: "Enemy"):
+        """
+        敵機を追加し，停止状態になったら爆弾投下の予定を入れるようにする
+        """
+        self.emys.add(emy)
+        self.Enemy_num += 1  # 敵機数を増やす
+        emy.serial = self.serial
+        self.serial += 1
+        emy.on_stop = self.schedule_drop
+        if emy.state == "stop":
+            self.schedule_drop(emy)
+
+    def schedule_drop(self, emy: "Enemy"):
+        """
+        停止した敵機の最初の爆弾投下（ティックがintervalの倍数になるとき）をイベントキューに入れる
+        """
+        tick = self.drop_tick + (-self.drop_tick) % emy.interval
+        heapq.heappush(self.events, (tick, 1, emy.serial, emy))
+
+    def counts(self) -> dict[str, int]:
+        """
+        グループごとのスプライト数を返す
+        """
+        return {"emys": len(self.emys), "bombs": len(self.bombs), "beams": len(self.beams), "effects": len(self.effects)}
+
+    def reset(self):
+        """
+        ゲームオーバー後の再開のために状態を初期化する
+        """
+        self.score = 0 # スコアをリセット
+        self.Enemy_num = 0 # 敵の数をリセット
+        self.tmr = 0 # タイマーをリセット
+        self.hp_gauge.now_hp = self.hp_gauge.max_hp # HPを最大値に設定
+        self.hp_gauge.now_color = (0, 255, 0) # HPゲージの色を緑に設定
+        self.emys.empty() # 敵を全削除
+        self.projectiles.clear_bombs() # 爆弾を全削除
+        self.over = False
+        self.prev = {}
+        self.camera.follow(self.bird.rect, snap=True)
+        self.telemetry.record(self.tmr, "restart")
+        self.start_stage()
+
+    def state_hash(self) -> str:
+        """
+        ゲームの状態（乱数生成器の状態を含む）のハッシュ値を返す
+        リプレイの再生結果が記録時と一致するかの確認に使う
+        """
+        bird = self.bird
+        bombs, beams = self.projectiles.state()
+        state = (
+            self.score, self.tmr, self.Enemy_num, self.count_ProSpirit, self.hp_gauge.now_hp,
+            tuple(bird.rect), bird.dire, bird.state, bird.hyper_life, bird.speed,
+            [(tuple(e.rect), e.vx, e.vy, e.state, e.bound, e.interval, e.now_hp) for e in self.emys],
+            bombs,
+            beams,
+            self.rng.getstate(),
+        )
+        return hashlib.sha256(repr(state).encode()).hexdigest()
+
+    def update_enemies(self):
+        """
+        敵機を動かす．カメラが動くワールドでは，カメラの近くの敵機だけを毎ティック動かし，
+        遠くの敵機はCamera.far_everyティックに1回（敵機ごとにずらして）その分をまとめて動かす
+        """
+        camera = self.camera
+        if not camera.scrolls:
+            self.emys.update(self.area)
+            return
+        every, tmr, area = camera.far_every, self.tmr, self.area
+        moved = skipped = 0
+        for emy in self.emys.sprites():
+            if camera.is_near(emy.rect):
+                emy.update(area)
+            elif (tmr + emy.serial) % every == 0:
+                emy.update(area, every)
+                moved += 1
+            else:
+                skipped += 1
+        camera.far_moved, camera.far_skipped = moved, skipped
+
+    def kill_enemy(self, emy: "Enemy", cause: str = "beam"):
+        """
+        敵機を撃破する
+        引数2 cause：撃破の方法（"beam"，タイミングゲームの"Great"/"Nice"）
+        """
+        if self.telemetry.enabled:  # 記録しないときは値も作らない
+            self.telemetry.record(self.tmr, "kill", emy.kind.index, cause)
+        self.emys.remove(emy)  # 敵のリストからemyを削除
+        self.effects.burst(emy.rect, 100)  # 爆発エフェクト
+        self.score += 10  # 10点アップ
+        self.bird.change_img(6)  # こうかとん喜びエフェクト
+        self.Enemy_num -= 1 # 敵機数を減らす
+
+    def kill_bomb(self, rect: pg.Rect, cause: str = "beam"):
+        """
+        撃ち落とした爆弾を爆発させる（爆弾自体はprojectilesが消す）
+        引数1 rect：撃ち落とした爆弾のRect
+        引数2 cause：撃ち落とした方法（"beam"，タイミングゲームの"Great"/"Nice"）
+        """
+        self.telemetry.record(self.tmr, "bomb_shot", cause)
+        self.effects.burst(rect, 50)  # 爆発エフェクト
+        self.score += 1
+
+    def step(self, inputs: Inputs) -> str | None:
+        """
+        入力inputsに従ってゲームを1ティック進める（画面には一切描画しない）
+        引数 inputs：このティックの入力
+        戻り値：タイミングゲームを行った場合はその判定結果，行わなかった場合はNone
+        """
+        bird, prof, proj, camera = self.bird, self.profiler, self.projectiles, self.camera
+        self.inputs = inputs
+        self.last_ProSpirit = None
+        prev = self.prev = {bird: bird.rect.topleft}
+        for spr in self.emys:
+            prev[spr] = spr.rect.topleft
+        proj.record_prev(prev)
+        result_ProSpirit = None
+        for _ in range(inputs.fire):
+            proj.fire(bird, bird.rect.center, camera.to_world(inputs.mouse))
+        if inputs.hyper and bird.state != "hyper" and bird.move == "move":
+            bird.state = "hyper"
+            self.telemetry.record(self.tmr, "hyper")
+        for _ in range(inputs.insert):
+            if self.score >= 200:  # スコア条件とキー押下条件
+                self.score -= 200  # スコア消費
+        prof.mark("inputs")
+
+        if self.Enemy_num <= 6:
+            self.count_ProSpirit = None
+        elif self.Enemy_num > 6 and self.count_ProSpirit is None:
+            self.count_ProSpirit = self.rng.randint(1, 30) 
+        elif self.count_ProSpirit and self.tmr%60 == 0:
+            self.count_ProSpirit -= 1
+        elif self.count_ProSpirit <= 0:
+            self.count_ProSpirit = None
+            # タイミングゲーム側で乱数をいくつ使ってもゲームの乱数がずれないように専用の生成器を渡す
+            result_ProSpirit = self.prospirit(self, random.Random(self.rng.getrandbits(64)))
+            self.last_ProSpirit = result_ProSpirit
+            self.telemetry.record(self.tmr, "prospirit", result_ProSpirit)
+        prof.mark("timing game")
+
+        events, stage = self.events, self.stage
+        if stage is not None and stage.loop and self.tmr >= self.next_cycle:  # 繰り返すステージの次の周回
+            for event in stage.compile(self.next_cycle):
+                heapq.heappush(events, event)
+            self.next_cycle += stage.length
+        if stage is None or (not stage.loop and self.tmr > stage.spawns[-1][0]):
+            # スコアに応じて急激に出現間隔を短縮
+            if self.tmr % self.tuning.spawn_interval(self.score) == 0:
+                self.add_enemy(Enemy(self.rng, self.tuning.enemy_hp, self.area))
+        while events and events[0][0] <= self.tmr and events[0][1] == 0:  # ステージの出現
+            self.add_enemy(stage.make_enemy(heapq.heappop(events)[3], self.rng, self.tuning.enemy_hp, self.area))
+        prof.mark("spawn")
+
+        while events and events[0][0] <= self.tmr:
+            # 停止状態の敵機は，intervalごとに爆弾投下（撃破された敵機の予定は捨てる）
+            # 停止した敵機は動かないので，カメラから遠い敵機も近くの敵機と同じく投下する
+            tick, kind, serial, emy = heapq.heappop(events)
+            if emy.alive():
+                bomb_type = self.rng.choice([0, 1])
+                proj.drop(emy, bird, bomb_type, self.rng)
+                heapq.heappush(events, (tick + emy.interval, 1, serial, emy))
+        self.drop_tick = self.tmr + 1
+        prof.mark("bomb drop")
+        proj.build()
+        prof.mark("collide build")
+        for emy in proj.hit_enemies(self.emys):  # ビームと衝突した敵機リスト
+            if emy.decrease(self.tuning.beam_damage):  # ダメージを与え、HPが0の場合
+                self.kill_enemy(emy)
+        prof.mark("collide emys/beams")
+        for rect in proj.hit_bombs():  # ビームで撃ち落とした爆弾リスト
+            self.kill_bomb(rect)
+        prof.mark("collide bombs/beams")
+
+        if result_ProSpirit == "Great":
+            # すべての敵と爆弾を削除
+            for emy in self.emys:
+                self.kill_enemy(emy, "Great")
+            for rect in proj.clear_bombs():
+                self.kill_bomb(rect, "Great")
+        elif result_ProSpirit == "Nice":
+            # 半分の敵と全ての爆弾を削除
+            half_count = len(self.emys) // 2
+            for emy in self.rng.sample(self.emys.sprites(), half_count):  # ランダムに半分の敵を選択
+                self.kill_enemy(emy, "Nice")
+            for rect in proj.clear_bombs():
+                self.kill_bomb(rect, "Nice")
+        prof.mark("timing game result")
+
+        for _ in range(proj.hit_bird(bird)):  # こうかとんと衝突した爆弾の数
+            if bird.state == "normal" and self.hp_gauge.decrease(self.tuning.bomb_damage):  # ダメージを受け、HPが0の場合
+                self.over = True
+                self.telemetry.record(self.tmr, "hit", self.hp_gauge.now_hp, bird.state)
+                self.telemetry.record(self.tmr, "game_over", self.score)
+                return result_ProSpirit
+            self.telemetry.record(self.tmr, "hit", self.hp_gauge.now_hp, bird.state)
+        prof.mark("collide bird/bombs")
+
+        bird.update(inputs.keys, self.area)
+        camera.follow(bird.rect)
+        prof.mark("bird.update")
+        proj.advance_beams()
+        prof.mark("beams.update")
+        self.update_enemies()
+        prof.mark("emys.update")
+        dodged = proj.advance_bombs()
+        if dodged:
+            self.telemetry.record(self.tmr, "bomb_dodged", dodged)
+        prof.mark("bombs.update")
+        self.effects.update()
+        prof.mark("effects.update")
+        if self.tmr % TICK_RATE == 0:
+            self.telemetry.record(self.tmr, "hp", self.hp_gauge.now_hp)
+        self.tmr += 1
+        return result_ProSpirit
+
+
+def bot_inputs(world: World, fire_interval: int = 5) -> Inputs:
+    """
+    ヘッドレス実行用の簡単なボット：一番近い爆弾から逃げつつ，一番近い敵機を撃つ
+    引数1 world：現在のWorld
+    引数2 fire_interval：射撃間隔（ティック）
+    """
+    bird, area = world.bird.rect, world.area
+    keys = {k: False for k in Bird.delta}
+    near = world.projectiles.nearest_bomb(bird.center)
+    if near is not None:
+        left = near[0] > bird.centerx
+        up = near[1] > bird.centery
+        if bird.left - area.left < 100 or area.right - bird.right < 100:  # ワールドの端に追い込まれないようにする
+            left = bird.centerx > area.centerx
+        if bird.top - area.top < 100 or area.bottom - bird.bottom < 100:
+            up = bird.centery > area.centery
+        keys[pg.K_a if left else pg.K_d] = True
+        keys[pg.K_w if up else pg.K_s] = True
+    mouse = (WIDTH // 2, 0)
+    emys = world.emys.sprites()
+    if emys:
+        mouse = world.camera.to_screen(min(emys, key=lambda e: abs(e.rect.centerx - bird.centerx)).rect.center)
+    fire = 1 if world.tmr % fire_interval == 0 else 0
+    return Inputs(keys, mouse, fire)
+
+
+def run_headless(ticks: int, seed: int | None = None, projectiles: str = "sprite", stage: Stage | None = None,
+                 size: tuple[int, int] = (WIDTH, HEIGHT)) -> World:
+    """
+    画面を使わずにボットでticksティック分ゲームを進め，速度と結果を表示する
+    """
+    world = World(seed, prospirit=lambda world, rng: "Nice", projectiles=projectiles, stage=stage, size=size)
+    t0 = time.perf_counter()
+    for _ in range(ticks):
+        world.step(bot_inputs(world))
+        if world.over:
+            world.reset()
+    elapsed = time.perf_counter() - t0
+    print(f"headless: {ticks} ticks in {elapsed:.2f}s ({ticks / elapsed:.0f} ticks/s) score={world.score} tmr={world.tmr}")
+    print(f"seed={world.seed} hash={world.state_hash()}")
+    return world
+
+
+def fast_forward(world: World, ticks: int, replay: "Replay | None" = None):
+    """
+    ステージの後半を確認するために，画面を使わずにボットでticksティック分ゲームを進める
+    タイミングゲームは行わず"Miss"とする
+    引数3 replay：進めたティックの入力も記録するReplay
+    """
+    prospirit, world.prospirit = world.prospirit, (lambda world, rng: "Miss")
+    t0 = time.perf_counter()
+    for _ in range(ticks):
+        if world.over:
+            world.reset()
+        world.step(bot_inputs(world))
+        if replay is not None:
+            replay.record(world)
+    world.prospirit = prospirit
+    print(f"fast-forward: {ticks} ticks in {time.perf_counter() - t0:.2f}s tmr={world.tmr} score={world.score} "
+          f"enemies={len(world.emys)} bombs={len(world.bombs)} hp={world.hp_gauge.now_hp} events={len(world.events)}")
+
+
+class Replay:
+    """
+    ティックごとの入力をバイナリで記録・再生するクラス
+
+    ファイル形式（リトルエンディアン）
+      ヘッダ："SKYR"，バージョン(B)，シード(Q)
+      レコード（1ティック）：フラグ(B)に続けて，フラグに応じた可変長のデータ
+        bit0-3：移動キー（Bird.deltaの順）
+        bit4：回避キー
+        bit5：射撃回数(B)，Insert回数(B)が続く
+        bit6：マウスの移動量が小さい → 前ティックからの差分(bb)，そうでなければ絶対位置(hh)
+        bit7：タイミングゲームの判定結果(B)が続く
+      トレーラ："END!"，ティック数(I)，最終スコア(i)，最終状態のハッシュ値(32s)
+    """
+    MAGIC = b"SKYR"
+    VERSION = 2
+    HEADER = struct.Struct("<4sBQ")
+    TRAILER = struct.Struct("<4sIi32s")
+    RESULTS = [None, "Great", "Nice", "Miss"]
+
+    def __init__(self, seed: int):
+        self.seed = seed
+        self.data = bytearray()  # 記録したレコード列
+        self.ticks = 0
+        self.mouse = (0, 0)  # 直前に記録したマウス位置
+        self.trailer = None  # 読み込んだファイルの(ティック数, 最終スコア, ハッシュ値)
+
+    def record(self, world: World):
+        """
+        直前にworld.stepで処理したティックの入力を記録する
+        """
+        inputs = world.inputs
+        flags = 0
+        for i, k in enumerate(Bird.delta):
+            if inputs.keys[k]:
+                flags |= 1 << i
+        if inputs.hyper:
+            flags |= 1 << 4
+        extra = b""
+        if inputs.fire or inputs.insert:
+            flags |= 1 << 5
+            extra += struct.pack("<BB", min(inputs.fire, 255), min(inputs.insert, 255))
+        dx, dy = inputs.mouse[0] - self.mouse[0], inputs.mouse[1] - self.mouse[1]
+        if -128 <= dx < 128 and -128 <= dy < 128:
+            flags |= 1 << 6
+            extra += struct.pack("<bb", dx, dy)
+        else:
+            extra += struct.pack("<hh", *inputs.mouse)
+        self.mouse = tuple(inputs.mouse)
+        if world.last_ProSpirit is not None:
+            flags |= 1 << 7
+            extra += struct.pack("<B", __class__.RESULTS.index(world.last_ProSpirit))
+        self.data.append(flags)
+        self.data += extra
+        self.ticks += 1
+
+    def save(self, path: str, world: World):
+        """
+        記録した入力と最終状態をファイルに書き出す
+        """
+        with open(path, "wb") as f:
+            f.write(__class__.HEADER.pack(__class__.MAGIC, __class__.VERSION, self.seed))
+            f.write(self.data)
+            f.write(__class__.TRAILER.pack(b"END!", self.ticks, world.score, bytes.fromhex(world.state_hash())))
+
+    @classmethod
+    def load(cls, path: str) -> "Replay":
+        """
+        ファイルからリプレイを読み込む
+        """
+        with open(path, "rb") as f:
+            data = f.read()
+        magic, version, seed = cls.HEADER.unpack_from(data)
+        if magic != cls.MAGIC:
+            raise ValueError(f"{path}：リプレイファイルではありません")
+        if version != cls.VERSION:
+            raise ValueError(f"{path}：リプレイファイルのバージョン{version}には対応していません")
+        replay = cls(seed)
+        body = data[cls.HEADER.size:]
+        if len(body) >= cls.TRAILER.size and body[-cls.TRAILER.size:].startswith(b"END!"):
+            _, ticks, score, digest = cls.TRAILER.unpack(body[-cls.TRAILER.size:])
+            replay.trailer = (ticks, score, digest.hex())
+            body = body[:-cls.TRAILER.size]
+        replay.data = bytearray(body)
+        return replay
+
+    def records(self):
+        """
+        記録したレコードを(Inputs, タイミングゲームの判定結果またはNone)として順に返す
+        """
+        data, pos, mouse = self.data, 0, (0, 0)
+        keys_order = list(Bird.delta)
+        while pos < len(data):
+            flags = data[pos]
+            pos += 1
+            inputs = Inputs({k: bool(flags & 1 << i) for i, k in enumerate(keys_order)}, hyper=bool(flags & 1 << 4))
+            if flags & 1 << 5:
+                inputs.fire, inputs.insert = struct.unpack_from("<BB", data, pos)
+                pos += 2
+            if flags & 1 << 6:
+                dx, dy = struct.unpack_from("<bb", data, pos)
+                mouse = (mouse[0] + dx, mouse[1] + dy)
+                pos += 2
+            else:
+                mouse = struct.unpack_from("<hh", data, pos)
+                pos += 4
+            inputs.mouse = mouse
+            prospirit = None
+            if flags & 1 << 7:
+                prospirit = __class__.RESULTS[data[pos]]
+                pos += 1
+            yield inputs, prospirit
+
+    def play(self, projectiles: str = "sprite", stage: Stage | None = None, size: tuple[int, int] = (WIDTH, HEIGHT)) -> World:
+        """
+        画面を使わずに記録した入力を再生し，最終状態のWorldを返す
+        ゲームオーバーになった後に入力が続いていれば，記録時と同じく再開する
+        引数1 projectiles：爆弾とビームの処理方式（World参照）
+        引数2 stage：記録時と同じステージ
+        引数3 size：記録時と同じワールドの大きさ
+        """
+        pending = [None]  # 再生中のティックで記録されていたタイミングゲームの結果
+
+        def prospirit(world: World, rng: random.Random) -> str:
+            return pending[0]
 
+        world = World(self.seed, prospirit, projectiles, stage, size=size)
+        for inputs, pending[0] in self.records():
+            if world.over:
+                world.reset()
+            world.step(inputs)
+        return world
 
 
-def main():
+def play_replay(path: str, projectiles: str = "sprite", stage: Stage | None = None,
+                size: tuple[int, int] = (WIDTH, HEIGHT)) -> bool:
+    """
+    リプレイファイルを再生し，速度と記録時の最終スコア・ハッシュ値との一致を表示する
+    戻り値：記録時の結果と一致したか（トレーラがない場合はTrue）
+    """
+    replay = Replay.load(path)
+    t0 = time.perf_counter()
+    world = replay.play(projectiles, stage, size)
+    elapsed = time.perf_counter() - t0
+    ticks = replay.ticks if replay.trailer is None else replay.trailer[0]
+    print(f"replay: {ticks} ticks in {elapsed:.2f}s ({ticks / max(elapsed, 1e-9):.0f} ticks/s, x{ticks / 50 / max(elapsed, 1e-9):.0f} realtime)")
+    print(f"seed={replay.seed} score={world.score} hash={world.state_hash()}")
+    if replay.trailer is None:
+        return True
+    ok = replay.trailer[1:] == (world.score, world.state_hash())
+    print("match" if ok else f"MISMATCH: recorded score={replay.trailer[1]} hash={replay.trailer[2]}")
+    return ok
+
+
+def main(args: argparse.Namespace | None = None, startup: StartupProfiler | None = None):
+    """
+    画面を開いてゲームを実行する
+    引数1 args：起動オプション
+    引数2 startup：起動時間の計測（Noneならここから計測を始める）
+    """
+    if args is None:
+        args = parse_args([])
+    if startup is None:
+        startup = StartupProfiler(time.perf_counter())
+    for pool in pools.values():
+        pool.size = args.pool_size
     pg.display.set_caption("スカイバトル")
-    screen = pg.display.set_mode((WIDTH, HEIGHT), pg.SRCALPHA)
-    bg_img = pg.Surface((WIDTH, HEIGHT))
-    bg_img.fill((0, 0, 0))  # 背景を黒く塗る
-    stars(bg_img, 200)  # 星を200個描画
-    score = Score()
-    hp_gauge = HpGauge()  # HpGaugeをインスタンス化
-    ProSpirit_game = ProSpirit()  # ProSpiritをインスタンス化
-    bird = Bird(3, (900, 400))
-    bombs = pg.sprite.Group()
-    beams = pg.sprite.Group()
-    exps = pg.sprite.Group()
-    emys = pg.sprite.Group()
-    Enemy_num = 0 #　敵機の数
-    count_ProSpirit = None # 実行までのカウント
-    result_ProSpirit = None
-    tmr = 0
+    # 画面自体は透過不要なのでSRCALPHAを付けない（全画面の転送が速くなる）
+    if args.vsync:
+        screen = pg.display.set_mode((WIDTH, HEIGHT), pg.SCALED, vsync=1)
+        args.fps = 0
+    else:
+        screen = pg.display.set_mode((WIDTH, HEIGHT))
+    startup.mark("set_mode")
+    # 画面作成後にアセットを先読みし，画面のピクセル形式に変換する
+    # スタート画面に必要なフォントと画像だけを先に読み込み，残りの画像はスタート画面の間に別スレッドで読み込む
+    assets.preload_fonts()
+    startup.mark("fonts")
+    assets.image("fig/alien1.png")  # スタート画面の画像
+    startup.mark("title images")
+    bg_img = pg.Surface((WIDTH, HEIGHT)).convert()  # 画面と同じピクセル形式の背景
+    starfield = Starfield(200)  # 星を200個
+    starfield.draw(bg_img)
+    startup.mark("starfield")
+    loader = AssetLoader(assets)
     clock = pg.time.Clock()
-    start = True # スタート画面の有無
-
-    # 初期化部分
-    title_font = pg.font.Font("font/YuseiMagic-Regular.ttf", 74)
-    button_font = pg.font.Font("font/YuseiMagic-Regular.ttf", 50)
-    info_font = pg.font.Font("font/YuseiMagic-Regular.ttf", 30)  # 説明文用のフォント
-    start_font = pg.font.Font("font/YuseiMagic-Regular.ttf", 27) # スタート方法文用のフォント
-    change_text = "Press 'R' to change the background"
-    change_font = pg.font.Font("font/YuseiMagic-Regular.ttf", 15)  # フォントを指定（サイズ15）
-    start_img = pg.image.load("fig/alien1.png")
-    button_rect = pg.Rect(WIDTH // 2 - 150, HEIGHT // 2, 300, 50)
-
-    # 操作説明テキスト
-    instructions = [
-        "ルール説明",
-        "・WASDで操作し，マウスを合わせてクリックで攻撃しよう。",
-        "・時々現れるタイミングゲームで大打撃を与えよう。",
-        "・HPがなくなるとゲームオーバーになるよ。"
-    ]
-    start_info = "『Start Game』にカーソルを合わせてクリック，またはスペースキーでゲームを開始しよう。" # スタート方法のテキスト
-
-    change_text = "'R'キーで背景を変更できます"
+    title = TitleScene(screen, bg_img, starfield)
+    if args.profile_startup:
+        title.draw()
+        startup.mark("first frame")
+        loader.wait()
+        startup.report(loader)
+        return 0
+    if not title.run(clock):
+        return 0
+    time.sleep(1)
+    loader.wait()
+    assets.mark()
+    for pool in pools.values():
+        pool.mark()
 
-    while start:
+    ProSpirit_game = ProSpirit()  # ProSpiritをインスタンス化
+    gameover_scene = GameOverScene(screen)  # 再起動しても同じ画面を使い回す
+    if args.dirty:
+        renderer = DirtyRenderer(screen, bg_img, args.dirty_threshold)
+    else:
+        renderer = FullRenderer(screen, bg_img)
+    view = WorldView(screen, renderer)
+    view.hp_bars.skip_full = args.hide_full_hp
+    effects = effect_engines[args.effects]()
+
+    quit_requested = False  # タイミングゲーム中にウィンドウが閉じられたか
+
+    def play_ProSpirit(world: World, rng: random.Random) -> str:
+        """
+        タイミングゲームを画面上で実行する（Worldから呼ばれる）
+        ウィンドウが閉じられたら，そのティックはMissとして最後まで進め（リプレイと記録の整合を保つ），
+        メインループでfinish()を通して終了する
+        """
+        nonlocal quit_requested
+        ProSpirit_game.start(rng)
+        result = ProSpirit_game.update(screen, world, view, bg_img, clock)
+        renderer.invalidate()  # タイミングゲームの画面を消す
+        if result is None:
+            quit_requested = True
+            result = "Miss"
+        return result
+
+    world = World(args.seed, prospirit=play_ProSpirit, projectiles=args.projectiles, stage=args.stage, size=args.world_size)
+    world.effects = effects
+    world.camera.margin = args.cull_margin
+    view.starfield = starfield  # カメラの位置や品質に合わせて背景の星を描き直す
+    if args.governor:
+        budget = args.frame_budget or 1000 / (args.fps or 60)
+        governor = QualityGovernor(view, effects, starfield, budget)
+    else:
+        governor = NullGovernor()
+    replay = Replay(world.seed) if args.record else None
+    if args.fast_forward:
+        fast_forward(world, args.fast_forward, replay)
+    if args.profile or args.profile_out:
+        world.profiler = view.profiler = Profiler(out=args.profile_out)
+    if args.telemetry:
+        world.telemetry = Telemetry(args.telemetry)
+        world.telemetry.record(world.tmr, "session", world.seed, list(world.area.size))
+
+    def finish():
+        """
+        ゲーム終了時の後始末（統計の表示とリプレイの保存）
+        """
+        if args.render_stats:
+            renderer.report()
+            view.report()
+            governor.report()
+        if replay is not None:
+            replay.save(args.record, world)
+            print(f"recorded {replay.ticks} ticks to {args.record} (seed={world.seed} score={world.score} hash={world.state_hash()})")
+        if world.profiler.enabled:
+            world.profiler.close()
+        world.telemetry.close()
+
+    tick = 1 / TICK_RATE
+    lag = 0.0  # まだティックとして処理していない経過時間（秒）
+    inputs = None  # 次のティックに渡す入力（複数フレームの入力をまとめる）
+    elapsed = 0  # 前のフレームからの経過時間（ミリ秒）
+    clock.tick()
+    while True:
+        if world.over:  # ゲームオーバー画面を1フレーム進める
+            restart = gameover_scene.update(pg.event.get(), elapsed)
+            if restart is None:
+                governor.skip()
+                elapsed = clock.tick(GameOverScene.fps)
+                continue
+            if not restart:
+                finish()
+                return 0  # プログラム終了
+            world.reset()
+            renderer.invalidate()
+            clock.tick()
+            lag = 0.0
+        frame_start = time.perf_counter()
+        paused = False  # タイミングゲームかゲームオーバー画面で止まったフレームか
+        world.profiler.start()
+        key_lst = pg.key.get_pressed()
+        keys, mouse = {k: key_lst[k] for k in Bird.delta}, pg.mouse.get_pos()
+        if inputs is None:
+            inputs = Inputs()
+        inputs.keys, inputs.mouse = keys, mouse
         for event in pg.event.get():
             if event.type == pg.QUIT or event.type == pg.KEYDOWN and event.key == pg.K_q:
+                finish()
                 return 0
-            elif event.type == pg.MOUSEBUTTONDOWN and button_rect.collidepoint(event.pos):
-                start = None
-                screen.blit(bg_img, [0, 0])
-                pg.display.update()
-            elif event.type == pg.KEYDOWN and event.key == pg.K_SPACE:
-                start = None
-                screen.blit(bg_img, [0, 0])
-                pg.display.update()
-            elif event.type == pg.KEYDOWN and event.key == pg.K_r:
-                bg_img.fill((0, 0, 0))  # 背景を黒く塗る
-                stars(bg_img, random.randint(10, 300))  # 星をランダムの量で描画
-
-        screen.blit(bg_img, [0, 0])
-
-        # タイトル表示
-        title = title_font.render("スカイバトル.", True, (255, 255, 255))
-        title_rect = title.get_rect(center=(WIDTH // 2, HEIGHT // 2 - 100))
-        screen.blit(title, title_rect)
-
-        # ボタンの色変更
-        if button_rect.collidepoint(pg.mouse.get_pos()):
-            color = (200, 200, 200)
+            if event.type == pg.KEYDOWN and event.key == pg.K_SPACE:
+                inputs.fire += 1
+            elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+                inputs.fire += 1
+            if event.type == pg.KEYDOWN and event.key == pg.K_f:
+                inputs.hyper = True
+            if event.type == pg.KEYDOWN and event.key == pg.K_INSERT:
+                inputs.insert += 1
+            if event.type == pg.KEYDOWN and event.key == pg.K_F3:  # プロファイラの表示を切り替え
+                if view.overlay is None:
+                    if not world.profiler.enabled:
+                        world.profiler = view.profiler = Profiler()
+                    view.overlay = ProfilerOverlay()
+                else:
+                    view.overlay = None
+                    if not (args.profile or args.profile_out):  # F3だけで有効にした計測は止める
+                        world.profiler.close()
+                        world.profiler = view.profiler = NULL_PROFILER
+        world.profiler.mark("events")
+
+        # 経過時間の分だけ一定間隔のティックでゲームを進める
+        steps = 0
+        while lag >= tick and steps < MAX_CATCHUP:
+            world.step(inputs)
+            if replay is not None:
+                replay.record(world)
+            inputs = Inputs(keys, mouse)
+            lag -= tick
+            steps += 1
+            if world.over or quit_requested:
+                break
+            if world.last_ProSpirit is not None:  # タイミングゲームの間の時間は取り戻さない
+                clock.tick()
+                lag = 0.0
+                paused = True
+        if lag >= tick:  # 上限まで処理しても遅れているときは，残りの遅れを捨てる
+            lag %= tick
+        if quit_requested:
+            finish()
+            return 0
+
+        view.draw(world, mouse, lag / tick)
+        if world.over:  # 次のフレームからゲームオーバー画面にする
+            gameover_scene.start(world.score)
+            paused = True
+        if paused:
+            governor.skip()
         else:
-            color = (255, 255, 255)
-
-        # ボタン表示
-        pg.draw.rect(screen, color, button_rect)
-        button_text = button_font.render("Start Game", True, (0, 0, 255))
-        text_rect = button_text.get_rect(center=button_rect.center)
-        screen.blit(button_text, text_rect)
-
-        # キャラ表示
-        start_rct = start_img.get_rect()
-        start_rct.center = WIDTH/2, HEIGHT/2
-        start_rct.centerx += 300
-        screen.blit(start_img, start_rct)
-        start_rct.centerx -= 600
-        screen.blit(start_img, start_rct)
-
-        # ルール説明表示
-        for i in range(len(instructions)):
-            info_text = info_font.render(instructions[i], True, (255, 255, 255))
-            screen.blit(info_text, (150, HEIGHT//3*2 + i * 40))  # 位置を調整
-          
-        # スタート方法の表示
-        start_text = start_font.render(start_info, True, (255, 0, 0))
-        start_rect = start_text.get_rect(center=(WIDTH // 2, HEIGHT - 20))
-        # 背景の矩形を描画
-        pg.draw.rect(screen, (0, 0, 0), start_rect.inflate(-6, -8))
-        screen.blit(start_text, start_rect)
-
-        # "R"で背景を変えられることを右上に表示
-        change_text_surface = change_font.render(change_text, True, (255, 255, 255))  # 白文字
-        change_rect = change_text_surface.get_rect(topright=(WIDTH - 5, 0))  # 右上に配置
-        screen.blit(change_text_surface, change_rect)
+            governor.frame((time.perf_counter() - frame_start) * 1000)
+        world.profiler.end_frame({**world.counts(), "ticks": steps, "hud renders/s": view.score.rate,
+                                  "quality": governor.level, **view.cull_counts(world)})
+        elapsed = clock.tick(args.fps)
+        lag += elapsed / 1000
 
-        # マウスカーソル位置に〇を描画
-        pg.draw.circle(screen, (255, 255, 255), pg.mouse.get_pos(), 14)  # 赤い円を表示
-        pg.draw.circle(screen, (0, 0, 0, 0), pg.mouse.get_pos(), 10)  # 黒い円を表示
 
-        pg.display.update()
-        clock.tick(60)
-    time.sleep(1)
-    Game = True
-    while Game:
-        while True:
-            key_lst = pg.key.get_pressed()
-            result_ProSpirit = None
-            for event in pg.event.get():
-                if event.type == pg.QUIT or event.type == pg.KEYDOWN and event.key == pg.K_q:
-                    return 0
-                if event.type == pg.KEYDOWN and event.key == pg.K_SPACE:
-                    beam_m = Beam(bird, bird.rect.center ,pygame.mouse.get_pos())
-                    beams.add(beam_m)
-                elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
-                    beam_m = Beam(bird, bird.rect.center ,pygame.mouse.get_pos())
-                    beams.add(beam_m)
-                if event.type == pg.KEYDOWN and bird.state != "hyper" and bird.move == "move": 
-                    if event.type == pg.KEYDOWN and event.key == pg.K_f :
-                        bird.state = "hyper"
-                if event.type == pg.KEYDOWN and event.key == pg.K_INSERT and score.value >= 200:  # スコア条件とキー押下条件
-                    score.value -= 200  # スコア消費
-            screen.blit(bg_img, [0, 0])
-
-            if Enemy_num <= 6:
-                count_ProSpirit = None
-            elif Enemy_num > 6 and count_ProSpirit is None:
-                count_ProSpirit = random.randint(1, 30) 
-            elif count_ProSpirit and tmr%60 == 0:
-                count_ProSpirit -= 1
-            elif count_ProSpirit <= 0:
-                count_ProSpirit = None
-                ProSpirit_game.start()
-                result_ProSpirit = ProSpirit_game.update(result_ProSpirit, screen, bird, key_lst, bg_img, Enemy_num, count_ProSpirit, tmr, emys, bombs, exps, score, hp_gauge, clock)
+def parse_size(text: str) -> tuple[int, int]:
+    """
+    "幅x高さ" の文字列をワールドの大きさのタプルにする（画面より小さい大きさは使えない）
+    """
+    try:
+        width, height = (int(v) for v in text.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{text}：'幅x高さ' の形式で指定する（例：3300x1950）")
+    if width < WIDTH or height < HEIGHT:
+        raise argparse.ArgumentTypeError(f"{text}：画面（{WIDTH}x{HEIGHT}）以上の大きさにする")
+    return width, height
 
-            # スコアに応じて急激に出現間隔を短縮
-            if tmr % max(10, int(60 * (0.9 ** (score.value // 100)))) == 0:  # 出現間隔を指数的に短縮
-                emys.add(Enemy())
-                Enemy_num += 1  # 敵機数を増やす
-
-            for emy in emys:
-                if emy.state == "stop" and tmr % emy.interval == 0:
-                    # 敵機が停止状態に入ったら，intervalに応じて爆弾投下
-                    bomb_type = random.choice([0, 1])
-                    bombs.add(Bomb(emy, bird, bomb_type))
-            for emy in pg.sprite.groupcollide(emys, beams, False, True).keys():  # ビームと衝突した敵機リスト
-                if emy.decrease(5):  # ダメージを与え、HPが0の場合
-                    emys.remove(emy)  # 敵のリストからemyを削除
-                    exps.add(Explosion(emy, 100))  # 爆発エフェクト
-                    score.value += 10  # 10点アップ
-                    bird.change_img(6, screen)  # こうかとん喜びエフェクト
-                    Enemy_num -= 1 # 敵機数を減らす
-
-            for i, bomb in enumerate(pg.sprite.groupcollide(bombs, beams, False, True).keys()):  # ビームと衝突した爆弾リスト
-                if bomb.type == 0:
-                    bomb.bomb_check()
-                    exps.add(Explosion(bomb, 50))  # 爆発エフェクト
-                    score.value += 1
-
-            if result_ProSpirit == "Great":
-            # すべての敵を削除
-                for emy in emys:
-                    emys.remove(emy)  # 敵のリストからemyを削除
-                    exps.add(Explosion(emy, 100))  # 爆発エフェクト
-                    score.value += 10  # 10点アップ
-                    bird.change_img(6, screen)  # こうかとん喜びエフェクト
-                    Enemy_num -= 1 # 敵機数を減らす
-                for bomb in bombs:
-                    bomb.bomb_check()
-                    exps.add(Explosion(bomb, 50))  # 爆発エフェクト
-                    score.value += 1
-            elif result_ProSpirit == "Nice":
-            # 半分の敵を削除
-                half_count = len(emys) // 2
-                emys_to_remove = random.sample(emys.sprites(), half_count)  # ランダムに半分の敵を選択
-                for emy in emys_to_remove:
-                    emys.remove(emy)  # 敵のリストからemyを削除
-                    exps.add(Explosion(emy, 100))  # 爆発エフェクト
-                    score.value += 10  # 10点アップ
-                    bird.change_img(6, screen)  # こうかとん喜びエフェクト
-                    Enemy_num -= 1 # 敵機数を減らす
-                for bomb in bombs:
-                    bomb.bomb_check()
-                    exps.add(Explosion(bomb, 50))  # 爆発エフェクト
-                    score.value += 1
-
-            for bomb in pg.sprite.spritecollide(bird, bombs, True):  # こうかとんと衝突した爆弾リスト
-                if bird.state == "normal":
-                    if hp_gauge.decrease(2):  # ダメージを受け、HPが0の場合
-                        hp_gauge.update(screen)  # 負け判定後もゲージを表示
-                        score.update(screen, Enemy_num, count_ProSpirit, tmr)
-                        pg.display.update()
-                        Game = gameover(screen, score.value)
-                        if not Game:
-                            return  # プログラム終了
-                        Enemy_num, tmr = reset_game(score, emys, bombs, hp_gauge)
-                elif bird.state == "hyper":
-                    continue
-
-            bird.update(key_lst, screen)
-            beams.update()
-            beams.draw(screen)
-            emys.update()
-            emys.draw(screen)
-            bombs.update()
-            bombs.draw(screen)
-            exps.update()
-            exps.draw(screen)
-            score.update(screen, Enemy_num, count_ProSpirit, tmr)
-            hp_gauge.update(screen)  # 更新されたHPゲージを表示
-            # マウスカーソル位置にドーナツ型の円を描画
-            pos = pg.mouse.get_pos()
-            circle = pg.Surface((28, 28), pg.SRCALPHA)  # 固定サイズのサーフェスを作成
-            pg.draw.circle(circle, (255, 255, 255), (14, 14), 14)  # 外側の白い円
-            pg.draw.circle(circle, (0, 0, 0, 0), (14, 14), 10)  # 内側の黒い円
-            screen.blit(circle, (pos[0] - 14, pos[1] - 14))  # サークルをマウス位置に描画
-            pg.display.update()
-            tmr += 1
-            clock.tick(50)
 
+def parse_args(argv=None) -> argparse.Namespace:
+    """
+    コマンドライン引数を解析する
+    """
+    parser = argparse.ArgumentParser(description="スカイバトル")
+    parser.add_argument("--asset-stats", action="store_true", help="終了時にアセットキャッシュの統計を表示する")
+    parser.add_argument("--pool-size", type=int, default=256, help="Bomb/Beam/Explosionのプールが保持するインスタンス数の上限")
+    parser.add_argument("--pool-stats", action="store_true", help="終了時にスプライトプールの統計を表示する")
+    parser.add_argument("--dirty", action="store_true", help="変化した矩形だけを再描画・転送する描画モードを使う")
+    parser.add_argument("--dirty-threshold", type=float, default=0.5, help="画面全体の転送に切り替える変化面積の割合（0〜1）")
+    parser.add_argument("--render-stats", action="store_true", help="終了時に描画モードの統計を表示する")
+    parser.add_argument("--headless", type=int, metavar="TICKS", help="画面を使わずにボットでTICKSティック分シミュレーションする")
+    parser.add_argument("--profile", action="store_true", help="処理ごとの時間を計測する（F3キーで計測結果を画面に表示）")
+    parser.add_argument("--profile-out", metavar="FILE", help="計測結果をFILEに書き出す（.csvならCSV，それ以外はJSON Lines）")
+    parser.add_argument("--fps", type=int, default=120, help="描画の最大フレームレート（0で無制限）．ゲームの進行はフレームレートによらず一定")
+    parser.add_argument("--vsync", action="store_true", help="垂直同期して描画する（--fpsの上限は使わない）")
+    parser.add_argument("--seed", type=int, help="ゲームの乱数のシード（省略時はランダム）")
+    parser.add_argument("--record", metavar="FILE", help="プレイの入力をFILEに記録する")
+    parser.add_argument("--replay", metavar="FILE", help="FILEに記録した入力を画面なしで再生し，結果を表示する")
+    parser.add_argument("--hide-full-hp", action="store_true", help="HPが満タンの敵機のHPゲージを表示しない")
+    parser.add_argument("--projectiles", choices=list(projectile_engines), default="sprite",
+                        help="爆弾とビームの処理方式（numpyはNumPyの配列でまとめて処理する）")
+    parser.add_argument("--stage", metavar="FILE", help="FILEのステージ（敵機の出現ウェーブ）で遊ぶ")
+    parser.add_argument("--validate-stage", metavar="FILE", help="ステージファイルを検査して概要を表示する")
+    parser.add_argument("--fast-forward", type=int, default=0, metavar="TICKS", help="開始前にボットでTICKSティック分ゲームを進める")
+    parser.add_argument("--effects", choices=sorted(effect_engines), default="particles" if np is not None else "sprites",
+                        help="爆発エフェクトの方式（particles：NumPyのパーティクル，sprites：爆発画像）")
+    parser.add_argument("--profile-startup", action="store_true", help="起動から最初のフレームまでの時間を段階ごとに表示して終了する")
+    parser.add_argument("--world-size", type=parse_size, default=(WIDTH, HEIGHT), metavar="WxH",
+                        help="ワールドの大きさ（画面より大きければカメラがこうかとんを追いかける）")
+    parser.add_argument("--telemetry", metavar="FILE",
+                        help="撃破・爆弾・タイミングゲーム・HP・回避行動の記録を別スレッドでFILEにJSON Linesで書き出す")
+    parser.add_argument("--governor", action="store_true",
+                        help="フレームの処理時間が予算を超えたら見た目の品質を段階的に下げ，余裕ができたら戻す")
+    parser.add_argument("--frame-budget", type=float, metavar="MS",
+                        help="--governorの1フレームの処理時間の予算（省略時は1000/--fps，--fps 0なら1000/60）")
+    parser.add_argument("--cull-margin", type=int, default=100, metavar="PX",
+                        help="画面の外でも描画し，毎ティック動かす範囲の幅")
+    args = parser.parse_args(argv)
+    if args.projectiles == "numpy" and np is None:
+        parser.error("--projectiles numpy にはNumPyが必要です（pip install numpy）")
+    if args.effects == "particles" and np is None:
+        parser.error("--effects particles にはNumPyが必要です（pip install numpy）")
+    if args.stage is not None:
+        try:
+            args.stage = Stage.load(args.stage)
+        except (OSError, StageError) as e:
+            parser.error(str(e))
+    return args
 
 
 if __name__ == "__main__":
+    startup = StartupProfiler()
+    startup.mark("import")
+    args = parse_args()
+    if args.validate_stage:
+        try:
+            print(Stage.load(args.validate_stage).summary())
+        except (OSError, StageError) as e:
+            print(e)
+            sys.exit(1)
+        sys.exit()
+    if args.headless:
+        run_headless(args.headless, args.seed, args.projectiles, args.stage, args.world_size)
+        sys.exit()
+    if args.replay:
+        sys.exit(0 if play_replay(args.replay, args.projectiles, args.stage, args.world_size) else 1)
+    startup.mark("parse args")
     pg.init()
-    main()
+    startup.mark("pg.init")
+    main(args, startup)
+    if args.asset_stats:
+        assets.report()
+    if args.pool_stats:
+        for name, pool in pools.items():
+            print(name, pool.stats())
     pg.quit()
     sys.exit()
\ No newline at end of file
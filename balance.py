@@ -0,0 +1,159 @@
+"""
+スカイバトルのゲームバランス調査（調整値の組み合わせごとに多数のゲームを画面なしで一括シミュレーションする）
+使い方：python balance.py [--games N] [--grid bird_hp=20,30 bomb_damage=1,2 ...] [--workers W] [--out FILE]
+"""
+import argparse
+import concurrent.futures
+import csv
+import itertools
+import json
+import os
+import platform
+import statistics
+import time
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+import pygame as pg
+import Sky_Battle as sb
+
+
+def parse_grid(items: list[str]) -> dict[str, list]:
+    """
+    "名前=値1,値2,..." のリストを 調整値の名前 -> 値のリスト の辞書にする
+    """
+    defaults = sb.Tuning().as_dict()
+    grid = {}
+    for item in items:
+        name, sep, values = item.partition("=")
+        if not sep or name not in defaults:
+            raise ValueError(f"{item}：'名前=値1,値2,...' の形式で，名前は {', '.join(defaults)} のどれか")
+        try:
+            grid[name] = [json.loads(v) for v in values.split(",")]  # 整数・小数のどちらも書ける
+        except ValueError:
+            grid[name] = None
+        if grid[name] is None or not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in grid[name]):
+            raise ValueError(f"{item}：値は数値で指定する")
+    return grid
+
+
+def play_games(params: dict, seeds: list[int], max_ticks: int, prospirit: str, projectiles: str) -> list[tuple]:
+    """
+    調整値paramsでseedsの各シードのゲームをボットで遊び，結果のリストを返す（ワーカープロセスで呼ぶ）
+    ゲームオーバーになるかmax_ticksティック経過したら終わる
+    戻り値：ゲームごとの(シード, 生存ティック数, ゲームオーバーになったか, スコア, {グループ: 最大数})
+    """
+    results = []
+    for seed in seeds:
+        world = sb.World(seed, prospirit=lambda world, rng: prospirit, projectiles=projectiles, tuning=sb.Tuning(**params))
+        peak = {}
+        while world.tmr < max_ticks and not world.over:
+            world.step(sb.bot_inputs(world))
+            for key, value in world.counts().items():
+                if value > peak.get(key, 0):
+                    peak[key] = value
+        results.append((seed, world.tmr, world.over, world.score, peak))
+    return results
+
+
+def summarize(games: list[tuple]) -> dict:
+    """
+    1つの組み合わせのゲームの結果を集計する（生存時間とスコアは平均とp10/p50/p90，最大数は平均と最大）
+    """
+    def spread(values: list[float]) -> dict:
+        ordered = sorted(values)
+        n = len(ordered) - 1
+        return {"mean": round(statistics.fmean(ordered), 2), **{f"p{q}": ordered[round(n * q / 100)] for q in (10, 50, 90)}}
+
+    survival = spread([ticks / sb.TICK_RATE for seed, ticks, over, score, peak in games])
+    keys = sorted({key for *_, peak in games for key in peak})
+    return {
+        "games": len(games),
+        "game_over_rate": round(sum(over for seed, ticks, over, score, peak in games) / len(games), 4),
+        "survival_s": survival,
+        "score": spread([score for seed, ticks, over, score, peak in games]),
+        "peak": {key: {"mean": round(statistics.fmean(peak.get(key, 0) for *_, peak in games), 2),
+                       "max": max(peak.get(key, 0) for *_, peak in games)} for key in keys},
+    }
+
+
+def write_results(path: str, results: dict):
+    """
+    結果をpathに書き出す（拡張子が.csvなら組み合わせごとに1行のCSV，それ以外はJSON）
+    """
+    with open(path, "w", newline="") as f:
+        if not path.endswith(".csv"):
+            json.dump(results, f, separators=(",", ":"))
+            return
+        rows = []
+        for combo in results["combos"]:
+            row = dict(combo["params"])
+            row["games"], row["game_over_rate"] = combo["games"], combo["game_over_rate"]
+            for name in ("survival_s", "score"):
+                row.update({f"{name}_{k}": v for k, v in combo[name].items()})
+            for key, value in combo["peak"].items():
+                row.update({f"peak_{key}_{k}": v for k, v in value.items()})
+            rows.append(row)
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="スカイバトルのゲームバランス調査")
+    parser.add_argument("--grid", nargs="*", default=[], metavar="NAME=V1,V2",
+                        help=f"調べる調整値と値のリスト（名前：{', '.join(sb.Tuning().as_dict())}）．指定しない値は標準のまま")
+    parser.add_argument("--games", type=int, default=200, help="組み合わせごとのゲーム数")
+    parser.add_argument("--seed", type=int, default=1, help="最初のゲームのシード（組み合わせごとに同じシードの列を使う）")
+    parser.add_argument("--max-ticks", type=int, default=15000, help="1ゲームの最大ティック数（ゲームオーバーにならなければここで打ち切る）")
+    parser.add_argument("--prospirit", choices=["Great", "Nice", "Miss"], default="Nice", help="タイミングゲームの判定結果")
+    parser.add_argument("--projectiles", choices=list(sb.projectile_engines), default="sprite")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="ワーカープロセス数")
+    parser.add_argument("--chunk", type=int, default=10, help="1回にワーカーへ渡すゲーム数")
+    parser.add_argument("--out", metavar="FILE", default="balance.json", help="結果の書き出し先（.csvならCSV，それ以外はJSON）")
+    args = parser.parse_args()
+    try:
+        grid = parse_grid(args.grid)
+    except ValueError as e:
+        parser.error(str(e))
+    combos = [dict(zip(grid, values)) for values in itertools.product(*grid.values())]
+    seeds = list(range(args.seed, args.seed + args.games))
+    sb.assets.atlas()  # 回転画像のアトラスをディスクに保存しておき，各ワーカーで作り直さないようにする
+
+    t0 = time.perf_counter()
+    games = [[] for _ in combos]
+    with concurrent.futures.ProcessPoolExecutor(args.workers) as ex:
+        futures = {
+            ex.submit(play_games, params, seeds[i:i + args.chunk], args.max_ticks, args.prospirit, args.projectiles): n
+            for n, params in enumerate(combos) for i in range(0, len(seeds), args.chunk)
+        }
+        for future in concurrent.futures.as_completed(futures):
+            games[futures[future]].extend(future.result())
+    elapsed = time.perf_counter() - t0
+    total = sum(len(g) for g in games)
+    ticks = sum(tmr for g in games for seed, tmr, *_ in g)
+
+    results = {
+        "meta": {
+            "python": platform.python_version(), "pygame": pg.version.ver, "workers": args.workers,
+            "games": args.games, "seed": args.seed, "max_ticks": args.max_ticks, "prospirit": args.prospirit,
+            "projectiles": args.projectiles, "defaults": sb.Tuning().as_dict(),
+            "elapsed_s": round(elapsed, 2), "games_per_s": round(total / elapsed, 2), "ticks_per_s": round(ticks / elapsed),
+        },
+        "combos": [],
+    }
+    print(f"{total} games ({len(combos)} combos x {args.games}) in {elapsed:.1f}s with {args.workers} workers "
+          f"({total / elapsed:.1f} games/s, {ticks / elapsed:.0f} ticks/s)")
+    print(f"{'params':<40} {'over':>6} {'surv p50[s]':>11} {'score p50':>9} {'peak emys':>9} {'peak bombs':>10}")
+    for params, g in zip(combos, games):
+        g.sort()  # シード順にそろえる（集計結果がワーカーの終わる順によらないように）
+        combo = {"params": params, **summarize(g)}
+        results["combos"].append(combo)
+        label = " ".join(f"{k}={v}" for k, v in params.items()) or "(defaults)"
+        peak = combo["peak"]
+        print(f"{label:<40} {combo['game_over_rate']:>6.0%} {combo['survival_s']['p50']:>11.1f} {combo['score']['p50']:>9} "
+              f"{peak.get('emys', {}).get('max', 0):>9} {peak.get('bombs', {}).get('max', 0):>10}")
+    write_results(args.out, results)
+    print(f"wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,426 @@
+"""
+スカイバトルのマイクロベンチマーク
+使い方：python benchmark.py collide
+      python benchmark.py projectiles
+      python benchmark.py memory [--out FILE] [--baseline FILE]
+      python benchmark.py suite [--out FILE] [--baseline FILE]
+"""
+import argparse
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")  # 画面を開かずに描画まで計測できるようにする
+import pygame as pg
+import Sky_Battle as sb
+try:
+    import resource
+except ImportError:  # Windowsではピークメモリを計測しない
+    resource = None
+
+
+class Box(pg.sprite.Sprite):
+    """
+    ベンチマーク用のRectだけを持つスプライト
+    """
+    def __init__(self, w: int, h: int, rng: random.Random):
+        super().__init__()
+        self.rect = pg.Rect(rng.randint(0, sb.WIDTH - w), rng.randint(0, sb.HEIGHT - h), w, h)
+
+
+def make_groups(n: int, seed: int = 0) -> tuple[pg.sprite.Group, pg.sprite.Group]:
+    """
+    敵機サイズとビームサイズのスプライトをn個ずつ生成する
+    """
+    rng = random.Random(seed)
+    emys = pg.sprite.Group(Box(rng.randint(60, 90), rng.randint(50, 80), rng) for _ in range(n))
+    beams = pg.sprite.Group(Box(20, 20, rng) for _ in range(n))
+    return emys, beams
+
+
+def timeit(func, repeat: int) -> float:
+    """
+    funcをrepeat回実行した1回あたりの平均時間（マイクロ秒）を返す
+    """
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - t0) / repeat * 1e6
+
+
+def bench_collide(sizes: list[int], repeat: int):
+    """
+    総当たり（pg.sprite.groupcollide）と空間ハッシュの衝突判定を比較し，
+    空間ハッシュの方が速くなる個数（クロスオーバー点）を表示する
+    測定のぶれで一度だけ速くなった点は除き，それ以降ずっと速い最小の個数を採る
+    """
+    grid = sb.SpatialHash(threshold=0)  # 個数によらず常にグリッドを使う
+    crossover = None
+    print(f"{'n':>6} {'brute[us]':>12} {'hash[us]':>12} {'ratio':>7}")
+    for n in sizes:
+        emys, beams = make_groups(n)
+        # 結果が一致することを確認（ビームを消す設定で比較）
+        a_emys, a_beams = make_groups(n)
+        expected = pg.sprite.groupcollide(a_emys, a_beams, False, True)
+        grid.build(beams)
+        got = grid.groupcollide(emys, beams, False, True)
+        assert [(e.rect, [b.rect for b in bs]) for e, bs in expected.items()] == \
+               [(e.rect, [b.rect for b in bs]) for e, bs in got.items()], f"mismatch at n={n}"
+
+        emys, beams = make_groups(n)
+        brute = timeit(lambda: pg.sprite.groupcollide(emys, beams, False, False), repeat)
+
+        def spatial():
+            grid.build(beams)
+            grid.groupcollide(emys, beams, False, False)
+        hashed = timeit(spatial, repeat)
+        if hashed >= brute:
+            crossover = None
+        elif crossover is None:
+            crossover = n
+        print(f"{n:>6} {brute:>12.1f} {hashed:>12.1f} {brute / hashed:>7.2f}")
+    print(f"crossover: n={crossover}" if crossover else "crossover: not reached")
+
+
+def make_projectiles(engine: str, n: int, seed: int = 0):
+    """
+    画面全体に散らばった爆弾とビームをn/2個ずつ持つengineの弾を生成する
+    """
+    rng = random.Random(seed)
+    proj = sb.projectile_engines[engine]()
+    target = Box(50, 50, rng)
+    for _ in range(n // 2):
+        proj.drop(Box(80, 60, rng), target, rng.choice([0, 1]), rng)
+        shooter = Box(50, 50, rng)
+        shooter.dire = (rng.choice([-1, 1]), rng.choice([-1, 0, 1]))
+        proj.fire(shooter, shooter.rect.center, (rng.randint(0, sb.WIDTH), rng.randint(0, sb.HEIGHT)))
+    return proj
+
+
+def bench_projectiles(sizes: list[int], ticks: int, repeat: int):
+    """
+    スプライト（SpriteProjectiles）とNumPyの配列（ArrayProjectiles）で，
+    弾の移動・画面外の削除・敵機/爆弾/こうかとんとの衝突判定にかかる1ティックあたりの時間を比較する
+    """
+    rng = random.Random(1)
+    emys = pg.sprite.Group(Box(rng.randint(60, 90), rng.randint(50, 80), rng) for _ in range(20))
+    bird = Box(90, 80, rng)
+
+    def run(proj):
+        for _ in range(ticks):
+            proj.build()
+            proj.hit_enemies(emys)
+            proj.hit_bombs()
+            proj.hit_bird(bird)
+            proj.advance_beams()
+            proj.advance_bombs()
+
+    print(f"{'n':>6} {'sprite[us]':>12} {'numpy[us]':>12} {'ratio':>7}")
+    for n in sizes:
+        # 結果が一致することを確認
+        a, b = make_projectiles("sprite", n), make_projectiles("numpy", n)
+        for _ in range(ticks):
+            assert a.hit_enemies(emys) == b.hit_enemies(emys), f"mismatch at n={n}"
+            assert a.hit_bombs() == b.hit_bombs(), f"mismatch at n={n}"
+            assert a.hit_bird(bird) == b.hit_bird(bird), f"mismatch at n={n}"
+            a.advance_beams(), b.advance_beams(), a.advance_bombs(), b.advance_bombs()
+            assert a.state() == b.state(), f"mismatch at n={n}"
+        times = {}
+        for engine in ("sprite", "numpy"):
+            total = 0.0
+            for _ in range(repeat):
+                proj = make_projectiles(engine, n)
+                t0 = time.perf_counter()
+                run(proj)
+                total += time.perf_counter() - t0
+                proj.clear_bombs()
+            times[engine] = total / repeat / ticks * 1e6
+        print(f"{n:>6} {times['sprite']:>12.1f} {times['numpy']:>12.1f} {times['sprite'] / times['numpy']:>7.2f}")
+
+
+def god_mode(world: sb.World):
+    """
+    シナリオの負荷を一定に保つため，ゲームオーバーにならないようにする
+    """
+    world.hp_gauge.max_hp = world.hp_gauge.now_hp = 10 ** 9
+
+
+def add_bombers(world: sb.World, n: int):
+    """
+    敵機がn機になるまで，短い間隔で爆弾を落とし続ける停止状態の敵機を追加する
+    """
+    while len(world.emys) < n:
+        emy = sb.Enemy(world.rng)
+        emy.state, emy.vy = "stop", 0
+        emy.interval = world.rng.choice([5, 10, 15])
+        world.add_enemy(emy)
+
+
+def idle_inputs(world: sb.World) -> sb.Inputs:
+    return sb.Inputs()
+
+
+def fire_inputs(world: sb.World) -> sb.Inputs:
+    inputs = sb.bot_inputs(world)
+    inputs.fire = 1  # 毎ティック撃つ
+    return inputs
+
+
+def great_inputs(world: sb.World) -> sb.Inputs:
+    if world.tmr % 100 == 0:  # 100ティックごとに敵機を50機にしてタイミングゲーム（Great）を起こす
+        add_bombers(world, 50)
+        world.count_ProSpirit = 0
+    return sb.bot_inputs(world)
+
+
+def late_setup(world: sb.World):
+    world.score = 2000  # 出現間隔が最短（10ティック）になるスコア
+
+
+scenarios = {  # シナリオ名 -> (準備する関数, 毎ティックの入力を返す関数, タイミングゲームの結果)
+    "idle": (lambda world: None, idle_inputs, "Miss"),
+    "bombs50": (lambda world: add_bombers(world, 50), idle_inputs, "Miss"),
+    "fire": (lambda world: None, fire_inputs, "Miss"),
+    "great": (lambda world: None, great_inputs, "Great"),
+    "late": (late_setup, sb.bot_inputs, "Miss"),
+}
+
+
+def peak_rss_mb() -> float | None:
+    """
+    このプロセスのピークメモリ使用量（MB）を返す
+    """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 2 ** 20 if sys.platform == "darwin" else rss / 2 ** 10  # macOSはバイト，Linuxはキロバイト
+
+
+def run_scenario(name: str, ticks: int, warmup: int, seed: int, render: bool, projectiles: str) -> dict:
+    """
+    シナリオnameをticksティック実行し，1ティックの処理時間の統計を返す（別プロセスで呼ぶ）
+    引数4 render：ティックごとにWorldViewで描画までするかどうか
+    """
+    setup, make_inputs, result = scenarios[name]
+    view = None
+    if render:
+        pg.init()
+        screen = pg.display.set_mode((sb.WIDTH, sb.HEIGHT))
+        sb.assets.preload()
+        bg_img = pg.Surface((sb.WIDTH, sb.HEIGHT)).convert()
+        sb.Starfield(200).draw(bg_img)
+        view = sb.WorldView(screen, sb.FullRenderer(screen, bg_img))
+    world = sb.World(seed, prospirit=lambda world, rng: result, projectiles=projectiles)
+    if render:
+        world.effects = sb.effect_engines["particles" if sb.np is not None else "sprites"]()
+    god_mode(world)
+    setup(world)
+    times = []
+    peak = {}
+    for tick in range(warmup + ticks):
+        inputs = make_inputs(world)
+        t0 = time.perf_counter()
+        world.step(inputs)
+        if view is not None:
+            view.draw(world, inputs.mouse)
+        if tick >= warmup:
+            times.append(time.perf_counter() - t0)
+        for key, value in world.counts().items():
+            peak[key] = max(peak.get(key, 0), value)
+    times.sort()
+    n = len(times) - 1
+    return {
+        "ticks": ticks,
+        "ticks_per_s": round(ticks / sum(times), 1),
+        **{f"p{round(q * 100)}_ms": round(times[round(n * q)] * 1000, 4) for q in (0.5, 0.95, 0.99)},
+        "max_ms": round(times[-1] * 1000, 4),
+        "peak_rss_mb": peak_rss_mb(),
+        "peak_counts": peak,
+        "score": world.score,
+    }
+
+
+def measure_entities(n: int, seed: int) -> dict:
+    """
+    敵機・爆弾・ビームをn個ずつ生きたまま生成し，1個あたりのPythonのメモリ（tracemallocで計測）と
+    プロセスのピークメモリを返す（別プロセスで呼ぶ）
+    """
+    pg.init()
+    pg.display.set_mode((sb.WIDTH, sb.HEIGHT))
+    sb.assets.preload()
+    for rad in range(10, 51):  # 共有する画像は計測に含めないよう先に作っておく
+        for color in sb.Bomb.colors:
+            sb.assets.circle(rad, color)
+    rng = random.Random(seed)
+    target = Box(50, 50, rng)
+    shooter = Box(50, 50, rng)
+    shooter.dire = (1, 0)
+    emys = pg.sprite.Group()
+    proj = sb.SpriteProjectiles()
+    makers = {
+        "enemy": lambda: emys.add(sb.Enemy(rng)),
+        "bomb": lambda: proj.drop(Box(80, 60, rng), target, rng.choice([0, 1]), rng),
+        "beam": lambda: proj.fire(shooter, shooter.rect.center, (rng.randint(0, sb.WIDTH), rng.randint(0, sb.HEIGHT))),
+    }
+    for make in makers.values():  # 初回だけ確保されるもの（アトラスの回転画像など）を計測から外す
+        make()
+    result = {}
+    tracemalloc.start()
+    for name, make in makers.items():
+        before = tracemalloc.get_traced_memory()[0]
+        for _ in range(n):
+            make()
+        result[f"{name}_bytes"] = round((tracemalloc.get_traced_memory()[0] - before) / n, 1)
+    tracemalloc.stop()
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def bench_memory(sizes: list[int], seed: int, out: str | None = None, baseline: str | None = None, label: str = ""):
+    """
+    生きている敵機・爆弾・ビームが100・1000・10000個のときの1個あたりのメモリとピークメモリを表示する
+    引数3 out：結果をJSONで書き出すファイル
+    引数4 baseline：以前にoutで書き出した結果（同じ個数の行に差を表示する）
+    引数5 label：結果に付ける説明（どの版のSky_Battle.pyで測ったかなど）
+    """
+    results = {
+        "meta": {"python": platform.python_version(), "pygame": pg.version.ver, "platform": platform.platform(),
+                 "seed": seed, "label": label},
+        "sizes": {},
+    }
+    base = {}
+    if baseline:
+        with open(baseline) as f:
+            base = json.load(f)
+        print(f"baseline {baseline}: {base['meta'].get('label') or '-'}")
+    print(f"{'n':>6} {'enemy[B]':>9} {'bomb[B]':>9} {'beam[B]':>9} {'rss[MB]':>8}")
+    spawn = multiprocessing.get_context("spawn")  # ピークメモリを個数ごとに測るため毎回新しいプロセスで実行
+    for n in sizes:
+        with concurrent.futures.ProcessPoolExecutor(1, mp_context=spawn) as ex:
+            r = ex.submit(measure_entities, n, seed).result()
+        results["sizes"][str(n)] = r
+        rss = f"{r['peak_rss_mb']:.1f}" if r["peak_rss_mb"] is not None else "-"
+        print(f"{n:>6} {r['enemy_bytes']:>9.0f} {r['bomb_bytes']:>9.0f} {r['beam_bytes']:>9.0f} {rss:>8}")
+        b = base.get("sizes", {}).get(str(n))
+        if b is not None:
+            diff = [f"{r[k] - b[k]:>+9.0f}" for k in ("enemy_bytes", "bomb_bytes", "beam_bytes")]
+            drss = f"{r['peak_rss_mb'] - b['peak_rss_mb']:+.1f}" if None not in (r["peak_rss_mb"], b["peak_rss_mb"]) else "-"
+            print(f"{'diff':>6} {' '.join(diff)} {drss:>8}")
+    if out:
+        with open(out, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"wrote {out}")
+
+
+def compare(results: dict, baseline: dict, max_slowdown: float, max_latency: float, max_rss: float) -> list[str]:
+    """
+    ベースラインと比べて許容範囲を超えて悪化した項目のリストを返す
+    引数3 max_slowdown：ティック/秒が下がってよい割合
+    引数4 max_latency：p95が増えてよい割合
+    引数5 max_rss：ピークメモリが増えてよい割合
+    """
+    regressions = []
+    for name, now in results["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if base is None:
+            continue
+        checks = [
+            ("ticks_per_s", now["ticks_per_s"] < base["ticks_per_s"] * (1 - max_slowdown)),
+            ("p95_ms", now["p95_ms"] > base["p95_ms"] * (1 + max_latency)),
+        ]
+        if now["peak_rss_mb"] is not None and base.get("peak_rss_mb") is not None:
+            checks.append(("peak_rss_mb", now["peak_rss_mb"] > base["peak_rss_mb"] * (1 + max_rss)))
+        for key, worse in checks:
+            if worse:
+                regressions.append(f"{name}.{key}: {base[key]} -> {now[key]}")
+    return regressions
+
+
+def bench_suite(args: argparse.Namespace) -> int:
+    """
+    シナリオごとに別プロセスでWorldを進めて計測し，結果を表示・保存してベースラインと比較する
+    戻り値：終了コード（許容範囲を超えて悪化していれば1）
+    """
+    results = {
+        "meta": {
+            "python": platform.python_version(), "pygame": pg.version.ver,
+            "numpy": sb.np.__version__ if sb.np is not None else None, "platform": platform.platform(),
+            "ticks": args.ticks, "warmup": args.warmup, "seed": args.seed,
+            "render": args.render, "projectiles": args.projectiles,
+        },
+        "scenarios": {},
+    }
+    print(f"{'scenario':<10} {'ticks/s':>10} {'p50[ms]':>9} {'p95[ms]':>9} {'p99[ms]':>9} {'max[ms]':>9} {'rss[MB]':>8}")
+    spawn = multiprocessing.get_context("spawn")  # ピークメモリをシナリオごとに測るため毎回新しいプロセスで実行
+    for name in args.scenarios:
+        with concurrent.futures.ProcessPoolExecutor(1, mp_context=spawn) as ex:
+            r = ex.submit(run_scenario, name, args.ticks, args.warmup, args.seed, args.render, args.projectiles).result()
+        results["scenarios"][name] = r
+        rss = f"{r['peak_rss_mb']:.1f}" if r["peak_rss_mb"] is not None else "-"
+        print(f"{name:<10} {r['ticks_per_s']:>10.0f} {r['p50_ms']:>9.3f} {r['p95_ms']:>9.3f} {r['p99_ms']:>9.3f} {r['max_ms']:>9.3f} {rss:>8}")
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"wrote {args.out}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        for key in ("ticks", "seed", "render", "projectiles"):
+            if baseline.get("meta", {}).get(key) != results["meta"][key]:
+                print(f"warning: baseline {key}={baseline.get('meta', {}).get(key)} differs from this run ({results['meta'][key]})")
+        regressions = compare(results, baseline, args.max_slowdown, args.max_latency_increase, args.max_rss_increase)
+        for line in regressions:
+            print("REGRESSION", line)
+        print(f"baseline {args.baseline}: {'FAIL' if regressions else 'ok'}")
+        return 1 if regressions else 0
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="スカイバトルのマイクロベンチマーク")
+    sub = parser.add_subparsers(dest="bench", required=True)
+    p = sub.add_parser("collide", help="総当たりと空間ハッシュの衝突判定の比較")
+    p.add_argument("--sizes", type=int, nargs="+", default=[1, 2, 5, 10, 20, 50, 100, 200, 500, 1000])
+    p.add_argument("--repeat", type=int, default=50)
+    p = sub.add_parser("projectiles", help="スプライトとNumPyの配列による弾の処理の比較")
+    p.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    p.add_argument("--ticks", type=int, default=20, help="1回の計測で進めるティック数")
+    p.add_argument("--repeat", type=int, default=5)
+    p = sub.add_parser("memory", help="敵機・爆弾・ビーム1個あたりのメモリとピークメモリの計測")
+    p.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--out", metavar="FILE", help="結果をJSONでFILEに書き出す")
+    p.add_argument("--baseline", metavar="FILE", help="以前に--outで書き出した結果との差を表示する")
+    p.add_argument("--label", default="", help="--outで書き出す結果に付ける説明")
+    p = sub.add_parser("suite", help="シナリオごとのティック処理速度・遅延・メモリの計測とベースラインとの比較")
+    p.add_argument("--scenarios", nargs="+", choices=list(scenarios), default=list(scenarios))
+    p.add_argument("--ticks", type=int, default=3000, help="シナリオごとに計測するティック数")
+    p.add_argument("--warmup", type=int, default=100, help="計測前に進めるティック数")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--render", action="store_true", help="ティックごとに描画まで行う（ダミーの画面を使う）")
+    p.add_argument("--projectiles", choices=list(sb.projectile_engines), default="sprite")
+    p.add_argument("--out", metavar="FILE", help="結果をJSONでFILEに書き出す")
+    p.add_argument("--baseline", metavar="FILE", help="以前に--outで書き出した結果と比較し，悪化していれば終了コード1で終わる")
+    p.add_argument("--max-slowdown", type=float, default=0.15, help="ticks/sが下がってよい割合")
+    p.add_argument("--max-latency-increase", type=float, default=0.25, help="p95が増えてよい割合")
+    p.add_argument("--max-rss-increase", type=float, default=0.10, help="ピークメモリが増えてよい割合")
+    args = parser.parse_args()
+    if args.bench == "collide":
+        bench_collide(args.sizes, args.repeat)
+    elif args.bench == "projectiles":
+        if sb.np is None:
+            parser.error("projectilesにはNumPyが必要です（pip install numpy）")
+        bench_projectiles(args.sizes, args.ticks, args.repeat)
+    elif args.bench == "memory":
+        bench_memory(args.sizes, args.seed, args.out, args.baseline, args.label)
+    elif args.bench == "suite":
+        sys.exit(bench_suite(args))
+
+
+if __name__ == "__main__":
+    main()
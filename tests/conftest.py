@@ -0,0 +1,20 @@
+import os
+import sys
+
+# 画面のない環境でもテストできるようにダミーの映像・音声ドライバを使う
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame as pg
+import pytest
+
+
+@pytest.fixture
+def screen():
+    """
+    画面を作って返す（pg.quitするとSky_Battle.assetsにキャッシュしたフォントが使えなくなるので，終了しない）
+    """
+    pg.init()
+    return pg.display.set_mode((1100, 650))
@@ -0,0 +1,37 @@
+import threading
+
+import pygame as pg
+import pytest
+
+import Sky_Battle
+
+
+@pytest.mark.parametrize("cached", [True, False])
+def test_loader_converts_on_main_thread(screen, tmp_path, monkeypatch, cached):
+    """
+    別スレッドではデコードだけを行い，変換・回転画像の作成・アトラスの保存はwait()の中でメインスレッドから行う
+    """
+    threads = set()  # 変換・回転を呼んだスレッド
+
+    def on_thread(func):
+        def wrapper(*args, **kwargs):
+            threads.add(threading.current_thread())
+            return func(*args, **kwargs)
+        return wrapper
+
+    monkeypatch.setattr(Sky_Battle, "convert_surface", on_thread(Sky_Battle.convert_surface))
+    monkeypatch.setattr(pg.transform, "rotozoom", on_thread(pg.transform.rotozoom))
+    monkeypatch.setattr(pg.transform, "flip", on_thread(pg.transform.flip))
+    monkeypatch.setattr(pg.image, "save", on_thread(pg.image.save))
+    if cached:
+        Sky_Battle.SpriteAtlas.load(str(tmp_path), Sky_Battle.Assets().image)
+    assets = Sky_Battle.Assets()
+    assets.cache_dir = str(tmp_path)
+    threads.clear()
+
+    loader = Sky_Battle.AssetLoader(assets)
+    loader.wait()
+
+    assert threads == {threading.main_thread()}
+    assert assets.decoded == {} and assets.decoded_atlas is None
+    assert len(list(tmp_path.glob("atlas-*.png"))) == 1
@@ -0,0 +1,25 @@
+import pygame as pg
+import pytest
+
+import Sky_Battle
+
+
+@pytest.fixture
+def renderer(screen):
+    return Sky_Battle.DirtyRenderer(screen, pg.Surface(screen.get_size()).convert(), threshold=0.5)
+
+
+def test_area_counts_overlaps_once(renderer):
+    hud = pg.Rect(0, 0, 100, 50)
+    assert renderer.area([hud, hud.copy(), pg.Rect(50, 0, 100, 50)]) == 150 * 50
+    assert renderer.area([pg.Rect(-10, -10, 20, 20), pg.Rect(0, 0, 0, 30)]) == 10 * 10  # 画面外と空の矩形は数えない
+
+
+def test_repeated_rects_stay_dirty(renderer):
+    # 前フレームと同じ位置に描いた画面の4割の矩形は，合計が閾値を超えても部分転送のまま
+    big = pg.Rect(0, 0, Sky_Battle.WIDTH, Sky_Battle.HEIGHT * 2 // 5)
+    for _ in range(3):
+        renderer.begin()
+        renderer.add(big.copy())
+        renderer.end()
+    assert (renderer.full_frames, renderer.dirty_frames) == (1, 2)
@@ -0,0 +1,22 @@
+import random
+
+import pygame as pg
+
+import Sky_Battle
+
+
+def test_batched_move_stays_in_world(screen):
+    """
+    遠くの敵機をまとめて動かしても，ワールドの外に出て向きの反転を繰り返すことがない
+    """
+    area = pg.Rect(0, 0, 3300, 1950)
+    emy = Sky_Battle.Enemy(random.Random(1), area=area)
+    emy.bound = area.bottom  # 横の動きだけを見る
+    emy.vx, emy.vy = 3, 0
+    emy.rect.right = area.right - 1
+    emy.update(area, Sky_Battle.Camera.far_every)
+    assert area.contains(emy.rect) and emy.vx == -3
+    for _ in range(3):  # 近くに来て毎ティック動かしても，ワールドの中に向かって進み続ける
+        left = emy.rect.left
+        emy.update(area)
+        assert emy.rect.left == left - 3
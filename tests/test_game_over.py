@@ -0,0 +1,40 @@
+import pygame as pg
+import pytest
+
+import Sky_Battle
+
+
+@pytest.fixture
+def scene(screen):
+    scene = Sky_Battle.GameOverScene(screen)
+    scene.start(1234)
+    return scene
+
+
+def key(k: int) -> pg.event.Event:
+    return pg.event.Event(pg.KEYDOWN, key=k)
+
+
+@pytest.mark.parametrize("k, result", [(pg.K_RETURN, True), (pg.K_q, False)])
+def test_key_leaves_after_delay_without_blocking(scene, k, result):
+    """
+    Enter/Qキーの後もleave_timeの間は1フレームずつ表示を続けてから結果を返す
+    """
+    assert scene.update([], 16) is None
+    assert scene.update([key(k)], 16) is None
+    frames = 2  # キーを押したフレームから結果を返すフレームまでの数
+    while (restart := scene.update([key(pg.K_RETURN), key(pg.K_q)], 16)) is None:  # 後から押したキーは無視する
+        frames += 1
+    assert restart is result
+    assert frames == -(-Sky_Battle.GameOverScene.leave_time // 16)
+
+
+def test_quit_leaves_immediately(scene):
+    assert scene.update([key(pg.K_RETURN)], 16) is None
+    assert scene.update([pg.event.Event(pg.QUIT)], 16) is False
+
+
+def test_fade_in_reaches_opaque_layer(scene):
+    for _ in range(60):
+        scene.update([], 16)
+    assert scene.opaque is not None
@@ -0,0 +1,46 @@
+import json
+
+import pygame as pg
+
+import Sky_Battle
+
+
+def test_quit_during_prospirit_finalizes_outputs(screen, tmp_path, monkeypatch, capsys):
+    """
+    タイミングゲーム中にウィンドウを閉じても，main()がfinish()を通ってリプレイと記録を書き終える
+    """
+    record, telemetry = tmp_path / "play.skyr", tmp_path / "telemetry.jsonl"
+    step = Sky_Battle.World.step
+
+    def quick_step(world, inputs):
+        if world.tmr == 5:  # 敵機が揃うのを待たずにタイミングゲームを始める
+            world.Enemy_num, world.count_ProSpirit = 7, 0
+        elif world.tmr > 600:  # タイミングゲームが始まらなかったときにテストが止まらないようにする
+            pg.event.post(pg.event.Event(pg.QUIT))
+        return step(world, inputs)
+
+    start = Sky_Battle.ProSpirit.start
+
+    def start_and_quit(self, rng):
+        start(self, rng)
+        pg.event.post(pg.event.Event(pg.QUIT))  # タイミングゲームの最初のフレームでウィンドウを閉じる
+
+    monkeypatch.setattr(Sky_Battle.World, "step", quick_step)
+    monkeypatch.setattr(Sky_Battle.ProSpirit, "start", start_and_quit)
+    monkeypatch.setattr(Sky_Battle.time, "sleep", lambda seconds: None)
+    args = Sky_Battle.parse_args(["--seed", "5", "--effects", "sprites",
+                                  "--record", str(record), "--telemetry", str(telemetry)])
+    pg.event.post(pg.event.Event(pg.KEYDOWN, key=pg.K_SPACE))  # スタート画面を抜ける
+
+    assert Sky_Battle.main(args) == 0
+    assert "recorded" in capsys.readouterr().out
+
+    replay = Sky_Battle.Replay.load(str(record))
+    assert replay.trailer is not None
+    records = list(replay.records())
+    assert replay.trailer[0] == len(records) == 6
+    assert records[-1][1] == "Miss"  # 閉じられたティックはMissとして記録する
+
+    events = [json.loads(line) for line in telemetry.read_text().splitlines()]
+    assert events[0]["event"] == "session"
+    assert [e["result"] for e in events if e["event"] == "prospirit"] == ["Miss"]
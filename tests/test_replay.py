@@ -0,0 +1,38 @@
+import struct
+
+import pytest
+
+import Sky_Battle
+
+
+def record(path, ticks=3000, seed=7):
+    """
+    ボットでticksティック遊んだ入力をpathに記録し，最終状態のWorldを返す
+    """
+    world = Sky_Battle.World(seed, prospirit=lambda world, rng: rng.choice(["Great", "Nice", "Miss"]))
+    replay = Sky_Battle.Replay(world.seed)
+    for _ in range(ticks):
+        if world.over:
+            world.reset()
+        world.step(Sky_Battle.bot_inputs(world, fire_interval=50))  # 敵機が増えてタイミングゲームが起きるように少なめに撃つ
+        replay.record(world)
+    replay.save(str(path), world)
+    return world
+
+
+def test_round_trip_matches_recording(tmp_path, capsys):
+    path = tmp_path / "bot.skyr"
+    world = record(path)
+    assert any(prospirit for inputs, prospirit in Sky_Battle.Replay.load(str(path)).records())
+    assert Sky_Battle.play_replay(str(path))
+    assert f"hash={world.state_hash()}" in capsys.readouterr().out
+
+
+def test_other_versions_are_rejected(tmp_path):
+    path = tmp_path / "old.skyr"
+    record(path, ticks=10)
+    data = bytearray(path.read_bytes())
+    struct.pack_into("<B", data, 4, Sky_Battle.Replay.VERSION - 1)
+    path.write_bytes(data)
+    with pytest.raises(ValueError, match="バージョン"):
+        Sky_Battle.Replay.load(str(path))
@@ -0,0 +1,23 @@
+import pytest
+
+import Sky_Battle
+
+
+def waves(*items):
+    return {"waves": list(items)}
+
+
+@pytest.mark.parametrize("every", ["x", None, 2.5, 0, True])
+def test_bad_every_is_reported_for_single_enemy_wave(every):
+    """
+    出現数が1のウェーブでも，everyがあれば整数か検査する（例外にせずエラーとして報告する）
+    """
+    assert Sky_Battle.Stage.validate(waves({"at": 5, "every": every})) == ["waves[0]: 'every' must be an integer >= 1"]
+
+
+def test_every_required_for_repeated_wave():
+    assert Sky_Battle.Stage.validate(waves({"at": 0, "count": 2})) == ["waves[0]: 'every' is required when count > 1"]
+
+
+def test_single_enemy_wave_without_every():
+    assert Sky_Battle.Stage.validate(waves({"at": 5})) == []